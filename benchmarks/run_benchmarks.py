@@ -0,0 +1,186 @@
+"""
+Run the benchmarks of suite.py and report the throughput and peak memory of every
+(benchmark, workload, size), optionally compared against a stored baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output baseline.json
+    python benchmarks/run_benchmarks.py --baseline baseline.json --threshold 0.1
+    python benchmarks/run_benchmarks.py --full --output full.json
+
+A result is a regression if its throughput is more than threshold (as a fraction) below the baseline,
+the run then exits with status 1. Baselines are only comparable on the same machine.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The benchmarked modules import each other by their flat name, like when they're run from their own directory
+sys.path[:0] = [os.path.join(REPO, 'cs_algorithms'), os.path.join(REPO, 'dataset_specific', 'housing')]
+
+from suite import BENCHMARKS, SIZES, WORKLOADS, make_data
+
+
+def measure(benchmark, data, repeat=3, memory=True):
+    """
+    Return the best time of repeat runs of the benchmark on data, and the peak memory allocated
+    during one more run, traced with tracemalloc (None if not memory).
+    The setup is done before each run and not included.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        state = benchmark.setup(data)
+        gc.collect()
+        start = time.perf_counter()
+        benchmark.run(state)
+        best = min(best, time.perf_counter() - start)
+        del state
+    peak = None
+    if memory:
+        # Separate run, tracing slows down the allocations
+        state = benchmark.setup(data)
+        gc.collect()
+        tracemalloc.start()
+        benchmark.run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del state
+    return best, peak
+
+
+def run_benchmarks(names=None, workloads=None, sizes=(10**3, 10**4, 10**5), repeat=3, memory=True):
+    """
+    Run the benchmarks (all, or those with one of names in their name) on the given workloads and sizes,
+    print every result and return them as a list of dicts.
+    """
+    results = []
+    for size in sizes:
+        for workload in workloads or WORKLOADS:
+            selected = [
+                benchmark for benchmark in BENCHMARKS
+                if benchmark.runs_at(workload, size) and (not names or any(name in benchmark.name for name in names))]
+            if not selected:
+                continue
+            data = make_data(workload, size)
+            for benchmark in selected:
+                seconds, peak = measure(benchmark, data, repeat, memory)
+                result = {
+                    'benchmark': benchmark.name,
+                    'workload': workload,
+                    'size': size,
+                    'seconds': seconds,
+                    'items_per_second': size / seconds,
+                    'peak_memory_bytes': peak,
+                }
+                print(format_result(result), flush=True)
+                results.append(result)
+            del data
+    return results
+
+
+def format_result(result):
+    memory = result['peak_memory_bytes']
+    return '{:<32} {:<10} {:>10,} {:>16,.0f} items/s {:>10} MB'.format(
+        result['benchmark'], result['workload'], result['size'], result['items_per_second'],
+        '-' if memory is None else '{:,.1f}'.format(memory / 2**20))
+
+
+def environment():
+    """
+    Return a description of the machine and library versions, stored with the results.
+    """
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def result_key(result):
+    return result['benchmark'], result['workload'], result['size']
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare the throughput of the results with the baseline results.
+    Return a list of (result, baseline result, ratio current/baseline, is regression)
+    for every result that is in the baseline.
+    """
+    baseline = {result_key(result): result for result in baseline}
+    comparison = []
+    for result in results:
+        base = baseline.get(result_key(result))
+        if base is None:
+            continue
+        ratio = result['items_per_second'] / base['items_per_second']
+        comparison.append((result, base, ratio, ratio < 1 - threshold))
+    return comparison
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    """
+    Run the benchmarks with the given command line arguments (sys.argv by default).
+    Return the exit status: 1 if there are regressions compared to the baseline, else 0.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--benchmarks', nargs='*', help='only run the benchmarks that contain one of these names')
+    parser.add_argument('--workloads', nargs='*', choices=WORKLOADS, help='workloads to run (default all)')
+    parser.add_argument('--sizes', nargs='*', type=int, default=[10**3, 10**4, 10**5],
+                        help='input sizes (benchmarks skip sizes above their maximum, at most 10^7)')
+    parser.add_argument('--full', action='store_true',
+                        help='run all sizes of the suite, 10^3 to 10^7 (overrides --sizes, takes hours)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs, the best is reported')
+    parser.add_argument('--no-memory', action='store_true', help="don't measure the peak memory")
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='throughput drop (as a fraction of the baseline) that counts as a regression')
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.baseline) if args.baseline else None
+    sizes = SIZES if args.full else args.sizes
+    print('{:<32} {:<10} {:>10} {:>24} {:>13}'.format('benchmark', 'workload', 'size', 'throughput', 'peak memory'))
+    results = run_benchmarks(args.benchmarks, args.workloads, sizes, args.repeat, not args.no_memory)
+    if args.output:
+        save_results(args.output, results)
+    if baseline is None:
+        return 0
+    comparison = compare(results, baseline['results'], args.threshold)
+    regressions = [row for row in comparison if row[3]]
+    print('\nCompared {} results with {} (from {}):'.format(
+        len(comparison), args.baseline, baseline['environment']['date']))
+    for result, base, ratio, regressed in comparison:
+        print('{:<32} {:<10} {:>10,} {:>+8.1%}{}'.format(
+            result['benchmark'], result['workload'], result['size'], ratio - 1,
+            '  REGRESSION' if regressed else ''))
+    if regressions:
+        print('{} regressions of more than {:.0%}'.format(len(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
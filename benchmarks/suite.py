@@ -0,0 +1,167 @@
+"""
+The benchmarks of the search trees, heaps, sorting and search routines in cs_algorithms,
+and of the housing preprocessing in dataset_specific/housing.
+
+Every benchmark has a setup that prepares its input (not timed) and a run that is timed.
+The input is the list of keys of a key workload (see workloads.py), or a synthetic housing frame
+for the 'housing' workload. Throughput is the number of keys (or rows) per second.
+
+The modules are imported by their flat name, like when they're run from their own directory:
+cs_algorithms and dataset_specific/housing need to be on sys.path (run_benchmarks.py adds them).
+"""
+import numpy as np
+
+from binary_search import binary_search, search_sorted
+from binary_search_tree import BST
+from red_black_tree import RedBlackTree
+from priority_queue import BinaryHeap
+from heap_backends import DaryHeap, PairingHeap
+from top_k import TopK, top_k
+from external_sort import external_sort
+from sorting import mergesort, quicksort
+from preprocess import preprocess, preprocess_sparse, HousingPreprocessor
+from synthetic_data import make_housing_frame
+from workloads import KEY_WORKLOADS, make_keys
+
+
+WORKLOADS = list(KEY_WORKLOADS) + ['housing']
+
+# All sizes of the suite, from 10^3 up to 10^7 keys (or rows)
+SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+
+
+class Benchmark(object):
+    """
+    A benchmark: run(setup(data)) is timed for the data of each of its workloads.
+    max_size is the largest size it's run at, max_sizes can lower it per workload
+    (e.g. for the quadratic BST on sorted keys).
+    """
+    def __init__(self, name, run, setup=None, workloads=tuple(KEY_WORKLOADS), max_size=10**7, max_sizes=None):
+        self.name = name
+        self.run = run
+        self.setup = setup if setup is not None else (lambda data: data)
+        self.workloads = list(workloads)
+        self.max_size = max_size
+        self.max_sizes = max_sizes or {}
+
+    def runs_at(self, workload, size):
+        """
+        Return true if and only if the benchmark should be run on the given workload and size.
+        """
+        return workload in self.workloads and size <= self.max_sizes.get(workload, self.max_size)
+
+
+def put_all(cls):
+    def run(keys):
+        tree = cls()
+        for key in keys:
+            tree.put(key)
+    return run
+
+
+def build_tree(cls):
+    def setup(keys):
+        tree = cls()
+        for key in keys:
+            tree.put(key)
+        return tree, keys
+    return setup
+
+
+def get_all(state):
+    tree, keys = state
+    get = tree.get
+    for key in keys:
+        get(key)
+
+
+def delete_all(state):
+    tree, keys = state
+    for key in keys:
+        tree.delete(key)
+
+
+def insert_all(cls):
+    def run(keys):
+        heap = cls()
+        for key in keys:
+            heap.insert(key)
+    return run
+
+
+def delete_max_all(heap):
+    delete_max = heap.delete_max
+    for _ in range(heap.size()):
+        delete_max()
+
+
+def push_all(keys):
+    top = TopK(100)
+    push = top.push
+    for key in keys:
+        push(key)
+
+
+def external_sort_all(lines):
+    # A budget of about 1/8 of the memory the lines take, so they are sorted in runs on disk and merged
+    for _ in external_sort(lines, memory_budget=max(2**16, 8 * len(lines)), fan_in=16):
+        pass
+
+
+def as_lines(keys):
+    return ['{:010d}'.format(key) for key in keys]
+
+
+def binary_search_all(state):
+    items, queries = state
+    for query in queries:
+        binary_search(query, items)
+
+
+def fitted_preprocessor(df):
+    return HousingPreprocessor().fit(df), df
+
+
+# Sorted and reversed keys make the BST a linked list, put and get are O(n) per key there
+BST_MAX_SIZES = {'sorted': 10**4, 'reverse': 10**4}
+
+BENCHMARKS = [
+    Benchmark('BST.put', put_all(BST), max_sizes=BST_MAX_SIZES),
+    Benchmark('BST.get', get_all, setup=build_tree(BST), max_sizes=BST_MAX_SIZES),
+    Benchmark('RedBlackTree.put', put_all(RedBlackTree)),
+    Benchmark('RedBlackTree.get', get_all, setup=build_tree(RedBlackTree)),
+    Benchmark('RedBlackTree.delete', delete_all, setup=build_tree(RedBlackTree)),
+    Benchmark('RedBlackTree.put_many', lambda keys: RedBlackTree().put_many(keys)),
+    Benchmark('BinaryHeap.insert', insert_all(BinaryHeap)),
+    Benchmark('BinaryHeap.from_iterable', BinaryHeap.from_iterable),
+    Benchmark('BinaryHeap.delete_max', delete_max_all, setup=BinaryHeap.from_iterable),
+    Benchmark('DaryHeap.insert', insert_all(DaryHeap)),
+    Benchmark('DaryHeap.delete_max', delete_max_all, setup=DaryHeap.from_iterable),
+    Benchmark('PairingHeap.insert', insert_all(PairingHeap)),
+    Benchmark('PairingHeap.delete_max', delete_max_all, setup=PairingHeap.from_iterable),
+    Benchmark('TopK.push (k=100)', push_all),
+    Benchmark('top_k (k=100)', lambda keys: top_k(keys, 100)),
+    Benchmark('external_sort', external_sort_all, setup=as_lines),
+    Benchmark('mergesort', mergesort, setup=list),
+    Benchmark('quicksort', quicksort, setup=list),
+    # Reference for the sorts: the built-in sort
+    Benchmark('list.sort', lambda keys: keys.sort(), setup=list),
+    Benchmark('binary_search', binary_search_all, setup=lambda keys: (sorted(keys), keys)),
+    Benchmark('search_sorted', lambda state: search_sorted(*state), setup=lambda keys: (sorted(keys), keys)),
+    Benchmark('search_sorted (NumPy)', lambda state: search_sorted(*state),
+              setup=lambda keys: (np.sort(keys), np.array(keys))),
+    # preprocess works on a copy, like the notebooks that preprocess train and test
+    Benchmark('preprocess', preprocess, setup=lambda df: df.copy(), workloads=['housing']),
+    Benchmark('preprocess_sparse', preprocess_sparse, setup=lambda df: df.copy(), workloads=['housing']),
+    Benchmark('HousingPreprocessor.transform', lambda state: state[0].transform(state[1]),
+              setup=fitted_preprocessor, workloads=['housing']),
+]
+
+
+def make_data(workload, size, seed=42):
+    """
+    Return the input data of the given workload and size.
+    """
+    if workload == 'housing':
+        return make_housing_frame(size, seed=seed)
+    return make_keys(workload, size, seed)
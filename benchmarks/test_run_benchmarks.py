@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import run_benchmarks
+from run_benchmarks import compare, load_results, main, run_benchmarks as run, save_results
+from suite import BENCHMARKS, SIZES
+
+
+def result(benchmark, items_per_second, size=1000, workload='random'):
+    return {'benchmark': benchmark, 'workload': workload, 'size': size, 'seconds': size / items_per_second,
+            'items_per_second': items_per_second, 'peak_memory_bytes': None}
+
+
+def test_compare_flags_drops_beyond_the_threshold():
+    baseline = [result('a', 100.0), result('b', 100.0), result('c', 100.0), result('a', 100.0, size=10**4)]
+    results = [result('a', 95.0), result('b', 85.0), result('c', 150.0), result('new', 1.0)]
+    comparison = compare(results, baseline, threshold=0.1)
+    # Results that aren't in the baseline (name, workload and size) are left out
+    assert [(row[0]['benchmark'], row[2], row[3]) for row in comparison] == [
+        ('a', 0.95, False), ('b', 0.85, True), ('c', 1.5, False)]
+    assert comparison[0][1] is baseline[0]
+    assert [row[3] for row in compare(results, baseline, threshold=0.2)] == [False, False, False]
+    assert compare(results, [], threshold=0.1) == []
+
+
+def test_results_round_trip(tmp_path):
+    path = str(tmp_path / 'results.json')
+    save_results(path, [result('a', 100.0)])
+    loaded = load_results(path)
+    assert loaded['results'] == [result('a', 100.0)]
+    assert set(loaded['environment']) >= {'date', 'python', 'numpy', 'pandas'}
+
+
+def test_every_benchmark_runs():
+    results = run(sizes=[200], repeat=1, memory=False)
+    assert {row['benchmark'] for row in results} == {benchmark.name for benchmark in BENCHMARKS}
+    assert all(row['items_per_second'] > 0 for row in results)
+    assert SIZES[0] == 10**3 and SIZES[-1] == 10**7
+
+
+def write_baseline(path, items_per_second):
+    with open(path, 'w') as f:
+        json.dump({'environment': {'date': 'then'},
+                   'results': [result('list.sort', items_per_second, size=100, workload='sorted')]}, f)
+
+
+@pytest.mark.parametrize('items_per_second, status', [(1.0, 0), (1e15, 1)])
+def test_main_exit_status(tmp_path, capsys, items_per_second, status):
+    baseline = str(tmp_path / 'baseline.json')
+    output = str(tmp_path / 'results.json')
+    write_baseline(baseline, items_per_second)
+    argv = ['--benchmarks', 'list.sort', '--workloads', 'sorted', '--sizes', '100', '--repeat', '1', '--no-memory',
+            '--output', output, '--baseline', baseline]
+    assert main(argv) == status
+    assert [row['benchmark'] for row in load_results(output)['results']] == ['list.sort']
+    out = capsys.readouterr().out
+    assert 'Compared 1 results' in out
+    assert ('REGRESSION' in out) == bool(status)
+
+
+def test_main_without_a_baseline(capsys):
+    assert main(['--benchmarks', 'quicksort', '--workloads', 'random', '--sizes', '100', '--repeat', '1',
+                 '--no-memory']) == 0
+    assert 'quicksort' in capsys.readouterr().out
+
+
+def test_full_runs_all_sizes(monkeypatch):
+    sizes = []
+    monkeypatch.setattr(run_benchmarks, 'run_benchmarks', lambda names, workloads, s, repeat, memory: sizes.extend(s))
+    assert main(['--full', '--sizes', '100']) == 0
+    assert sizes == SIZES
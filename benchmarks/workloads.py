@@ -0,0 +1,45 @@
+"""
+Key workloads of the benchmarks: integer keys in different orders.
+Every workload is deterministic for a given size and seed, so runs on the same machine are comparable.
+"""
+import numpy as np
+
+
+def random_keys(n, rng):
+    """
+    A random permutation of 0..n-1.
+    """
+    return rng.permutation(n).tolist()
+
+
+def sorted_keys(n, rng):
+    return list(range(n))
+
+
+def reverse_keys(n, rng):
+    return list(range(n - 1, -1, -1))
+
+
+def duplicate_keys(n, rng):
+    """
+    Random keys with about 100 copies of every key.
+    """
+    return rng.integers(0, max(1, n // 100), n).tolist()
+
+
+KEY_WORKLOADS = {
+    'random': random_keys,
+    'sorted': sorted_keys,
+    'reverse': reverse_keys,
+    'duplicates': duplicate_keys,
+}
+
+
+def make_keys(workload, n, seed=42):
+    """
+    Return the list of n keys of the given workload.
+    """
+    if workload not in KEY_WORKLOADS:
+        raise ValueError('Unknown workload {!r}, expected one of {}'.format(workload, list(KEY_WORKLOADS)))
+    return KEY_WORKLOADS[workload](n, np.random.default_rng(seed))
+
@@ -0,0 +1,119 @@
+import bisect
+import math
+
+import numpy as np
+
+
+# Unsorted batches of at least this many queries are sorted before np.searchsorted:
+# searching in sorted order hits the same parts of the items one after the other (cache friendly).
+SORT_QUERIES_MIN = 4096
+
+
+def binary_search(elem, ls):
+    """
+    Search for the given elem in the given sorted list and return the index.
+    Return -1 is the elem was not found.
+    """
+    low = 0
+    high = len(ls) - 1
+    while low <= high:
+        middle = low + ((high - low) // 2)
+        if ls[middle] == elem:
+            return middle
+        elif ls[middle] > elem:
+            high = middle - 1
+        else:
+            low = middle + 1
+    return -1
+
+
+def is_sorted(items):
+    return all(not b < a for a, b in zip(items, items[1:]))
+
+
+def merge_search(items, queries):
+    """
+    Return the insertion points of the sorted queries in the sorted items, in O(n + m),
+    by walking through both lists once like the merge of mergesort.
+    """
+    n = len(items)
+    points = []
+    i = 0
+    for query in queries:
+        while i < n and items[i] < query:
+            i += 1
+        points.append(i)
+    return points
+
+
+def search_sorted(items, queries, queries_sorted=None):
+    """
+    Search a batch of queries in the sorted items.
+    Return the insertion points (the index of the first item >= the query, like bisect_left)
+    and a mask that is true for the queries that are found (items[point] == query).
+
+    NumPy arrays are searched with np.searchsorted (and return arrays), large batches of queries
+    in sorted order.
+    Other sequences are searched with bisect per query, or with one merge-like pass through
+    the items if the queries are sorted and the pass is cheaper than a binary search per query.
+    queries_sorted tells if the queries are sorted, it's checked if None.
+    """
+    if isinstance(items, np.ndarray) and items.dtype.kind in 'biuf':
+        queries = np.asarray(queries)
+        if queries_sorted is None:
+            queries_sorted = bool(np.all(queries[1:] >= queries[:-1]))
+        if queries_sorted or len(queries) < SORT_QUERIES_MIN:
+            points = np.searchsorted(items, queries, side='left')
+        else:
+            order = np.argsort(queries)
+            points = np.empty(len(queries), dtype=np.intp)
+            points[order] = np.searchsorted(items, queries[order], side='left')
+        found = np.zeros(len(queries), dtype=bool)
+        inside = points < len(items)
+        found[inside] = items[points[inside]] == queries[inside]
+        return points, found
+    n = len(items)
+    m = len(queries)
+    if queries_sorted is None:
+        queries_sorted = is_sorted(queries)
+    if queries_sorted and n + m < m * math.log2(n + 1):
+        points = merge_search(items, queries)
+    else:
+        bisect_left = bisect.bisect_left
+        points = [bisect_left(items, query) for query in queries]
+    found = [point < n and items[point] == query for point, query in zip(points, queries)]
+    return points, found
+
+
+if __name__ == '__main__':
+    # Benchmark: queries/s of the per-element loop against the batched search
+    import random
+    import time
+
+    n = 10**6
+    m = 10**6
+    rng = random.Random(42)
+    items = sorted(rng.randrange(4 * n) for _ in range(n))
+    queries = [rng.randrange(4 * n) for _ in range(m)]
+    sorted_queries = sorted(queries)
+    array = np.array(items)
+    query_array = np.array(queries)
+
+    def binary_search_loop():
+        return [binary_search(query, items) for query in queries]
+
+    benchmarks = [
+        ('binary_search loop', binary_search_loop),
+        ('search_sorted (bisect)', lambda: search_sorted(items, queries, queries_sorted=False)),
+        ('search_sorted (merge)', lambda: search_sorted(items, sorted_queries, queries_sorted=True)),
+        ('search_sorted (NumPy)', lambda: search_sorted(array, query_array)),
+        ('np.searchsorted', lambda: np.searchsorted(array, query_array)),
+    ]
+    for name, fn in benchmarks:
+        start = time.perf_counter()
+        fn()
+        print('{:<24} {:>14,.0f} queries/s'.format(name, m / (time.perf_counter() - start)))
+
+    points, found = search_sorted(array, query_array)
+    assert list(found) == [index >= 0 for index in binary_search_loop()]
+    assert search_sorted(items, sorted_queries)[0] == list(np.searchsorted(array, sorted_queries))
@@ -1,73 +1,328 @@
+
+
+# Default value of put: a key that is already in the tree keeps its value, a new key gets None
+NO_VALUE = object()
+
+
+def unique_sorted(items):
+    """
+    Return the given (key, value) pairs, sorted on key, as a list without duplicate keys.
+    For duplicate keys the last value is kept.
+    Raise a ValueError if the keys are not sorted.
+    """
+    result = []
+    for item in items:
+        if result:
+            last_key = result[-1][0]
+            if item[0] < last_key:
+                raise ValueError('Keys should be sorted, {!r} comes after {!r}'.format(item[0], last_key))
+            if not item[0] > last_key:
+                # Equal to the previous key, overwrite its value
+                result[-1] = item
+                continue
+        result.append(item)
+    return result
+
+
+def merge_unique(left, right, keep_left=False):
+    """
+    Merge two sorted lists of (key, value) pairs with unique keys into one sorted list
+    with unique keys. If a key is in both lists the pair from right is kept (from left if keep_left).
+    """
+    result = []
+    l = r = 0
+    while l < len(left) and r < len(right):
+        if left[l][0] < right[r][0]:
+            result.append(left[l])
+            l += 1
+        elif right[r][0] < left[l][0]:
+            result.append(right[r])
+            r += 1
+        else:
+            result.append(left[l] if keep_left else right[r])
+            l += 1
+            r += 1
+    result.extend(left[l:])
+    result.extend(right[r:])
+    return result
+
+
+def size(n):
+    """
+    Return the number of nodes in the subtree under node n (0 for an empty subtree).
+    """
+    return 0 if n is None else n.size
+
+
+def get_node(root, key):
+    """
+    Return the node with the given key in the subtree under root. Return None if not found.
+    """
+    n = root
+    while n is not None:
+        if key < n.key:
+            n = n.left
+        elif key > n.key:
+            n = n.right
+        else:
+            return n
+    return None
+
+
+def iter_nodes(root, reverse=False):
+    """
+    Generate the nodes in the subtree under root in sorted order (descending if reverse).
+    The tree should not be modified while iterating.
+    """
+    stack = []
+    n = root
+    while stack or n is not None:
+        # Go left as far as possible, then visit the node and continue on its right
+        while n is not None:
+            stack.append(n)
+            n = n.right if reverse else n.left
+        n = stack.pop()
+        yield n
+        n = n.left if reverse else n.right
+
+
+def iter_in_order(root, reverse=False):
+    """
+    Generate the keys in the subtree under root in sorted order (descending if reverse).
+    """
+    for n in iter_nodes(root, reverse):
+        yield n.key
+
+
+def in_order_items(root):
+    """
+    Return the sorted list of (key, value) pairs in the subtree under root.
+    """
+    return [(n.key, n.value) for n in iter_nodes(root)]
+
+
+def iter_range(root, lo, hi):
+    """
+    Generate the keys lo <= key <= hi in the subtree under root in sorted order.
+    Only the O(log n) nodes on the boundary paths are visited besides the keys in the range.
+    """
+    stack = []
+    n = root
+    while stack or n is not None:
+        while n is not None:
+            if n.key < lo:
+                # n and everything on its left is too small
+                n = n.right
+            else:
+                stack.append(n)
+                n = n.left
+        if not stack:
+            return
+        n = stack.pop()
+        if n.key > hi:
+            # Everything that is left is larger than n
+            return
+        yield n.key
+        n = n.right
+
+
+def floor(root, key):
+    """
+    Return the largest key <= key in the subtree under root. Return None if there is none.
+    """
+    result = None
+    n = root
+    while n is not None:
+        if key < n.key:
+            n = n.left
+        elif key > n.key:
+            # n is a candidate, but there might be a larger one on its right
+            result = n.key
+            n = n.right
+        else:
+            return n.key
+    return result
+
+
+def ceiling(root, key):
+    """
+    Return the smallest key >= key in the subtree under root. Return None if there is none.
+    """
+    result = None
+    n = root
+    while n is not None:
+        if key > n.key:
+            n = n.right
+        elif key < n.key:
+            # n is a candidate, but there might be a smaller one on its left
+            result = n.key
+            n = n.left
+        else:
+            return n.key
+    return result
+
+
+def rank(root, key):
+    """
+    Return the number of keys smaller than key in the subtree under root.
+    """
+    r = 0
+    n = root
+    while n is not None:
+        if key < n.key:
+            n = n.left
+        elif key > n.key:
+            # n and all the keys on its left are smaller
+            r += 1 + size(n.left)
+            n = n.right
+        else:
+            return r + size(n.left)
+    return r
+
+
+def select(root, k):
+    """
+    Return the key with rank k (the k-th smallest key, starting from 0) in the subtree under root.
+    Return None if k is out of range.
+    """
+    if k < 0 or k >= size(root):
+        return None
+    n = root
+    while True:
+        left_size = size(n.left)
+        if k < left_size:
+            n = n.left
+        elif k > left_size:
+            # Skip n and the keys on its left
+            k -= left_size + 1
+            n = n.right
+        else:
+            return n.key
+
+
+def height(root):
+    """
+    Return the number of nodes on the longest path from root down to a leaf.
+    """
+    h = 0
+    level = [] if root is None else [root]
+    # Walk the tree level by level
+    while level:
+        h += 1
+        level = [c for n in level for c in (n.left, n.right) if c is not None]
+    return h
+
+
 class Node(object):
     """
     Class to represent a node in a binary search tree
     """
-    def __init__(self, key, left=None, right=None):
+    # No per-node __dict__, keeps the memory per key down for large trees
+    __slots__ = ('left', 'right', 'key', 'value', 'size')
+
+    def __init__(self, key, left=None, right=None, value=None):
         """
         Initialise the node
         """
         self.left = left
         self.right = right
         self.key = key
+        self.value = value
+        # Number of nodes in the subtree under this node, used by rank and select
+        self.size = 1 + size(left) + size(right)
 
     def get(self, get_key):
         """
-        Get the node with the given key. Return None if not found.
+        Return the value stored with the given key. Return None if not found.
         """
-        if self.key == get_key:
-            return self.key
-        elif self.key < get_key and not self.right is None:
-                return self.right.get(get_key)
-        elif self.key > get_key and not self.left is None:
-            return self.left.get(get_key)
-        else:
-            return None
+        n = self
+        # Walk down the tree, going left or right depending on the key,
+        # until the key is found or we fall off the tree.
+        while n is not None:
+            if get_key < n.key:
+                n = n.left
+            elif get_key > n.key:
+                n = n.right
+            else:
+                return n.value
+        return None
 
-    def put(self, new_key):
+    def put(self, new_key, value=NO_VALUE):
         """
         Put the given key in the BST starting at this node.
+        If the key is already in the tree its value is replaced, if a value is given.
         """
-        if self.key < new_key:
-            if self.right is None:
-                self.right = Node(new_key)
-            else:
-                self.right.put(new_key)
-        elif self.key > new_key:
-            if self.left is None:
-                self.left = Node(new_key)
+        if value is NO_VALUE:
+            value = None
+            replace = False
+        else:
+            replace = True
+        path = []
+        n = self
+        while True:
+            path.append(n)
+            if new_key < n.key:
+                if n.left is None:
+                    n.left = Node(new_key, value=value)
+                    break
+                n = n.left
+            elif new_key > n.key:
+                if n.right is None:
+                    n.right = Node(new_key, value=value)
+                    break
+                n = n.right
             else:
-                self.left.put(new_key)
+                # Key is already in the tree, only update its value
+                if replace:
+                    n.value = value
+                return
+        # All nodes on the path have one more node below them
+        for n in path:
+            n.size += 1
 
     def min(self):
         """
         Return the minimum in the BST under this node
         """
-        if self.left is None:
-            return self.key
-        else:
-            return self.left.min()
+        n = self
+        while n.left is not None:
+            n = n.left
+        return n.key
 
     def max(self):
         """
         Return the maximum in the BST under this node
         """
-        if self.right is None:
-            return self.key
-        else:
-            return self.right.max()
+        n = self
+        while n.right is not None:
+            n = n.right
+        return n.key
 
     def __str__(self):
         """
         Represent the node as a string.
         """
-        s ='{'
-        if not self.left is None:
-            s += str(self.left)
-        s += str(self.key)
-        if not self.right is None:
-            s += str(self.right)
-        s += '}'
-        return s
+        # In-order walk with an explicit stack, opening a '{' when going
+        # down into a node and closing it after its right subtree is done.
+        parts = []
+        stack = [(self, False)]
+        while stack:
+            n, visited = stack.pop()
+            if visited:
+                parts.append(str(n.key))
+                continue
+            if n is None:
+                parts.append('}')
+                continue
+            parts.append('{')
+            # Pushed in reverse: left subtree, key, right subtree, closing brace
+            stack.append((None, False))
+            if n.right is not None:
+                stack.append((n.right, False))
+            stack.append((n, True))
+            if n.left is not None:
+                stack.append((n.left, False))
+        return ''.join(parts)
 
 
 class BST(object):
@@ -78,13 +333,121 @@ class BST(object):
         self.root = None
 
     def get(self, key):
+        """
+        Return the value stored with key, None if the key is not in the tree.
+        """
+        if self.root is None:
+            return None
         return self.root.get(key)
 
-    def put(self, key):
+    def put(self, key, value=NO_VALUE):
+        """
+        Put the key in the tree with the given value.
+        Without a value a new key gets None, and a key that is already in the tree keeps its value.
+        """
         if self.root is None:
-            self.root = Node(key)
+            self.root = Node(key, value=None if value is NO_VALUE else value)
         else:
-            self.root.put(key)
+            self.root.put(key, value)
+
+    @classmethod
+    def from_sorted(cls, keys):
+        """
+        Build a perfectly balanced tree from an iterable of sorted keys in O(n).
+        Duplicate keys are only stored once.
+        """
+        return cls.from_sorted_items((key, None) for key in keys)
+
+    @classmethod
+    def from_sorted_items(cls, items):
+        """
+        Build a perfectly balanced tree from an iterable of (key, value) pairs sorted on key in O(n).
+        For duplicate keys the last value is kept.
+        """
+        items = unique_sorted(items)
+        tree = cls()
+        tree.root = BST.build_balanced(items, 0, len(items))
+        return tree
+
+    @staticmethod
+    def build_balanced(items, lo, hi):
+        """
+        Build a perfectly balanced subtree from the sorted (key, value) pairs items[lo:hi]
+        and return its root.
+        """
+        # The recursion only goes log2(n) levels deep
+        if lo >= hi:
+            return None
+        # The middle key becomes the root, so both sides get the same number of keys (+-1)
+        mid = (lo + hi) // 2
+        key, value = items[mid]
+        return Node(key,
+                    left=BST.build_balanced(items, lo, mid),
+                    right=BST.build_balanced(items, mid + 1, hi),
+                    value=value)
+
+    def save(self, path):
+        """
+        Save a compact snapshot of the tree: the keys (and values) in order, plus 2 bits per node
+        for the shape of the tree.
+        Numbers, strings and bytes are stored as is, other keys and values are pickled.
+        """
+        from snapshot import write_snapshot, tree_sections
+        write_snapshot(path, {'kind': 'BST', 'n': size(self.root)}, tree_sections(self.root))
+
+    @classmethod
+    def load(cls, path, mmap=False, allow_pickle=False):
+        """
+        Load a tree that was saved with save, in O(n) with the same shape.
+        With mmap return a read-only SortedArrayMap on the memory-mapped keys instead,
+        which can serve lookups right away without building any nodes.
+        Snapshots with pickled keys or values can only be loaded with allow_pickle=True.
+        Unpickling can run arbitrary code: only allow it for snapshots you trust.
+        """
+        from snapshot import read_snapshot, build_tree, SortedArrayMap
+        meta, sections = read_snapshot(path, mmap, allow_pickle)
+        if meta['kind'] != 'BST':
+            raise ValueError('{} is a snapshot of a {}, not of a BST'.format(path, meta['kind']))
+        if mmap:
+            return SortedArrayMap(sections['keys'], sections.get('values'))
+        tree = cls()
+        tree.root = build_tree(Node, meta['n'], sections)
+        return tree
+
+    def put_many(self, keys):
+        """
+        Put all given keys in the tree.
+        The batch is sorted and merged with the keys already in the tree, after which the tree
+        is rebuilt perfectly balanced. This takes O(n + m log m) for m new keys.
+        Keys that are already in the tree keep their value, new keys get None.
+        """
+        batch = unique_sorted((key, None) for key in sorted(keys))
+        if batch:
+            items = merge_unique(in_order_items(self.root), batch, keep_left=True)
+            self.root = BST.build_balanced(items, 0, len(items))
+
+    def update(self, items):
+        """
+        Put all (key, value) pairs from the given iterable or mapping in the tree,
+        like put_many but with values.
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+        # Sort on key only, the values don't need to be comparable
+        batch = unique_sorted(sorted(items, key=lambda item: item[0]))
+        if not batch:
+            return
+        items = merge_unique(in_order_items(self.root), batch)
+        self.root = BST.build_balanced(items, 0, len(items))
+
+    def size(self):
+        """
+        Return the number of keys in the tree.
+        """
+        return size(self.root)
+
+    def height(self):
+        return height(self.root)
 
     def min(self):
         if self.root is None:
@@ -96,59 +459,204 @@ class BST(object):
             return None
         return self.root.max()
 
+    def floor(self, key):
+        return floor(self.root, key)
+
+    def ceiling(self, key):
+        return ceiling(self.root, key)
+
+    def rank(self, key):
+        return rank(self.root, key)
+
+    def select(self, k):
+        return select(self.root, k)
+
+    def range(self, lo, hi):
+        """
+        Generate the keys lo <= key <= hi in sorted order.
+        """
+        return iter_range(self.root, lo, hi)
+
+    def range_size(self, lo, hi):
+        """
+        Return the number of keys lo <= key <= hi in O(log n).
+        """
+        if hi < lo:
+            return 0
+        count = rank(self.root, hi) - rank(self.root, lo)
+        if get_node(self.root, hi) is not None:
+            count += 1
+        return count
+
+    def __iter__(self):
+        """
+        Generate the keys in sorted order without building a list of all keys.
+        """
+        return iter_in_order(self.root)
+
+    def __reversed__(self):
+        return iter_in_order(self.root, reverse=True)
+
+    def __len__(self):
+        return size(self.root)
+
+    def __contains__(self, key):
+        return get_node(self.root, key) is not None
+
+    def __getitem__(self, key):
+        """
+        Return the value stored with key. Raise a KeyError if the key is not in the tree.
+        """
+        n = get_node(self.root, key)
+        if n is None:
+            raise KeyError(key)
+        return n.value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def keys(self):
+        return iter_in_order(self.root)
+
+    def values(self):
+        """
+        Generate the values in the order of their keys.
+        """
+        for n in iter_nodes(self.root):
+            yield n.value
+
+    def items(self):
+        """
+        Generate the (key, value) pairs in key order.
+        """
+        for n in iter_nodes(self.root):
+            yield n.key, n.value
+
     def delete_min(self):
         # replace the root with the root with the minimum removed
-        self.root = BST.delete_min_rec(self.root)
+        self.root = BST.delete_min_node(self.root)
 
     @staticmethod
-    def delete_min_rec(node):
-        # If the current left node is empty, the current node is the minimum
-        # return the right of the current node to replace the current node in the previous call.
+    def delete_min_node(node):
+        """
+        Remove the minimum from the subtree under node and return the new root of that subtree.
+        """
+        if node is None:
+            return None
+        # If the left node is empty, the node itself is the minimum
+        # and its right subtree replaces it.
         if node.left is None:
             return node.right
-        # The current left node should be the left node with the minimum deleted
-        node.left = BST.delete_min_rec(node.left)
-        # Return the current node to replace the current node with the minimum removed
+        # Walk down the left spine, the minimum is the last node without a left child.
+        # Every node on the way loses one node below it.
+        node.size -= 1
+        parent = node
+        while parent.left.left is not None:
+            parent = parent.left
+            parent.size -= 1
+        # The right subtree of the minimum replaces the minimum
+        parent.left = parent.left.right
         return node
 
     def delete(self, key):
         # The tree with the key element removed is the same tree with the element removed
-        self.root = BST.delete_rec(self.root, key)
+        self.root = BST.delete_node(self.root, key)
 
     @staticmethod
-    def delete_rec(n, key):
+    def delete_node(root, key):
+        """
+        Remove key from the subtree under root and return the new root of that subtree.
+        """
+        # Find the node n to delete, and the path to it
+        path = []
+        n = root
+        while n is not None:
+            if key < n.key:
+                path.append(n)
+                n = n.left
+            elif n.key < key:
+                path.append(n)
+                n = n.right
+            else:
+                break
         if n is None:
-            return None
-        if key < n.key:
-            # If the deleted key is on the left, replace the left part of the tree
-            # with the left part were key is deleted.
-            n.left = BST.delete_rec(n.left, key)
-        elif key > n.key:
-            # If the deleted key is on the right, replace the right part of the tree
-            # with the right part were key is deleted.
-            n.right = BST.delete_rec(n.right, key)
-        else:  # key == n.key
-            # Remove the key at this position
-            if n.right is None:
-                # If the right is empty, just replace the current node with its left part
-                return n.left
-            if n.left is None:
-                # If the left is empty, just replace the current node with its right part
-                return n.right
-            # Left or right is not empty
-            # all nodes from n.left < key, all nodes from n.right > key
-            # so new key needs to be the minimum key from n.right to keep this property true.
-            # Create new node as minimum of t.right (minimum has never any left nodes)
-            new_n = Node(n.right.min())
-            # Remove this minimum from n.right and set the result as the right of the new node
-            new_n.right = BST.delete_min_rec(n.right)
-            # set the left node of the current node (minimum of right, minimum has no left nodes)
-            new_n.left = n.left
-            n = new_n
-        return n
+            # Key is not in the tree
+            return root
+        # All nodes above n lose one node below them
+        for p in path:
+            p.size -= 1
+        if n.left is not None and n.right is not None:
+            # Both sides are not empty.
+            # All nodes from n.left < key, all nodes from n.right > key
+            # so the new key needs to be the minimum key from n.right to keep this property true.
+            # Copy the minimum of n.right into n and remove that minimum from n.right
+            # (the minimum never has a left node).
+            n.size -= 1
+            succ_parent = n
+            succ = n.right
+            while succ.left is not None:
+                succ_parent = succ
+                succ_parent.size -= 1
+                succ = succ.left
+            n.key = succ.key
+            n.value = succ.value
+            if succ_parent is n:
+                succ_parent.right = succ.right
+            else:
+                succ_parent.left = succ.right
+            return root
+        # At most one side is not empty, replace the node with that side
+        child = n.left if n.right is None else n.right
+        if not path:
+            return child
+        parent = path[-1]
+        if parent.left is n:
+            parent.left = child
+        else:
+            parent.right = child
+        return root
 
     def __str__(self):
         """
         Represent the tree as a string.
         """
-        return str(self.root)
\ No newline at end of file
+        return str(self.root)
+
+
+if __name__ == '__main__':
+    # Benchmark: lookups per second on a tree with 10^6 random keys,
+    # and inserting sorted keys (degenerate tree) without hitting the recursion limit.
+    import random
+    import time
+
+    n_keys = 10**6
+    keys = random.sample(range(10 * n_keys), n_keys)
+    tree = BST()
+    start = time.perf_counter()
+    for k in keys:
+        tree.put(k)
+    print('BST put {:,} random keys: {:.2f}s'.format(n_keys, time.perf_counter() - start))
+    queries = random.sample(keys, len(keys))
+    start = time.perf_counter()
+    for k in queries:
+        tree.get(k)
+    elapsed = time.perf_counter() - start
+    print('BST get {:,} keys: {:,.0f} lookups/s'.format(len(queries), len(queries) / elapsed))
+
+    n_sorted = 5000
+    tree = BST()
+    for k in range(n_sorted):
+        tree.put(k)
+    for k in range(n_sorted):
+        tree.delete(k)
+    print('BST put/delete {:,} sorted keys (degenerate tree): ok'.format(n_sorted))
+
+    start = time.perf_counter()
+    tree = BST.from_sorted(range(n_keys))
+    print('BST.from_sorted {:,} keys: {:.2f}s'.format(n_keys, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    for k in queries:
+        tree.rank(k)
+    elapsed = time.perf_counter() - start
+    print('BST rank {:,} keys: {:,.0f} queries/s'.format(len(queries), len(queries) / elapsed))
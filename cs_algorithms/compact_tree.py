@@ -0,0 +1,944 @@
+from array import array
+import sys
+
+from binary_search_tree import NO_VALUE, unique_sorted, merge_unique
+from red_black_tree import RedBlackTree
+
+
+# Index of the sentinel slot that stands for a missing child (the equivalent of a None link).
+# Like index 0 of the BinaryHeap list it holds no key: it has no children, size 0 and is black,
+# so reading the children, size or color of NIL gives NIL, 0 and black instead of another node's data.
+NIL = 0
+
+
+class CompactTree(object):
+    """
+    Binary search tree stored in parallel arrays instead of Node objects,
+    with the same interface as BST and RedBlackTree (keys with optional values).
+
+    Node i has its key at key_array[i], its value at value_array[i], its children at left[i]
+    and right[i] (NIL if empty), the number of nodes in its subtree at sizes[i] (used by rank and select)
+    and its color at red[i] (only used by the red-black tree). Slot 0 is the NIL sentinel.
+    Slots of deleted nodes are kept on a free list and reused by the next insert.
+
+    By default the keys are kept in a Python list so that any comparable key can be stored.
+    Give a typecode of the array module (e.g. 'q' or 'd') as key_typecode to store
+    numeric keys unboxed in a typed array. Values are always kept in a list.
+    Child indices are 32-bit, which limits the tree to 2^31 - 2 nodes.
+    """
+    def __init__(self, key_typecode=None):
+        self.key_typecode = key_typecode
+        self.clear()
+
+    def clear(self):
+        """
+        Remove all keys, keeping only the NIL sentinel.
+        """
+        self.root = NIL
+        self.key_array = [None] if self.key_typecode is None else array(self.key_typecode, [0])
+        self.value_array = [None]
+        self.left = array('i', [NIL])
+        self.right = array('i', [NIL])
+        self.sizes = array('i', [0])
+        self.red = bytearray(1)
+        # Indices of deleted nodes that can be reused
+        self.free = array('i')
+
+    def new_node(self, key, value=None, is_red=False):
+        """
+        Store a new node with the given key and value and return its index.
+        """
+        if self.free:
+            # Reuse the slot of a deleted node
+            i = self.free.pop()
+            self.key_array[i] = key
+            self.value_array[i] = value
+            self.left[i] = NIL
+            self.right[i] = NIL
+            self.sizes[i] = 1
+            self.red[i] = is_red
+            return i
+        self.key_array.append(key)
+        self.value_array.append(value)
+        self.left.append(NIL)
+        self.right.append(NIL)
+        self.sizes.append(1)
+        self.red.append(is_red)
+        return len(self.key_array) - 1
+
+    def free_node(self, i):
+        """
+        Release the slot of node i so it can be reused by new_node.
+        """
+        # Drop the references to the key and value so they can be garbage collected
+        if self.key_typecode is None:
+            self.key_array[i] = None
+        self.value_array[i] = None
+        self.free.append(i)
+
+    @classmethod
+    def from_sorted(cls, keys, key_typecode=None):
+        """
+        Build a balanced tree from an iterable of sorted keys in O(n).
+        Duplicate keys are only stored once.
+        """
+        return cls.from_sorted_items(((key, None) for key in keys), key_typecode)
+
+    @classmethod
+    def from_sorted_items(cls, items, key_typecode=None):
+        """
+        Build a balanced tree from an iterable of (key, value) pairs sorted on key in O(n).
+        For duplicate keys the last value is kept.
+        """
+        tree = cls(key_typecode)
+        tree.rebuild(unique_sorted(items))
+        return tree
+
+    def rebuild(self, items):
+        """
+        Replace the contents of the tree by the sorted (key, value) pairs with unique keys in items,
+        stored balanced in new arrays (in key order, without free slots).
+        """
+        self.clear()
+        self.root = self.build_balanced(items, 0, len(items))
+
+    def put_many(self, keys):
+        """
+        Put all given keys in the tree.
+        The batch is sorted and merged with the keys already in the tree, after which the tree
+        is rebuilt balanced. This takes O(n + m log m) for m new keys.
+        Keys that are already in the tree keep their value, new keys get None.
+        """
+        batch = unique_sorted((key, None) for key in sorted(keys))
+        if batch:
+            self.rebuild(merge_unique(self.in_order_items(), batch, keep_left=True))
+
+    def update(self, items):
+        """
+        Put all (key, value) pairs from the given iterable or mapping in the tree,
+        like put_many but with values.
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+        # Sort on key only, the values don't need to be comparable
+        batch = unique_sorted(sorted(items, key=lambda item: item[0]))
+        if batch:
+            self.rebuild(merge_unique(self.in_order_items(), batch))
+
+    def size(self):
+        """
+        Return the number of keys in the tree.
+        """
+        return self.sizes[self.root]
+
+    def __len__(self):
+        return self.sizes[self.root]
+
+    def nbytes(self):
+        """
+        Return the number of bytes used by the arrays that store the tree.
+        Keys and values stored as Python objects in a list are only counted as references.
+        """
+        return sum(sys.getsizeof(a) for a in (
+            self.key_array, self.value_array, self.left, self.right, self.sizes, self.red, self.free))
+
+    def node_index(self, key):
+        """
+        Return the index of the node with the given key. Return NIL if not found.
+        """
+        key_array = self.key_array
+        left = self.left
+        right = self.right
+        n = self.root
+        while n != NIL:
+            k = key_array[n]
+            if key < k:
+                n = left[n]
+            elif k < key:
+                n = right[n]
+            else:
+                return n
+        return NIL
+
+    def get(self, key):
+        """
+        Return the value stored with key, None if the key is not in the tree.
+        """
+        return self.value_array[self.node_index(key)]
+
+    def __contains__(self, key):
+        return self.node_index(key) != NIL
+
+    def __getitem__(self, key):
+        """
+        Return the value stored with key. Raise a KeyError if the key is not in the tree.
+        """
+        n = self.node_index(key)
+        if n == NIL:
+            raise KeyError(key)
+        return self.value_array[n]
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def height(self):
+        """
+        Return the number of nodes on the longest path from the root down to a leaf.
+        """
+        left = self.left
+        right = self.right
+        h = 0
+        level = [] if self.root == NIL else [self.root]
+        # Walk the tree level by level
+        while level:
+            h += 1
+            level = [c for n in level for c in (left[n], right[n]) if c != NIL]
+        return h
+
+    def min(self):
+        if self.root == NIL:
+            return None
+        left = self.left
+        n = self.root
+        while left[n] != NIL:
+            n = left[n]
+        return self.key_array[n]
+
+    def max(self):
+        if self.root == NIL:
+            return None
+        right = self.right
+        n = self.root
+        while right[n] != NIL:
+            n = right[n]
+        return self.key_array[n]
+
+    def floor(self, key):
+        """
+        Return the largest key <= key. Return None if there is none.
+        """
+        key_array = self.key_array
+        result = None
+        n = self.root
+        while n != NIL:
+            k = key_array[n]
+            if key < k:
+                n = self.left[n]
+            elif k < key:
+                # n is a candidate, but there might be a larger one on its right
+                result = k
+                n = self.right[n]
+            else:
+                return k
+        return result
+
+    def ceiling(self, key):
+        """
+        Return the smallest key >= key. Return None if there is none.
+        """
+        key_array = self.key_array
+        result = None
+        n = self.root
+        while n != NIL:
+            k = key_array[n]
+            if k < key:
+                n = self.right[n]
+            elif key < k:
+                # n is a candidate, but there might be a smaller one on its left
+                result = k
+                n = self.left[n]
+            else:
+                return k
+        return result
+
+    def rank(self, key):
+        """
+        Return the number of keys smaller than key.
+        """
+        key_array = self.key_array
+        sizes = self.sizes
+        r = 0
+        n = self.root
+        while n != NIL:
+            k = key_array[n]
+            if key < k:
+                n = self.left[n]
+            elif k < key:
+                # n and all the keys on its left are smaller
+                r += 1 + sizes[self.left[n]]
+                n = self.right[n]
+            else:
+                return r + sizes[self.left[n]]
+        return r
+
+    def select(self, k):
+        """
+        Return the key with rank k (the k-th smallest key, starting from 0).
+        Return None if k is out of range.
+        """
+        sizes = self.sizes
+        if k < 0 or k >= sizes[self.root]:
+            return None
+        n = self.root
+        while True:
+            left_size = sizes[self.left[n]]
+            if k < left_size:
+                n = self.left[n]
+            elif k > left_size:
+                # Skip n and the keys on its left
+                k -= left_size + 1
+                n = self.right[n]
+            else:
+                return self.key_array[n]
+
+    def range(self, lo, hi):
+        """
+        Generate the keys lo <= key <= hi in sorted order.
+        Only the O(log n) nodes on the boundary paths are visited besides the keys in the range.
+        """
+        key_array = self.key_array
+        left = self.left
+        right = self.right
+        stack = []
+        n = self.root
+        while stack or n != NIL:
+            while n != NIL:
+                if key_array[n] < lo:
+                    # n and everything on its left is too small
+                    n = right[n]
+                else:
+                    stack.append(n)
+                    n = left[n]
+            if not stack:
+                return
+            n = stack.pop()
+            if hi < key_array[n]:
+                # Everything that is left is larger than n
+                return
+            yield key_array[n]
+            n = right[n]
+
+    def range_size(self, lo, hi):
+        """
+        Return the number of keys lo <= key <= hi in O(log n).
+        """
+        if hi < lo:
+            return 0
+        count = self.rank(hi) - self.rank(lo)
+        if hi in self:
+            count += 1
+        return count
+
+    def iter_indices(self, reverse=False):
+        """
+        Generate the node indices in key order (descending if reverse).
+        The tree should not be modified while iterating.
+        """
+        first = self.right if reverse else self.left
+        second = self.left if reverse else self.right
+        stack = []
+        n = self.root
+        while stack or n != NIL:
+            # Go left as far as possible, then visit the node and continue on its right
+            while n != NIL:
+                stack.append(n)
+                n = first[n]
+            n = stack.pop()
+            yield n
+            n = second[n]
+
+    def __iter__(self):
+        """
+        Generate the keys in sorted order without building a list of all keys.
+        """
+        key_array = self.key_array
+        for n in self.iter_indices():
+            yield key_array[n]
+
+    def __reversed__(self):
+        key_array = self.key_array
+        for n in self.iter_indices(reverse=True):
+            yield key_array[n]
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        """
+        Generate the values in the order of their keys.
+        """
+        value_array = self.value_array
+        for n in self.iter_indices():
+            yield value_array[n]
+
+    def items(self):
+        """
+        Generate the (key, value) pairs in key order.
+        """
+        key_array = self.key_array
+        value_array = self.value_array
+        for n in self.iter_indices():
+            yield key_array[n], value_array[n]
+
+    def in_order_items(self):
+        """
+        Return the sorted list of (key, value) pairs.
+        """
+        return list(self.items())
+
+    def __str__(self):
+        """
+        Represent the tree as a string (same format as the Node based trees).
+        """
+        if self.root == NIL:
+            return 'None'
+        parts = []
+        stack = [(self.root, False)]
+        while stack:
+            n, visited = stack.pop()
+            if visited:
+                parts.append(str(self.key_array[n]))
+                continue
+            if n == NIL:
+                parts.append('}')
+                continue
+            parts.append('{')
+            # Pushed in reverse: left subtree, key, right subtree, closing brace
+            stack.append((NIL, False))
+            if self.right[n] != NIL:
+                stack.append((self.right[n], False))
+            stack.append((n, True))
+            if self.left[n] != NIL:
+                stack.append((self.left[n], False))
+        return ''.join(parts)
+
+
+class CompactBST(CompactTree):
+    """
+    Binary search tree with the same interface as BST, stored in parallel arrays.
+    """
+    def put(self, key, value=NO_VALUE):
+        """
+        Put the key in the tree with the given value.
+        Without a value a new key gets None, and a key that is already in the tree keeps its value.
+        """
+        key_array = self.key_array
+        left = self.left
+        right = self.right
+        path = []
+        n = self.root
+        while n != NIL:
+            k = key_array[n]
+            if key < k:
+                path.append(n)
+                if left[n] == NIL:
+                    left[n] = n = self.new_node(key, None if value is NO_VALUE else value)
+                    break
+                n = left[n]
+            elif k < key:
+                path.append(n)
+                if right[n] == NIL:
+                    right[n] = n = self.new_node(key, None if value is NO_VALUE else value)
+                    break
+                n = right[n]
+            else:
+                # Key is already in the tree, only update its value
+                if value is not NO_VALUE:
+                    self.value_array[n] = value
+                return
+        else:
+            self.root = self.new_node(key, None if value is NO_VALUE else value)
+            return
+        # All nodes on the path have one more node below them
+        sizes = self.sizes
+        for n in path:
+            sizes[n] += 1
+
+    def build_balanced(self, items, lo, hi):
+        """
+        Store a perfectly balanced subtree from the sorted (key, value) pairs items[lo:hi]
+        and return the index of its root.
+        """
+        # The recursion only goes log2(n) levels deep
+        if lo >= hi:
+            return NIL
+        # The middle key becomes the root, so both sides get the same number of keys (+-1)
+        mid = (lo + hi) // 2
+        # The left subtree is stored first, so the slots are in key order
+        left = self.build_balanced(items, lo, mid)
+        key, value = items[mid]
+        n = self.new_node(key, value)
+        self.left[n] = left
+        self.right[n] = self.build_balanced(items, mid + 1, hi)
+        self.sizes[n] = hi - lo
+        return n
+
+    def delete_min(self):
+        n = self.root
+        if n == NIL:
+            return
+        left = self.left
+        if left[n] == NIL:
+            # The root is the minimum, its right subtree replaces it
+            self.root = self.right[n]
+            self.free_node(n)
+            return
+        # Walk down the left spine, the minimum is the last node without a left child.
+        # Every node on the way loses one node below it.
+        sizes = self.sizes
+        sizes[n] -= 1
+        parent = n
+        while left[left[parent]] != NIL:
+            parent = left[parent]
+            sizes[parent] -= 1
+        n = left[parent]
+        left[parent] = self.right[n]
+        self.free_node(n)
+
+    def delete(self, key):
+        key_array = self.key_array
+        left = self.left
+        right = self.right
+        sizes = self.sizes
+        # Find the node n to delete, and the path to it
+        path = []
+        n = self.root
+        while n != NIL:
+            k = key_array[n]
+            if key < k:
+                path.append(n)
+                n = left[n]
+            elif k < key:
+                path.append(n)
+                n = right[n]
+            else:
+                break
+        if n == NIL:
+            # Key is not in the tree
+            return
+        # All nodes above n lose one node below them
+        for p in path:
+            sizes[p] -= 1
+        if left[n] != NIL and right[n] != NIL:
+            # Both sides are not empty, move the minimum of the right side into n
+            # and delete the node that held that minimum instead.
+            sizes[n] -= 1
+            succ_parent = n
+            succ = right[n]
+            while left[succ] != NIL:
+                succ_parent = succ
+                sizes[succ_parent] -= 1
+                succ = left[succ]
+            key_array[n] = key_array[succ]
+            self.value_array[n] = self.value_array[succ]
+            if succ_parent == n:
+                right[succ_parent] = right[succ]
+            else:
+                left[succ_parent] = right[succ]
+            self.free_node(succ)
+            return
+        # At most one side is not empty, replace the node with that side
+        child = left[n] if right[n] == NIL else right[n]
+        if not path:
+            self.root = child
+        elif left[path[-1]] == n:
+            left[path[-1]] = child
+        else:
+            right[path[-1]] = child
+        self.free_node(n)
+
+
+class CompactRedBlackTree(CompactTree):
+    """
+    Left-leaning red-black tree with the same interface as RedBlackTree, stored in parallel arrays.
+    """
+    def put(self, key, value=NO_VALUE):
+        """
+        Put the key in the tree with the given value.
+        Without a value a new key gets None, and a key that is already in the tree keeps its value.
+        """
+        key_array = self.key_array
+        left = self.left
+        right = self.right
+        # Walk down to the insertion point, remembering the path and the
+        # direction taken at each node so the rotations can be done bottom-up.
+        path = []
+        went_left = []
+        n = self.root
+        while n != NIL:
+            k = key_array[n]
+            if key < k:
+                path.append(n)
+                went_left.append(True)
+                n = left[n]
+            elif k < key:
+                path.append(n)
+                went_left.append(False)
+                n = right[n]
+            else:
+                # Key is already in the tree, only update its value
+                if value is not NO_VALUE:
+                    self.value_array[n] = value
+                return
+        # Insert the new key as a red node, and fix the tree on the way back up.
+        n = self.new_node(key, None if value is NO_VALUE else value, is_red=True)
+        self.root = self.balance_path(path, went_left, n)
+        self.red[self.root] = False
+
+    def build_balanced(self, items, lo, hi, black_height=None):
+        """
+        Store a left-leaning red-black subtree from the sorted (key, value) pairs items[lo:hi]
+        with the given black height (the largest possible by default) and return the index of its root.
+        Same shape and colors as RedBlackTree.build_balanced.
+        """
+        # The recursion only goes log2(n) levels deep
+        n = hi - lo
+        if black_height is None:
+            black_height = RedBlackTree.black_height_for(n)
+        if n == 0:
+            return NIL
+        # Maximum number of keys in a subtree one level lower
+        sub_max = 3 ** (black_height - 1) - 1
+        if n - 1 <= 2 * sub_max:
+            # 2-node, split the other keys evenly over the two subtrees
+            mid = lo + (n - 1) // 2
+            left = self.build_balanced(items, lo, mid, black_height - 1)
+            key, value = items[mid]
+            h = self.new_node(key, value)
+            self.left[h] = left
+            self.right[h] = self.build_balanced(items, mid + 1, hi, black_height - 1)
+            self.sizes[h] = n
+            return h
+        # 3-node, split the other keys evenly over the three subtrees
+        s1 = (n - 2) // 3
+        s2 = (n - 2 - s1) // 2
+        a = lo + s1
+        b = a + 1 + s2
+        left = self.build_balanced(items, lo, a, black_height - 1)
+        key, value = items[a]
+        red = self.new_node(key, value, is_red=True)
+        self.left[red] = left
+        self.right[red] = self.build_balanced(items, a + 1, b, black_height - 1)
+        self.sizes[red] = b - lo
+        key, value = items[b]
+        h = self.new_node(key, value)
+        self.left[h] = red
+        self.right[h] = self.build_balanced(items, b + 1, hi, black_height - 1)
+        self.sizes[h] = n
+        return h
+
+    def balance_path(self, path, went_left, child):
+        """
+        Link child below the last node of the path and rebalance all nodes on the path bottom-up.
+        went_left[i] tells on which side of path[i] the path continues.
+        Return the new root.
+        """
+        left = self.left
+        right = self.right
+        for i in range(len(path) - 1, -1, -1):
+            n = path[i]
+            if went_left[i]:
+                left[n] = child
+            else:
+                right[n] = child
+            child = self.balance(n)
+        return child
+
+    def delete_min(self):
+        """
+        Delete the minimum key from the tree.
+        """
+        root = self.root
+        if root == NIL:
+            return
+        if not self.is_red(self.left[root]) and not self.is_red(self.right[root]):
+            # Make the root red so it can be borrowed from on the way down
+            self.red[root] = True
+        self.root = self.delete_min_node(root, [], [])
+        if self.root != NIL:
+            self.red[self.root] = False
+
+    def delete_min_node(self, h, path, went_left):
+        """
+        Delete the minimum from the subtree under h, which is reached through the given path.
+        Return the new root of the whole path.
+        """
+        left = self.left
+        # Walk down the left side, making sure the current node is never a 2-node
+        while left[h] != NIL:
+            if not self.is_red(left[h]) and not self.is_red(left[left[h]]):
+                # The left child is a 2-node, borrow a key from its sibling or parent
+                h = self.move_red_left(h)
+            path.append(h)
+            went_left.append(True)
+            h = left[h]
+        # h is the minimum and has no children, remove it
+        self.free_node(h)
+        return self.balance_path(path, went_left, NIL)
+
+    def delete_max(self):
+        """
+        Delete the maximum key from the tree.
+        """
+        if self.root == NIL:
+            return
+        left = self.left
+        right = self.right
+        if not self.is_red(left[self.root]) and not self.is_red(right[self.root]):
+            self.red[self.root] = True
+        path = []
+        went_left = []
+        h = self.root
+        while True:
+            if self.is_red(left[h]):
+                # Lean the red link to the right, so the maximum can be reached through it
+                h = self.rotate_right(h)
+            if right[h] == NIL:
+                # h is the maximum and has no children, remove it
+                break
+            if not self.is_red(right[h]) and not self.is_red(left[right[h]]):
+                h = self.move_red_right(h)
+            path.append(h)
+            went_left.append(False)
+            h = right[h]
+        self.free_node(h)
+        self.root = self.balance_path(path, went_left, NIL)
+        if self.root != NIL:
+            self.red[self.root] = False
+
+    def delete(self, key):
+        """
+        Delete the given key from the tree, if it is in the tree.
+        The slots of deleted nodes are reused by the next inserts.
+        """
+        if self.node_index(key) == NIL:
+            return
+        key_array = self.key_array
+        left = self.left
+        right = self.right
+        if not self.is_red(left[self.root]) and not self.is_red(right[self.root]):
+            # Make the root red so it can be borrowed from on the way down
+            self.red[self.root] = True
+        path = []
+        went_left = []
+        h = self.root
+        while True:
+            if key < key_array[h]:
+                if not self.is_red(left[h]) and not self.is_red(left[left[h]]):
+                    h = self.move_red_left(h)
+                path.append(h)
+                went_left.append(True)
+                h = left[h]
+                continue
+            if self.is_red(left[h]):
+                # Lean the red link to the right, so the key can be reached through it
+                h = self.rotate_right(h)
+            if not key_array[h] < key and right[h] == NIL:
+                # Found the key at the bottom of the tree, remove it
+                self.free_node(h)
+                self.root = self.balance_path(path, went_left, NIL)
+                break
+            if not self.is_red(right[h]) and not self.is_red(left[right[h]]):
+                h = self.move_red_right(h)
+            path.append(h)
+            went_left.append(False)
+            if not key_array[h] < key:
+                # Found the key: replace it with its successor, and delete the successor
+                # (the minimum on the right) instead.
+                succ = right[h]
+                while left[succ] != NIL:
+                    succ = left[succ]
+                key_array[h] = key_array[succ]
+                self.value_array[h] = self.value_array[succ]
+                self.root = self.delete_min_node(right[h], path, went_left)
+                break
+            h = right[h]
+        if self.root != NIL:
+            self.red[self.root] = False
+
+    def move_red_left(self, h):
+        """
+        Make the left child of h, or one of its children, red.
+        """
+        self.flip_colors(h)
+        if self.is_red(self.left[self.right[h]]):
+            # The sibling on the right is a 3-node, move one of its keys over to the left
+            self.right[h] = self.rotate_right(self.right[h])
+            h = self.rotate_left(h)
+            self.flip_colors(h)
+        return h
+
+    def move_red_right(self, h):
+        """
+        Make the right child of h, or one of its children, red.
+        """
+        self.flip_colors(h)
+        if self.is_red(self.left[self.left[h]]):
+            # The sibling on the left is a 3-node, move one of its keys over to the right
+            h = self.rotate_right(h)
+            self.flip_colors(h)
+        return h
+
+    def check_invariants(self):
+        """
+        Check that the tree is a valid left-leaning red-black tree, like RedBlackTree.check_invariants,
+        and that the NIL sentinel is untouched.
+        Raise a ValueError describing the first violation found, return True otherwise.
+        """
+        key_array = self.key_array
+        left = self.left
+        right = self.right
+        sizes = self.sizes
+        if left[NIL] != NIL or right[NIL] != NIL or sizes[NIL] != 0:
+            raise ValueError('The NIL sentinel was modified')
+        if self.is_red(self.root):
+            raise ValueError('Root should be black')
+        # Post-order walk with an explicit stack, keeping the black height of each visited node
+        black_heights = {NIL: 0}
+        stack = [(self.root, False)]
+        while stack:
+            n, visited = stack.pop()
+            if n == NIL:
+                continue
+            if not visited:
+                stack.append((n, True))
+                stack.append((right[n], False))
+                stack.append((left[n], False))
+                continue
+            if sizes[n] != 1 + sizes[left[n]] + sizes[right[n]]:
+                raise ValueError('Wrong subtree size at {!r}'.format(key_array[n]))
+            if self.is_red(right[n]):
+                raise ValueError('Red right link at {!r}'.format(key_array[n]))
+            if self.red[n] and self.is_red(left[n]):
+                raise ValueError('Two red links in a row at {!r}'.format(key_array[n]))
+            left_height = black_heights[left[n]]
+            right_height = black_heights[right[n]]
+            if left_height != right_height:
+                raise ValueError('Black height differs between the left and right of {!r}'.format(key_array[n]))
+            black_heights[n] = left_height + (0 if self.red[n] else 1)
+        previous = None
+        for i, key in enumerate(self):
+            if i > 0 and not previous < key:
+                raise ValueError('Keys not in order at {!r}'.format(key))
+            previous = key
+        return True
+
+    def is_red(self, n):
+        return n != NIL and self.red[n]
+
+    def balance(self, n):
+        """
+        Restore the left-leaning red-black invariants at node n after one of its
+        subtrees changed, and return the node that replaces n.
+        """
+        left = self.left
+        right = self.right
+        if self.is_red(right[n]) and not self.is_red(left[n]):
+            n = self.rotate_left(n)
+        if self.is_red(left[n]) and self.is_red(left[left[n]]):
+            n = self.rotate_right(n)
+        if self.is_red(left[n]) and self.is_red(right[n]):
+            self.flip_colors(n)
+        # One of the subtrees changed, so recount the nodes under n
+        self.sizes[n] = 1 + self.sizes[left[n]] + self.sizes[right[n]]
+        return n
+
+    def rotate_left(self, n):
+        """
+        Right red link of node n needs to be rotated to the left.
+        """
+        sizes = self.sizes
+        r = self.right[n]
+        self.right[n] = self.left[r]
+        self.left[r] = n
+        # r takes over the subtree of n
+        sizes[r] = sizes[n]
+        sizes[n] = 1 + sizes[self.left[n]] + sizes[self.right[n]]
+        self.red[r] = self.red[n]
+        self.red[n] = True
+        return r
+
+    def rotate_right(self, n):
+        """
+        Left red link of node n needs to be rotated to the right.
+        """
+        sizes = self.sizes
+        l = self.left[n]
+        self.left[n] = self.right[l]
+        self.right[l] = n
+        # l takes over the subtree of n
+        sizes[l] = sizes[n]
+        sizes[n] = 1 + sizes[self.left[n]] + sizes[self.right[n]]
+        self.red[l] = self.red[n]
+        self.red[n] = True
+        return l
+
+    def flip_colors(self, n):
+        """
+        Flip the colors of this node and its two children
+        (splits a temporary 4-node on insert, and combines one on delete).
+        """
+        red = self.red
+        red[n] = not red[n]
+        red[self.left[n]] = not red[self.left[n]]
+        red[self.right[n]] = not red[self.right[n]]
+
+
+def node_tree_nbytes(tree):
+    """
+    Return the number of bytes used by the Node objects of a BST or RedBlackTree.
+    Like CompactTree.nbytes, the key objects themselves are not counted.
+    """
+    total = 0
+    stack = [] if tree.root is None else [tree.root]
+    while stack:
+        n = stack.pop()
+        total += sys.getsizeof(n)
+        if hasattr(n, '__dict__'):
+            total += sys.getsizeof(n.__dict__)
+        if n.left is not None:
+            stack.append(n.left)
+        if n.right is not None:
+            stack.append(n.right)
+    return total
+
+
+if __name__ == '__main__':
+    # Memory per key report for the Node based and the array based trees
+    import random
+    from binary_search_tree import BST
+    from red_black_tree import RedBlackTree
+
+    n_keys = 10**6
+    keys = random.sample(range(10 * n_keys), n_keys)
+    trees = [
+        ('BST', BST(), node_tree_nbytes),
+        ('RedBlackTree', RedBlackTree(), node_tree_nbytes),
+        ('CompactBST', CompactBST(), CompactTree.nbytes),
+        ('CompactBST(q)', CompactBST(key_typecode='q'), CompactTree.nbytes),
+        ('CompactRedBlackTree', CompactRedBlackTree(), CompactTree.nbytes),
+        ('CompactRedBlackTree(q)', CompactRedBlackTree(key_typecode='q'), CompactTree.nbytes),
+    ]
+    print('{:<24} {:>14}'.format('tree', 'bytes per key'))
+    for name, tree, nbytes in trees:
+        for k in keys:
+            tree.put(k)
+        print('{:<24} {:>14.1f}'.format(name, nbytes(tree) / n_keys))
+
+    # Deleted slots are reused by the next inserts
+    tree = CompactBST(key_typecode='q')
+    for k in keys:
+        tree.put(k)
+    for k in keys[:n_keys // 2]:
+        tree.delete(k)
+    for k in keys[:n_keys // 2]:
+        tree.put(k)
+    print('CompactBST slots after deleting and reinserting half: {:,}'.format(len(tree.key_array) - 1))
+    tree = CompactRedBlackTree(key_typecode='q')
+    for k in keys:
+        tree.put(k)
+    for k in keys[:n_keys // 2]:
+        tree.delete(k)
+    for k in keys[:n_keys // 2]:
+        tree.put(k)
+    print('CompactRedBlackTree slots after deleting and reinserting half: {:,}'.format(len(tree.key_array) - 1))
@@ -0,0 +1,220 @@
+"""
+External merge sort of text lines that don't fit in memory.
+
+The lines are read into memory until the memory budget is used, sorted, and spilled to a
+temporary file (a run). The sorted runs are then merged with a k-way merge: a BinaryHeap holds
+the next line of every run, so the smallest next line is always at the root. When there are
+more runs than the fan-in limit, groups of runs are first merged into longer runs.
+Runs are read and written in large blocks of lines, the final merge is a generator.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from priority_queue import BinaryHeap
+
+
+# Runs are written and read back without newline translation: only '\n' ends a line, so a line with
+# a '\r' in it stays one line (newline='' would still split it when reading).
+# surrogatepass lets any str round-trip through a run file.
+RUN_FILE_OPTIONS = {'encoding': 'utf-8', 'errors': 'surrogatepass', 'newline': '\n'}
+
+
+def read_run(path, buffer_bytes):
+    """
+    Generate the lines of a run file, read in blocks of about buffer_bytes.
+    """
+    with open(path, 'r', buffering=buffer_bytes, **RUN_FILE_OPTIONS) as f:
+        while True:
+            lines = f.readlines(buffer_bytes)
+            if not lines:
+                return
+            yield from lines
+
+
+def write_run(lines, directory, buffer_bytes):
+    """
+    Write the given lines to a new run file in directory and return its path.
+    Lines are collected and written in blocks of about buffer_bytes.
+    """
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.run')
+    with os.fdopen(fd, 'w', buffering=buffer_bytes, **RUN_FILE_OPTIONS) as f:
+        block = []
+        block_bytes = 0
+        for line in lines:
+            block.append(line)
+            block_bytes += len(line)
+            if block_bytes >= buffer_bytes:
+                f.writelines(block)
+                block = []
+                block_bytes = 0
+        f.writelines(block)
+    return path
+
+
+class RunHead(object):
+    """
+    The next line of a run in the merge heap.
+    Ordered in reverse on (key, run index), so the smallest one is at the root of the max heap.
+    """
+    __slots__ = ('key', 'run', 'line')
+
+    def __init__(self, key, run, line):
+        self.key = key
+        self.run = run
+        self.line = line
+
+    def __lt__(self, other):
+        if self.key == other.key:
+            return other.run < self.run
+        return other.key < self.key
+
+
+def merge_runs(runs, key=None):
+    """
+    Merge the given iterators of sorted lines into one sorted generator with a k-way merge.
+    On equal keys the line of the earliest run goes first, so the merge is stable.
+    """
+    heap = BinaryHeap()
+    for i, run in enumerate(runs):
+        for line in run:
+            heap.insert(RunHead(line if key is None else key(line), i, line))
+            break
+    while not heap.is_empty():
+        head = heap.heap[1]
+        yield head.line
+        line = next(runs[head.run], None)
+        if line is None:
+            heap.delete_max()
+        else:
+            # Reuse the root for the next line of the same run and sink it into place
+            head.line = line
+            head.key = line if key is None else key(line)
+            heap.sink(1)
+
+
+def with_newline(lines):
+    """
+    Make sure every line ends with a newline, so lines don't get glued together in the runs.
+    """
+    for line in lines:
+        yield line if line.endswith('\n') else line + '\n'
+
+
+def external_sort(lines, memory_budget=2**28, fan_in=64, key=None, directory=None):
+    """
+    Generate the given lines (an iterable of strings, e.g. an open file) in sorted order
+    (on key(line) if key is given), holding about memory_budget bytes of lines in memory.
+    At most fan_in runs are merged at the same time. Temporary runs are written in directory
+    (the system temp directory by default) and removed when the generator is done or closed.
+    Every line is output with a newline at the end.
+    """
+    if fan_in < 2:
+        raise ValueError('fan_in should be at least 2, got {}'.format(fan_in))
+    # Half the budget for the lines of a run, the other half for the read buffers of the merge
+    run_budget = memory_budget // 2
+    buffer_bytes = max(2**12, memory_budget // (2 * fan_in))
+    with tempfile.TemporaryDirectory(dir=directory, prefix='external_sort') as tmp:
+        paths = []
+        run = []
+        run_bytes = 0
+        for line in with_newline(lines):
+            run.append(line)
+            # Size of the string and the list slot that points to it
+            run_bytes += sys.getsizeof(line) + 8
+            if run_bytes >= run_budget:
+                run.sort(key=key)
+                paths.append(write_run(run, tmp, buffer_bytes))
+                run = []
+                run_bytes = 0
+        run.sort(key=key)
+        if not paths:
+            # Everything fits in memory
+            yield from run
+            return
+        if run:
+            paths.append(write_run(run, tmp, buffer_bytes))
+        del run
+        # Merge groups of runs until the last merge has at most fan_in runs
+        while len(paths) > fan_in:
+            merged = []
+            for i in range(0, len(paths), fan_in):
+                group = paths[i:i + fan_in]
+                if len(group) == 1:
+                    merged.extend(group)
+                    continue
+                merged.append(write_run(
+                    merge_runs([read_run(path, buffer_bytes) for path in group], key), tmp, buffer_bytes))
+                for path in group:
+                    os.remove(path)
+            paths = merged
+        yield from merge_runs([read_run(path, buffer_bytes) for path in paths], key)
+
+
+def sort_file(in_path, out_path, memory_budget=2**28, fan_in=64, key=None, directory=None, encoding='utf-8'):
+    """
+    Sort the lines of in_path into out_path with external_sort.
+    Only '\n' ends a line, line endings are kept as they are in the input.
+    """
+    buffer_bytes = 2**20
+    with open(in_path, 'r', buffering=buffer_bytes, encoding=encoding, newline='\n') as f:
+        lines = external_sort(f, memory_budget, fan_in, key, directory)
+        with open(out_path, 'w', buffering=buffer_bytes, encoding=encoding, newline='\n') as out:
+            block = []
+            for line in lines:
+                block.append(line)
+                if len(block) == 2**14:
+                    out.writelines(block)
+                    block = []
+            out.writelines(block)
+
+
+if __name__ == '__main__':
+    # Benchmark: sort a synthetic log file of --size-mb MB with a memory budget of --memory-mb MB
+    import random
+    import resource
+    import time
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=int, default=2048, help='size of the synthetic log file')
+    parser.add_argument('--memory-mb', type=int, default=256, help='memory budget of the sort')
+    parser.add_argument('--fan-in', type=int, default=64)
+    parser.add_argument('--directory', default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    in_path = os.path.join(args.directory, 'external_sort_input.log')
+    out_path = os.path.join(args.directory, 'external_sort_output.log')
+    rng = random.Random(42)
+    levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+    start = time.perf_counter()
+    with open(in_path, 'w', buffering=2**20, encoding='utf-8', newline='\n') as f:
+        size = 0
+        while size < args.size_mb * 2**20:
+            block = [
+                '{:010d} {} host{:03d} request {:08x} took {} ms\n'.format(
+                    rng.randrange(10**10), rng.choice(levels), rng.randrange(1000),
+                    rng.getrandbits(32), rng.randrange(10000))
+                for _ in range(10**4)]
+            f.writelines(block)
+            size += sum(map(len, block))
+    print('Generated {:,.0f} MB in {:.1f}s'.format(size / 2**20, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    sort_file(in_path, out_path, memory_budget=args.memory_mb * 2**20, fan_in=args.fan_in, directory=args.directory)
+    elapsed = time.perf_counter() - start
+    print('external_sort: {:,.1f} MB/s, peak memory {:,.0f} MB (budget {} MB)'.format(
+        size / 2**20 / elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, args.memory_mb))
+
+    # Check the output
+    n_lines = 0
+    previous = ''
+    with open(out_path, encoding='utf-8', newline='\n') as f:
+        for line in f:
+            assert not line < previous
+            previous = line
+            n_lines += 1
+    with open(in_path, encoding='utf-8', newline='\n') as f:
+        assert n_lines == sum(1 for _ in f)
+    os.remove(in_path)
+    os.remove(out_path)
@@ -0,0 +1,329 @@
+from priority_queue import BinaryHeap
+
+
+class DaryHeap(BinaryHeap):
+    """
+    d-ary max heap with the same interface as BinaryHeap.
+
+    Each node has up to d children, so the tree is only log_d(n) levels deep:
+    insert (swim) takes fewer steps than in a binary heap, while delete_max (sink)
+    needs to compare d children per level. A d of 4 or 8 favors insert heavy workloads,
+    and keeps the children of a node next to each other in the list.
+
+    Like BinaryHeap the heap starts at index 1.
+    The parent of the node at index i is at index (i-2)//d + 1,
+    its children are at the indices d(i-1)+2 up to d*i+1.
+    """
+    def __init__(self, d=4):
+        if d < 2:
+            raise ValueError('d should be at least 2, got {}'.format(d))
+        super().__init__()
+        self.d = d
+
+    @classmethod
+    def from_iterable(cls, keys, d=4):
+        """
+        Build a heap from the given keys in O(n) with bottom-up heapify.
+        """
+        pq = cls(d)
+        pq.heap.extend(keys)
+        pq.heapify()
+        return pq
+
+    def init_args(self):
+        return {'d': self.d}
+
+    def heapify(self):
+        """
+        Restore the heap order of the whole heap list in O(n).
+        """
+        n = self.size()
+        if n < 2:
+            return
+        # Sink all nodes that have children, from the bottom up, starting at the parent of the last node.
+        for i in range((n - 2) // self.d + 1, 0, -1):
+            self.sink(i)
+
+    def swim(self, i):
+        """
+        Bottom-up reheapify (swim).
+        """
+        heap = self.heap
+        d = self.d
+        key = heap[i]
+        # Move smaller parents down into the hole at i
+        while i > 1:
+            parent = (i - 2) // d + 1
+            if not heap[parent] < key:
+                break
+            heap[i] = heap[parent]
+            i = parent
+        heap[i] = key
+
+    def sink(self, i):
+        """
+        Top-down reheapify (sink).
+        """
+        heap = self.heap
+        d = self.d
+        n = len(heap) - 1
+        key = heap[i]
+        while True:
+            first = d * (i - 1) + 2
+            if first > n:
+                break
+            # Find the largest of the (up to d) children
+            j = first
+            for c in range(first + 1, min(first + d, n + 1)):
+                if heap[j] < heap[c]:
+                    j = c
+            if not key < heap[j]:
+                break
+            # Move the largest child up into the hole at i
+            heap[i] = heap[j]
+            i = j
+        heap[i] = key
+
+
+class PairingNode(object):
+    """
+    Node of a pairing heap: a key, the first of its children and its next sibling.
+    """
+    __slots__ = ('key', 'child', 'sibling')
+
+    def __init__(self, key):
+        self.key = key
+        self.child = None
+        self.sibling = None
+
+
+class PairingHeap(object):
+    """
+    Max pairing heap with the interface of BinaryHeap: from_iterable, insert, push_many, max,
+    delete_max, pop_many, pushpop, replace, size, is_empty, init_args, save and load.
+    The keys are kept in a tree instead of a list, so there is no heap list and no heapify.
+
+    The heap is a tree where every node is larger than or equal to its children,
+    but nodes can have any number of children.
+    insert and meld are O(1): the root with the smaller key becomes the first child of the other root.
+    delete_max takes O(log n) amortized: the children of the root are melded pairwise
+    from left to right, and the results are then melded from right to left.
+    """
+    def __init__(self):
+        self.root = None
+        self.n = 0
+
+    @classmethod
+    def from_iterable(cls, keys):
+        pq = cls()
+        pq.push_many(keys)
+        return pq
+
+    def size(self):
+        return self.n
+
+    def is_empty(self):
+        return self.n == 0
+
+    @staticmethod
+    def link(a, b):
+        """
+        Meld two (sibling-less) trees and return the root of the result.
+        """
+        if a is None:
+            return b
+        if b is None:
+            return a
+        if a.key < b.key:
+            a, b = b, a
+        # b becomes the first child of a
+        b.sibling = a.child
+        a.child = b
+        return a
+
+    def insert(self, key):
+        self.root = PairingHeap.link(self.root, PairingNode(key))
+        self.n += 1
+
+    def push_many(self, keys):
+        for key in keys:
+            self.insert(key)
+
+    def iter_keys(self):
+        """
+        Generate the keys in pre-order, the maximum first.
+        """
+        stack = [] if self.root is None else [self.root]
+        while stack:
+            n = stack.pop()
+            yield n.key
+            if n.sibling is not None:
+                stack.append(n.sibling)
+            if n.child is not None:
+                stack.append(n.child)
+
+    def init_args(self):
+        """
+        Return the keyword arguments to create an empty heap like this one (stored in snapshots).
+        """
+        return {}
+
+    def save(self, path):
+        """
+        Save a snapshot of the heap: its keys in pre-order, the maximum first,
+        in the same format as BinaryHeap.save.
+        """
+        from snapshot import write_snapshot
+        write_snapshot(path, {'kind': type(self).__name__, 'init': self.init_args()}, {'heap': list(self.iter_keys())})
+
+    @classmethod
+    def load(cls, path, mmap=False, allow_pickle=False):
+        """
+        Load a heap that was saved with save in O(n).
+        With mmap return a ReadOnlyHeap on the memory-mapped keys instead, which can serve max right away.
+        Snapshots with pickled keys can only be loaded with allow_pickle=True.
+        Unpickling can run arbitrary code: only allow it for snapshots you trust.
+        """
+        from snapshot import read_snapshot, ReadOnlyHeap
+        meta, sections = read_snapshot(path, mmap, allow_pickle)
+        if meta['kind'] != cls.__name__:
+            raise ValueError('{} is a snapshot of a {}, not of a {}'.format(path, meta['kind'], cls.__name__))
+        heap = sections['heap']
+        if mmap:
+            return ReadOnlyHeap(heap)
+        return cls.from_iterable(heap.tolist() if hasattr(heap, 'tolist') else heap, **meta['init'])
+
+    def meld(self, other):
+        """
+        Move all keys of another PairingHeap into this heap in O(1). The other heap is emptied.
+        """
+        self.root = PairingHeap.link(self.root, other.root)
+        self.n += other.n
+        other.root = None
+        other.n = 0
+
+    def max(self):
+        if self.root is None:
+            raise IndexError('max of an empty heap')
+        return self.root.key
+
+    def delete_max(self):
+        root = self.root
+        if root is None:
+            raise IndexError('delete_max from an empty heap')
+        # First pass: meld the children pairwise from left to right
+        pairs = []
+        c = root.child
+        while c is not None:
+            a = c
+            b = c.sibling
+            c = None if b is None else b.sibling
+            a.sibling = None
+            if b is not None:
+                b.sibling = None
+            pairs.append(PairingHeap.link(a, b))
+        # Second pass: meld the pairs from right to left
+        new_root = None
+        for tree in reversed(pairs):
+            new_root = PairingHeap.link(tree, new_root)
+        self.root = new_root
+        self.n -= 1
+        return root.key
+
+    def pop_many(self, k):
+        """
+        Delete and return the k largest elements in the heap, largest first.
+        """
+        return [self.delete_max() for _ in range(min(k, self.n))]
+
+    def pushpop(self, key):
+        """
+        Insert the given key and then delete and return the maximum.
+        """
+        if self.root is None or not key < self.root.key:
+            return key
+        self.insert(key)
+        return self.delete_max()
+
+    def replace(self, key):
+        """
+        Delete and return the maximum, and then insert the given key.
+        """
+        max = self.delete_max()
+        self.insert(key)
+        return max
+
+
+# Heap implementations that can be used instead of BinaryHeap, by name
+HEAP_BACKENDS = {
+    'binary': BinaryHeap,
+    'dary': DaryHeap,
+    'pairing': PairingHeap,
+}
+
+
+def make_heap(backend='binary', **kwargs):
+    """
+    Create an empty max heap with the BinaryHeap interface, using the named backend.
+    Keyword arguments are passed to the backend (e.g. d for 'dary').
+    """
+    try:
+        cls = HEAP_BACKENDS[backend]
+    except KeyError:
+        raise ValueError('Unknown heap backend {!r}, choose from {}'.format(
+            backend, sorted(HEAP_BACKENDS))) from None
+    return cls(**kwargs)
+
+
+if __name__ == '__main__':
+    # Benchmark matrix: throughput of each backend on insert heavy, delete heavy and mixed traces.
+    import random
+    import time
+
+    n_ops = 10**6
+    rng = random.Random(42)
+
+    def make_trace(insert_fraction):
+        """
+        Return a list of operations, a key for insert and None for delete_max.
+        Deletes are only generated when the heap isn't empty.
+        """
+        trace = []
+        size = 0
+        for _ in range(n_ops):
+            if size == 0 or rng.random() < insert_fraction:
+                trace.append(rng.random())
+                size += 1
+            else:
+                trace.append(None)
+                size -= 1
+        return trace
+
+    traces = [
+        ('insert-heavy (90% insert)', make_trace(0.9)),
+        ('mixed (50% insert)', make_trace(0.5)),
+        # Fill the heap and then empty it completely
+        ('delete-heavy (fill, drain)', [rng.random() for _ in range(n_ops // 2)] + [None] * (n_ops // 2)),
+    ]
+    backends = [
+        ('binary', {}),
+        ('dary d=4', {'d': 4}),
+        ('dary d=8', {'d': 8}),
+        ('pairing', {}),
+    ]
+    print('{:<28}'.format('ops/s') + ''.join('{:>14}'.format(name) for name, _ in backends))
+    for trace_name, trace in traces:
+        row = '{:<28}'.format(trace_name)
+        for name, kwargs in backends:
+            pq = make_heap(name.split()[0], **kwargs)
+            insert = pq.insert
+            delete_max = pq.delete_max
+            start = time.perf_counter()
+            for key in trace:
+                if key is None:
+                    delete_max()
+                else:
+                    insert(key)
+            elapsed = time.perf_counter() - start
+            row += '{:>14,.0f}'.format(len(trace) / elapsed)
+        print(row)
@@ -0,0 +1,434 @@
+"""
+Opt-in instrumentation of the search trees (BST, RedBlackTree) and heaps (BinaryHeap, DaryHeap).
+
+The data structures themselves never check if instrumentation is on. Enabling it patches
+counting and timing wrappers around the real methods, and disabling it puts the original methods back,
+so when it's off exactly the uninstrumented code runs.
+
+    with Instrumentation() as stats:
+        tree = RedBlackTree()
+        for key in keys:
+            tree.put(key)
+    print(stats.to_json(indent=2))
+
+Collected are:
+- comparisons of keys, counted by wrapping keys in a CountedKey: the key argument of the tree operations
+  (get, put, delete, floor, ceiling, rank), and every key in a heap,
+- the number of tree nodes created,
+- rotations (rotate_left, rotate_right) and color flips of red-black trees,
+- the number of swim and sink calls and the levels they moved a key,
+- per operation (e.g. 'RedBlackTree.put'): the number of calls, a latency histogram with
+  power of 2 nanosecond buckets and the comparisons per call,
+- the size and height of every structure that was used while enabled.
+
+While enabled, the heap list of an instrumented heap holds CountedKeys (they forward attribute access
+to the key, so entries like external_sort's RunHead keep working). The keys are unwrapped when
+instrumentation is disabled, and the heap operations return the keys themselves.
+Only these exact classes are instrumented, subclasses like IndexedBinaryHeap are left alone.
+"""
+import json
+import time
+import weakref
+
+import binary_search_tree
+import red_black_tree
+from binary_search_tree import BST, height
+from red_black_tree import RedBlackTree
+from priority_queue import BinaryHeap
+from heap_backends import DaryHeap
+
+
+# Operations that are timed, and the subset that compare their first argument to the keys in the tree
+TREE_OPERATIONS = [
+    'get', 'put', 'delete', 'floor', 'ceiling', 'rank', 'select', 'min', 'max',
+    'delete_min', 'delete_max', 'put_many', 'update']
+TREE_KEY_OPERATIONS = {'get', 'put', 'delete', 'floor', 'ceiling', 'rank'}
+# Heap operations that are timed, and how their arguments are wrapped: the first one, all of them or none
+HEAP_OPERATIONS = {
+    'insert': 'first', 'push_many': 'all', 'heapify': None, 'max': None, 'delete_max': None,
+    'pop_many': None, 'pushpop': 'first', 'replace': 'first'}
+COUNTERS = [
+    'comparisons', 'nodes', 'rotate_left', 'rotate_right', 'flip_colors', 'swims', 'swim_steps', 'sinks', 'sink_steps']
+INSTRUMENTED = (BST, RedBlackTree, BinaryHeap, DaryHeap)
+
+
+class CountedKey(object):
+    """
+    Wrapper around a key that counts every comparison with it.
+    Comparisons with a plain key on the left end up here as well, through the reflected operator.
+    Other attributes are read from and written to the wrapped key.
+    """
+    __slots__ = ('wrapped', 'counters')
+
+    def __init__(self, wrapped, counters):
+        object.__setattr__(self, 'wrapped', wrapped)
+        object.__setattr__(self, 'counters', counters)
+
+    def __lt__(self, other):
+        self.counters['comparisons'] += 1
+        return self.wrapped < unwrap(other)
+
+    def __gt__(self, other):
+        self.counters['comparisons'] += 1
+        return self.wrapped > unwrap(other)
+
+    def __le__(self, other):
+        self.counters['comparisons'] += 1
+        return self.wrapped <= unwrap(other)
+
+    def __ge__(self, other):
+        self.counters['comparisons'] += 1
+        return self.wrapped >= unwrap(other)
+
+    def __eq__(self, other):
+        self.counters['comparisons'] += 1
+        return self.wrapped == unwrap(other)
+
+    def __hash__(self):
+        return hash(self.wrapped)
+
+    def __getattr__(self, name):
+        if name in CountedKey.__slots__:
+            raise AttributeError(name)
+        return getattr(self.wrapped, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.wrapped, name, value)
+
+
+def unwrap(key):
+    return key.wrapped if isinstance(key, CountedKey) else key
+
+
+class CountingList(list):
+    """
+    List that counts the writes to its items, used as the heap list of instrumented heaps.
+    """
+    __slots__ = ('writes',)
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.writes = 0
+
+    def __setitem__(self, i, item):
+        self.writes += 1
+        list.__setitem__(self, i, item)
+
+
+def heap_height(n, d=2):
+    """
+    Return the number of levels of a d-ary heap with n keys.
+    """
+    levels = 0
+    width = 1
+    while n > 0:
+        n -= width
+        width *= d
+        levels += 1
+    return levels
+
+
+class OperationStats(object):
+    """
+    Number of calls, latency histogram and comparisons of one operation.
+    The histogram counts the calls per bucket of 2^(b-1) < latency <= 2^b nanoseconds.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histogram = {}
+        self.comparisons = 0
+        self.max_comparisons = 0
+
+    def record(self, ns, comparisons):
+        self.calls += 1
+        self.total_ns += ns
+        self.max_ns = max(self.max_ns, ns)
+        bucket = ns.bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+        self.comparisons += comparisons
+        self.max_comparisons = max(self.max_comparisons, comparisons)
+
+    def percentile_ns(self, q):
+        """
+        Return the upper bound of the histogram bucket that holds the q-th percentile latency.
+        """
+        rank = q / 100 * self.calls
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                return 2**bucket
+        return 0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'mean_ns': self.total_ns / self.calls if self.calls else 0,
+            'p50_ns': self.percentile_ns(50),
+            'p99_ns': self.percentile_ns(99),
+            'max_ns': self.max_ns,
+            'histogram_ns': {str(2**bucket): count for bucket, count in sorted(self.histogram.items())},
+            'comparisons_per_call': self.comparisons / self.calls if self.calls else 0,
+            'max_comparisons': self.max_comparisons,
+        }
+
+
+class Instrumentation(object):
+    """
+    Collects the counters and latencies of the trees and heaps while enabled.
+    Only one instrumentation can be enabled at a time, it's enabled and disabled with enable/disable
+    or as a context manager. The statistics stay available after disabling.
+    """
+    # The instrumentation that is enabled, if any
+    active = None
+
+    def __init__(self):
+        self.originals = []
+        # The wrappers hold on to these, reset clears them in place
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.operations = {}
+        self.structures = weakref.WeakSet()
+        # Heaps whose list holds CountedKeys, unwrapped on disable (reset doesn't touch them)
+        self.wrapped_heaps = weakref.WeakSet()
+
+    def reset(self):
+        """
+        Clear all statistics.
+        """
+        for name in self.counters:
+            self.counters[name] = 0
+        self.operations.clear()
+        self.structures.clear()
+
+    def enable(self):
+        """
+        Patch the counting and timing wrappers into the classes.
+        Raise a RuntimeError if an instrumentation is already enabled.
+        """
+        if Instrumentation.active is not None:
+            raise RuntimeError('An instrumentation is already enabled')
+        Instrumentation.active = self
+        for cls in (BST, RedBlackTree):
+            for name in TREE_OPERATIONS:
+                if name in cls.__dict__:
+                    wrap = 'first' if name in TREE_KEY_OPERATIONS else None
+                    self.patch(cls, name, self.timed(cls.__dict__[name], name, wrap))
+        # New nodes get the key itself, not the CountedKey that put was called with
+        for node_class in (binary_search_tree.Node, red_black_tree.Node):
+            self.patch(node_class, '__init__', self.unwrapping(node_class.__dict__['__init__']))
+        for name in ('rotate_left', 'rotate_right', 'flip_colors'):
+            self.patch(RedBlackTree, name, staticmethod(self.counted(RedBlackTree.__dict__[name].__func__, name)))
+        for cls in (BinaryHeap, DaryHeap):
+            for name, wrap in HEAP_OPERATIONS.items():
+                if name in cls.__dict__:
+                    self.patch(cls, name, self.timed(cls.__dict__[name], name, wrap))
+            for name in ('swim', 'sink'):
+                self.patch(cls, name, self.sift(cls.__dict__[name], name))
+        return self
+
+    def disable(self):
+        """
+        Put the original methods back, and the plain keys in the heaps.
+        """
+        for heap in list(self.wrapped_heaps):
+            if type(heap.heap) is CountingList:
+                heap.heap = [unwrap(key) for key in heap.heap]
+        self.wrapped_heaps = weakref.WeakSet()
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+        if Instrumentation.active is self:
+            Instrumentation.active = None
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def patch(self, owner, name, wrapper):
+        """
+        Replace the attribute name of a class or module by wrapper, remembering the original.
+        """
+        self.originals.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, wrapper)
+
+    def counted(self, function, counter):
+        """
+        Wrap a function so every call increments the given counter.
+        """
+        counters = self.counters
+
+        def wrapper(*args):
+            counters[counter] += 1
+            return function(*args)
+        return wrapper
+
+    def unwrapping(self, init):
+        """
+        Wrap the __init__ of a node class so nodes are created with the key itself instead of its CountedKey,
+        counting the nodes that are created.
+        """
+        counters = self.counters
+
+        def wrapper(node, key, *args, **kwargs):
+            counters['nodes'] += 1
+            init(node, unwrap(key), *args, **kwargs)
+        wrapper.__name__ = '__init__'
+        wrapper.__doc__ = init.__doc__
+        return wrapper
+
+    def heap_list(self, heap):
+        """
+        Return the heap list of an instrumented heap as a CountingList with all keys wrapped,
+        replacing the plain list (only the first time the heap is used while enabled).
+        """
+        items = heap.heap
+        if type(items) is not CountingList:
+            counters = self.counters
+            items = CountingList(
+                [items[0]] + [key if isinstance(key, CountedKey) else CountedKey(key, counters) for key in items[1:]])
+            heap.heap = items
+            self.wrapped_heaps.add(heap)
+            self.structures.add(heap)
+        return items
+
+    def timed(self, method, name, wrap):
+        """
+        Wrap a method so every call is recorded in the statistics of the operation.
+        wrap tells which arguments are keys that are wrapped in a CountedKey: 'first', 'all' (of the
+        iterable that is the first argument) or None. Keys in the result are unwrapped.
+        """
+        counters = self.counters
+        perf_counter_ns = time.perf_counter_ns
+
+        def wrapper(structure, *args, **kwargs):
+            if type(structure) not in INSTRUMENTED:
+                return method(structure, *args, **kwargs)
+            if isinstance(structure, BinaryHeap):
+                self.heap_list(structure)
+            if wrap == 'first' and args:
+                args = (CountedKey(unwrap(args[0]), counters),) + args[1:]
+            elif wrap == 'all' and args:
+                args = ((CountedKey(unwrap(key), counters) for key in args[0]),) + args[1:]
+            comparisons = counters['comparisons']
+            start = perf_counter_ns()
+            try:
+                result = method(structure, *args, **kwargs)
+            finally:
+                ns = perf_counter_ns() - start
+                operation = '{}.{}'.format(type(structure).__name__, name)
+                if operation not in self.operations:
+                    self.operations[operation] = OperationStats()
+                self.operations[operation].record(ns, counters['comparisons'] - comparisons)
+                self.structures.add(structure)
+            if isinstance(result, list):
+                return [unwrap(item) for item in result]
+            return unwrap(result)
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def sift(self, method, name):
+        """
+        Wrap the swim or sink method of a heap to count its calls and the levels it moved a key.
+        Both move keys into a hole and write the key itself once at its final index,
+        so the number of levels is the number of writes to the heap list minus one.
+        """
+        counters = self.counters
+        steps = name + '_steps'
+        calls = name + 's'
+
+        def wrapper(structure, i):
+            if type(structure) not in INSTRUMENTED:
+                return method(structure, i)
+            items = self.heap_list(structure)
+            writes = items.writes
+            method(structure, i)
+            counters[calls] += 1
+            counters[steps] += items.writes - writes - 1
+        wrapper.__name__ = name
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    def structure_stats(self):
+        """
+        Return the type, size and height of every structure that was used (and still exists),
+        with the height a perfectly balanced tree of the same size would have.
+        """
+        stats = []
+        for structure in list(self.structures):
+            n = structure.size()
+            if isinstance(structure, BinaryHeap):
+                h = heap_height(n, getattr(structure, 'd', 2))
+            else:
+                h = height(structure.root)
+            stats.append({
+                'type': type(structure).__name__, 'size': n, 'height': h, 'min_height': n.bit_length()})
+        return sorted(stats, key=lambda s: (s['type'], s['size']))
+
+    def to_dict(self):
+        """
+        Return all statistics as a dict of JSON-able values.
+        """
+        return {
+            'counters': dict(self.counters),
+            'operations': {name: stats.to_dict() for name, stats in sorted(self.operations.items())},
+            'structures': self.structure_stats(),
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def save(self, path):
+        """
+        Save the statistics as JSON.
+        """
+        with open(path, 'w') as f:
+            f.write(self.to_json(indent=2))
+
+
+if __name__ == '__main__':
+    # Compare sorted and random insertion orders, and check that disabled instrumentation costs nothing
+    import random
+
+    n = 10**4
+    keys = list(range(n))
+    shuffled = random.Random(42).sample(keys, n)
+    for name, order in [('random', shuffled), ('sorted', keys)]:
+        with Instrumentation() as stats:
+            bst = BST()
+            tree = RedBlackTree()
+            heap = BinaryHeap()
+            for key in order:
+                bst.put(key)
+                tree.put(key)
+                heap.insert(key)
+            for key in order:
+                tree.get(key)
+            heap.pop_many(n)
+        report = stats.to_dict()
+        print('{} order:'.format(name))
+        print('  counters: {}'.format(report['counters']))
+        for operation, operation_stats in report['operations'].items():
+            print('  {:<24} {:>8} calls, p50 {:>7,} ns, p99 {:>7,} ns, {:>7.1f} comparisons/call'.format(
+                operation, operation_stats['calls'], operation_stats['p50_ns'], operation_stats['p99_ns'],
+                operation_stats['comparisons_per_call']))
+        for structure in report['structures']:
+            print('  {type:<14} size {size}, height {height} (balanced: {min_height})'.format(**structure))
+
+    def put_all():
+        start = time.perf_counter()
+        tree = RedBlackTree()
+        for key in shuffled:
+            tree.put(key)
+        return time.perf_counter() - start
+
+    before = min(put_all() for _ in range(5))
+    with Instrumentation():
+        enabled = min(put_all() for _ in range(5))
+    after = min(put_all() for _ in range(5))
+    print('RedBlackTree.put: {:.1f} ms before, {:.1f} ms enabled, {:.1f} ms after disabling'.format(
+        before * 1000, enabled * 1000, after * 1000))
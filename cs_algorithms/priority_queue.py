@@ -16,18 +16,40 @@ class BinaryHeap():
     def size(self):
         return len(self.heap)-1
 
+    @classmethod
+    def from_iterable(cls, keys):
+        """
+        Build a heap from the given keys in O(n) with bottom-up heapify.
+        """
+        pq = cls()
+        pq.heap.extend(keys)
+        pq.heapify()
+        return pq
+
+    def heapify(self):
+        """
+        Restore the heap order of the whole heap list in O(n).
+        """
+        # Sink all nodes that have children, from the bottom up.
+        # The subtrees below a node are already heaps when it is sunk.
+        for i in range(self.size() // 2, 0, -1):
+            self.sink(i)
+
     def swim(self, i):
         """
         Bottom-up reheapify (swim).
         Fix heap violation when a node's key becomes LARGER than that node's PARENT key.
         """
-        # Keep exchanging the parent at floor(i/2) if this parent is smaller than the current child at i,
-        # and while i is still in the range of the heap list
-        while i > 1 and self.heap[i//2] < self.heap[i]:
-            # Exchange parent with child if parent < child
-            self.heap[i//2], self.heap[i] = self.heap[i], self.heap[i//2]
-            # Update position in heap
+        heap = self.heap
+        key = heap[i]
+        # Keep moving the parent at floor(i/2) down into the hole at i if this parent is smaller
+        # than the key, and while i is still in the range of the heap list.
+        # The key itself is only written once, at its final position.
+        while i > 1 and heap[i//2] < key:
+            heap[i] = heap[i//2]
+            # Update position of the hole in the heap
             i //= 2
+        heap[i] = key
 
     def sink(self, i):
         """
@@ -35,24 +57,30 @@ class BinaryHeap():
         Fix heap violation when a node's key becomes SMALLER than than one or both of that
         node's CHILDREN's keys.
         """
-        # Keep exchanging the larger child at 2i or 2i+1 (j) with the current parent at i,
-        # while the child index is still withing the heap, and the parent is still smaller than the child.
-        while 2*i <= self.size():
+        heap = self.heap
+        # The size doesn't change while sinking
+        n = len(heap) - 1
+        key = heap[i]
+        # Keep moving the larger child at 2i or 2i+1 (j) up into the hole at i,
+        # while the child index is still withing the heap, and the key is still smaller than the child.
+        # The key itself is only written once, at its final position.
+        while 2*i <= n:
             # Get the child at position j=2i
             j = 2*i
-            if j < self.size() and self.heap[j] < self.heap[j+1]:
+            if j < n and heap[j] < heap[j+1]:
                 # Set j to j+1 if the child at j+1 is larger than the child at j.
                 # The child that needs to be exchanged with the parent needs to be
                 # larger than the other child.
                 j += 1
-            if not self.heap[i] < self.heap[j]:
-                # Stop if the parent at i is larger or equal to the child at j
+            if not key < heap[j]:
+                # Stop if the key is larger or equal to the child at j
                 break
-            # Exchange parent with larger child
-            self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+            # Move the larger child up
+            heap[i] = heap[j]
             # Update i to the child because we need to check the new child at j
             # in the next iteration.
             i = j
+        heap[i] = key
 
     def insert(self, key):
         """
@@ -61,12 +89,29 @@ class BinaryHeap():
         # Insert the key at the end of the list
         self.heap.append(key)
         # Fix the possible heap violation
-        self.swim(self.size())
+        self.swim(len(self.heap) - 1)
+
+    def push_many(self, keys):
+        """
+        Insert all given keys into the heap.
+        Large batches are appended and the heap is rebuilt in O(n + m),
+        small batches are inserted one by one in O(m log n).
+        """
+        n = self.size()
+        self.heap.extend(keys)
+        m = self.size() - n
+        if m > n:
+            self.heapify()
+        else:
+            for i in range(n + 1, n + m + 1):
+                self.swim(i)
 
     def max(self):
         """
         Return the maximum element in the heap
         """
+        if len(self.heap) == 1:
+            raise IndexError('max of an empty heap')
         # The maximum element is at index 1. (index 0 is not used)
         return self.heap[1]
 
@@ -74,18 +119,415 @@ class BinaryHeap():
         """
         Delete and return the maximal element in the heap
         """
-        max = self.max()
-        n = self.size()
-        # Exchange the maximum with the last elemnt in the heap
-        self.heap[1], self.heap[n] = self.heap[n], self.heap[1]
-        # Remove the last (maximum now) element
-        self.heap.pop()
+        heap = self.heap
+        if len(heap) == 1:
+            raise IndexError('delete_max from an empty heap')
+        # Remove the last element and put it in place of the maximum at the root
+        last = heap.pop()
+        if len(heap) == 1:
+            # The last element was the maximum
+            return last
+        max = heap[1]
+        heap[1] = last
         # Fix the heap violation
         self.sink(1)
         return max
 
+    def pop_many(self, k):
+        """
+        Delete and return the k largest elements in the heap, largest first.
+        Return less than k elements if the heap doesn't have k elements.
+        """
+        return [self.delete_max() for _ in range(min(k, self.size()))]
+
+    def pushpop(self, key):
+        """
+        Insert the given key and then delete and return the maximum, faster than insert + delete_max.
+        """
+        heap = self.heap
+        if len(heap) > 1 and key < heap[1]:
+            # The root is the maximum, replace it with the key
+            key, heap[1] = heap[1], key
+            self.sink(1)
+        # Else the key itself is the maximum and the heap doesn't change
+        return key
+
+    def replace(self, key):
+        """
+        Delete and return the maximum, and then insert the given key,
+        faster than delete_max + insert.
+        """
+        heap = self.heap
+        if len(heap) == 1:
+            raise IndexError('replace on an empty heap')
+        max = heap[1]
+        heap[1] = key
+        self.sink(1)
+        return max
+
     def is_empty(self):
         """
         Return true if and only if this heap is empty.
         """
-        return self.size() == 0
+        return len(self.heap) == 1
+
+    def init_args(self):
+        """
+        Return the keyword arguments to create an empty heap like this one (stored in snapshots).
+        """
+        return {}
+
+    def save(self, path):
+        """
+        Save a snapshot of the heap: the heap list as one array.
+        Numbers, strings and bytes are stored as is, other keys are pickled.
+        """
+        from snapshot import write_snapshot
+        write_snapshot(path, {'kind': type(self).__name__, 'init': self.init_args()}, {'heap': self.heap[1:]})
+
+    @classmethod
+    def load(cls, path, mmap=False, allow_pickle=False):
+        """
+        Load a heap that was saved with save in O(n), the heap order is kept as is.
+        With mmap return a ReadOnlyHeap on the memory-mapped heap array instead,
+        which can serve max right away.
+        Snapshots with pickled keys can only be loaded with allow_pickle=True.
+        Unpickling can run arbitrary code: only allow it for snapshots you trust.
+        """
+        from snapshot import read_snapshot, ReadOnlyHeap
+        meta, sections = read_snapshot(path, mmap, allow_pickle)
+        if meta['kind'] != cls.__name__:
+            raise ValueError('{} is a snapshot of a {}, not of a {}'.format(path, meta['kind'], cls.__name__))
+        heap = sections['heap']
+        if mmap:
+            return ReadOnlyHeap(heap)
+        pq = cls(**meta['init'])
+        pq.heap = [None] + (heap.tolist() if hasattr(heap, 'tolist') else heap)
+        return pq
+
+
+class IndexedBinaryHeap(BinaryHeap):
+    """
+    Binary heap of handles, each with a priority.
+    The heap keeps track of the position of every handle, so the priority of a handle
+    can be changed, and a handle can be removed or looked up, in O(log n).
+
+    Handles can be any hashable object, and each handle can be in the heap only once.
+    The handle with the largest priority is at the root, or the one with the smallest priority
+    if min_heap is True. If a key function is given, priorities are compared on key(priority).
+
+    The methods of BinaryHeap take and return (handle, priority) pairs instead of keys.
+    max and delete_max are only available on max heaps, min and delete_min on min heaps;
+    top and delete_top work on both.
+    Like BinaryHeap, the heap list starts from index 1, but it holds the handles.
+    """
+    def __init__(self, min_heap=False, key=None):
+        super().__init__()
+        self.min_heap = min_heap
+        self.key = key
+        # Priority of each handle
+        self.priorities = {}
+        # Value that is compared for each handle (key(priority))
+        self.sort_keys = {}
+        # Index of each handle in the heap list
+        self.positions = {}
+
+    @classmethod
+    def from_iterable(cls, items, *, min_heap=False, key=None):
+        """
+        Build a heap from the given (handle, priority) pairs in O(n) with bottom-up heapify.
+        """
+        pq = cls(min_heap=min_heap, key=key)
+        pq.push_many(items)
+        return pq
+
+    def above(self, a, b):
+        """
+        Return true if and only if sort key a should be above sort key b in the heap.
+        """
+        return a < b if self.min_heap else b < a
+
+    def swim(self, i):
+        """
+        Bottom-up reheapify (swim) of the handle at index i.
+        """
+        heap = self.heap
+        positions = self.positions
+        handle = heap[i]
+        sort_key = self.sort_keys[handle]
+        # Move parents down into the hole at i, until the handle can be placed at i.
+        while i > 1:
+            parent = heap[i // 2]
+            if not self.above(sort_key, self.sort_keys[parent]):
+                break
+            heap[i] = parent
+            positions[parent] = i
+            i //= 2
+        heap[i] = handle
+        positions[handle] = i
+
+    def sink(self, i):
+        """
+        Top-down reheapify (sink) of the handle at index i.
+        """
+        heap = self.heap
+        positions = self.positions
+        sort_keys = self.sort_keys
+        n = len(heap) - 1
+        handle = heap[i]
+        sort_key = sort_keys[handle]
+        # Move the child that should be on top up into the hole at i, until the handle can be placed at i.
+        while 2 * i <= n:
+            j = 2 * i
+            if j < n and self.above(sort_keys[heap[j + 1]], sort_keys[heap[j]]):
+                j += 1
+            if not self.above(sort_keys[heap[j]], sort_key):
+                break
+            heap[i] = heap[j]
+            positions[heap[i]] = i
+            i = j
+        heap[i] = handle
+        positions[handle] = i
+
+    def insert(self, item):
+        """
+        Insert the given (handle, priority) pair into the heap.
+        Raise a ValueError if the handle is already in the heap.
+        """
+        handle, priority = item
+        if handle in self.positions:
+            raise ValueError('Handle {!r} is already in the heap'.format(handle))
+        self.priorities[handle] = priority
+        self.sort_keys[handle] = priority if self.key is None else self.key(priority)
+        self.heap.append(handle)
+        self.swim(self.size())
+
+    def push_many(self, items):
+        """
+        Insert all given (handle, priority) pairs into the heap.
+        Raise a ValueError if a handle is already in the heap, or in the batch more than once.
+        The whole batch is checked (and its sort keys computed) before the heap is changed,
+        so on an error the heap is left as it was.
+        """
+        items = list(items)
+        batch = set()
+        for handle, _ in items:
+            if handle in self.positions or handle in batch:
+                raise ValueError('Handle {!r} is already in the heap'.format(handle))
+            batch.add(handle)
+        sort_keys = [priority if self.key is None else self.key(priority) for _, priority in items]
+        n = self.size()
+        for (handle, priority), sort_key in zip(items, sort_keys):
+            self.priorities[handle] = priority
+            self.sort_keys[handle] = sort_key
+            self.heap.append(handle)
+            self.positions[handle] = len(self.heap) - 1
+        m = self.size() - n
+        if m > n:
+            self.heapify()
+        else:
+            for i in range(n + 1, n + m + 1):
+                self.swim(i)
+
+    def pushpop(self, item):
+        """
+        Insert the given (handle, priority) pair and then delete and return the (handle, priority) at the root.
+        """
+        self.insert(item)
+        return self.delete_top()
+
+    def replace(self, item):
+        """
+        Delete and return the (handle, priority) at the root, and then insert the given (handle, priority) pair.
+        """
+        top = self.delete_top()
+        self.insert(item)
+        return top
+
+    def pop_many(self, k):
+        """
+        Delete and return the k (handle, priority) pairs at the top of the heap, in heap order.
+        Return less than k pairs if the heap doesn't have k handles.
+        """
+        return [self.delete_top() for _ in range(min(k, self.size()))]
+
+    def init_args(self):
+        return {'min_heap': self.min_heap}
+
+    def save(self, path):
+        """
+        Save a snapshot of the heap: the handles in heap order and their priorities.
+        The key function is not saved, pass it again to load.
+        Numbers, strings and bytes are stored as is, other handles and priorities are pickled.
+        """
+        from snapshot import write_snapshot
+        handles = self.heap[1:]
+        write_snapshot(
+            path, {'kind': type(self).__name__, 'init': self.init_args()},
+            {'handles': handles, 'priorities': [self.priorities[handle] for handle in handles]})
+
+    @classmethod
+    def load(cls, path, mmap=False, allow_pickle=False, *, key=None):
+        """
+        Load a heap that was saved with save in O(n), with the given key function.
+        The positions are rebuilt from the handles, there is no memory-mapped variant:
+        raise a ValueError if mmap is True.
+        Snapshots with pickled handles or priorities can only be loaded with allow_pickle=True.
+        Unpickling can run arbitrary code: only allow it for snapshots you trust.
+        """
+        from snapshot import read_snapshot
+        if mmap:
+            raise ValueError('{} can not be memory-mapped, its positions need to be rebuilt'.format(cls.__name__))
+        meta, sections = read_snapshot(path, allow_pickle=allow_pickle)
+        if meta['kind'] != cls.__name__:
+            raise ValueError('{} is a snapshot of a {}, not of a {}'.format(path, meta['kind'], cls.__name__))
+        handles, priorities = (
+            items.tolist() if hasattr(items, 'tolist') else items
+            for items in (sections['handles'], sections['priorities']))
+        pq = cls(key=key, **meta['init'])
+        # Heapify keeps a valid heap order as is, and fixes it if the key function differs
+        pq.push_many(zip(handles, priorities))
+        return pq
+
+    def contains(self, handle):
+        """
+        Return true if and only if the handle is in the heap.
+        """
+        return handle in self.positions
+
+    def __contains__(self, handle):
+        return handle in self.positions
+
+    def __len__(self):
+        return self.size()
+
+    def get_priority(self, handle):
+        """
+        Return the priority of the given handle. Raise a KeyError if the handle is not in the heap.
+        """
+        return self.priorities[handle]
+
+    def change_key(self, handle, priority):
+        """
+        Change the priority of the given handle. Raise a KeyError if the handle is not in the heap.
+        """
+        i = self.positions[handle]
+        self.priorities[handle] = priority
+        self.sort_keys[handle] = priority if self.key is None else self.key(priority)
+        # Only one of both will move the handle
+        self.swim(i)
+        self.sink(self.positions[handle])
+
+    def top(self):
+        """
+        Return the (handle, priority) at the root of the heap.
+        """
+        if self.is_empty():
+            raise IndexError('top of an empty heap')
+        handle = self.heap[1]
+        return handle, self.priorities[handle]
+
+    def delete_top(self):
+        """
+        Delete and return the (handle, priority) at the root of the heap.
+        """
+        item = self.top()
+        self.remove(item[0])
+        return item
+
+    def check_order(self, min_heap, name):
+        """
+        Raise a TypeError if the method with the given name is used on the wrong kind of heap.
+        """
+        if self.min_heap != min_heap:
+            raise TypeError('{} is only available on {} heaps, use top'.format(name, 'min' if min_heap else 'max'))
+
+    def max(self):
+        """
+        Return the (handle, priority) with the largest priority. Only for max heaps.
+        """
+        self.check_order(False, 'max')
+        return self.top()
+
+    def delete_max(self):
+        """
+        Delete and return the (handle, priority) with the largest priority. Only for max heaps.
+        """
+        self.check_order(False, 'delete_max')
+        return self.delete_top()
+
+    def min(self):
+        """
+        Return the (handle, priority) with the smallest priority. Only for min heaps.
+        """
+        self.check_order(True, 'min')
+        return self.top()
+
+    def delete_min(self):
+        """
+        Delete and return the (handle, priority) with the smallest priority. Only for min heaps.
+        """
+        self.check_order(True, 'delete_min')
+        return self.delete_top()
+
+    def remove(self, handle):
+        """
+        Remove the given handle from the heap and return its priority.
+        Raise a KeyError if the handle is not in the heap.
+        """
+        i = self.positions.pop(handle)
+        del self.sort_keys[handle]
+        priority = self.priorities.pop(handle)
+        last = self.heap.pop()
+        if i < len(self.heap):
+            # Fill the hole with the last handle and fix the possible heap violation
+            self.heap[i] = last
+            self.positions[last] = i
+            self.swim(i)
+            self.sink(self.positions[last])
+        return priority
+
+
+if __name__ == '__main__':
+    # Benchmark against heapq on 10^6 items.
+    # heapq is a min heap, so it is fed negated keys to get the same max heap order.
+    import heapq
+    import random
+    import time
+
+    n = 10**6
+    keys = [random.random() for _ in range(n)]
+    neg_keys = [-k for k in keys]
+
+    def bench(name, fn):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print('{:<40} {:>7.3f}s {:>14,.0f} items/s'.format(name, elapsed, n / elapsed))
+
+    def insert_all():
+        pq = BinaryHeap()
+        for k in keys:
+            pq.insert(k)
+
+    def heappush_all():
+        h = []
+        for k in neg_keys:
+            heapq.heappush(h, k)
+
+    bench('BinaryHeap insert', insert_all)
+    bench('heapq.heappush', heappush_all)
+    bench('BinaryHeap.from_iterable', lambda: BinaryHeap.from_iterable(keys))
+    bench('heapq.heapify', lambda: heapq.heapify(list(neg_keys)))
+    pq = BinaryHeap.from_iterable(keys)
+    bench('BinaryHeap delete_max', lambda: [pq.delete_max() for _ in range(n)])
+    h = list(neg_keys)
+    heapq.heapify(h)
+    bench('heapq.heappop', lambda: [heapq.heappop(h) for _ in range(n)])
+    pq = BinaryHeap.from_iterable(keys)
+    bench('BinaryHeap.pop_many', lambda: pq.pop_many(n))
+    pq = BinaryHeap.from_iterable(keys[:1000])
+    bench('BinaryHeap pushpop (1000 items in heap)', lambda: [pq.pushpop(k) for k in keys])
+    h = neg_keys[:1000]
+    heapq.heapify(h)
+    bench('heapq.heappushpop (1000 items in heap)', lambda: [heapq.heappushpop(h, k) for k in neg_keys])
@@ -1,59 +1,89 @@
+import math
+import random
+
+from binary_search_tree import (
+    NO_VALUE, unique_sorted, merge_unique, size, get_node, iter_nodes, iter_in_order, in_order_items,
+    iter_range, floor, ceiling, rank, select, height)
+
+
 class Node(object):
     """
     Class to represent a node in a binary search tree
     """
-    def __init__(self, key, left=None, right=None, is_red=False):
+    # No per-node __dict__, keeps the memory per key down for large trees
+    __slots__ = ('left', 'right', 'key', 'value', 'is_red', 'size')
+
+    def __init__(self, key, left=None, right=None, is_red=False, value=None):
         """
         Initialise the node
         """
         self.left = left
         self.right = right
         self.key = key
+        self.value = value
         self.is_red = is_red
+        # Number of nodes in the subtree under this node, used by rank and select
+        self.size = 1 + size(left) + size(right)
 
     def get(self, get_key):
         """
-        Get the node with the given key. Return None if not found.
+        Return the value stored with the given key. Return None if not found.
         """
-        if self.key == get_key:
-            return self.key
-        elif self.key < get_key and not self.right is None:
-                return self.right.get(get_key)
-        elif self.key > get_key and not self.left is None:
-            return self.left.get(get_key)
-        else:
-            return None
+        n = self
+        # Walk down the tree, going left or right depending on the key,
+        # until the key is found or we fall off the tree.
+        while n is not None:
+            if get_key < n.key:
+                n = n.left
+            elif get_key > n.key:
+                n = n.right
+            else:
+                return n.value
+        return None
 
     def min(self):
         """
         Return the minimum in the BST under this node
         """
-        if self.left is None:
-            return self.key
-        else:
-            return self.left.min()
+        n = self
+        while n.left is not None:
+            n = n.left
+        return n.key
 
     def max(self):
         """
         Return the maximum in the BST under this node
         """
-        if self.right is None:
-            return self.key
-        else:
-            return self.right.max()
+        n = self
+        while n.right is not None:
+            n = n.right
+        return n.key
 
     def __str__(self):
         """
         Represent the node as a string.
         """
-        s ='{'
-        if not self.left is None:
-            s += str(self.left)
-        s += str(self.key)
-        if not self.right is None:
-            s += str(self.right)
-        s += '}'
-        return s
+        # In-order walk with an explicit stack, opening a '{' when going
+        # down into a node and closing it after its right subtree is done.
+        parts = []
+        stack = [(self, False)]
+        while stack:
+            n, visited = stack.pop()
+            if visited:
+                parts.append(str(n.key))
+                continue
+            if n is None:
+                parts.append('}')
+                continue
+            parts.append('{')
+            # Pushed in reverse: left subtree, key, right subtree, closing brace
+            stack.append((None, False))
+            if n.right is not None:
+                stack.append((n.right, False))
+            stack.append((n, True))
+            if n.left is not None:
+                stack.append((n.left, False))
+        return ''.join(parts)
 
 
 class RedBlackTree(object):
@@ -64,26 +94,368 @@ class RedBlackTree(object):
         self.root = None
 
     def get(self, key):
+        """
+        Return the value stored with key, None if the key is not in the tree.
+        """
+        if self.root is None:
+            return None
         return self.root.get(key)
 
-    def put(self, key):
-        self.root =RedBlackTree.put_rec(self.root, key)
+    def put(self, key, value=NO_VALUE):
+        """
+        Put the key in the tree with the given value.
+        Without a value a new key gets None, and a key that is already in the tree keeps its value.
+        """
+        # Walk down to the insertion point, remembering the path and the
+        # direction taken at each node so the rotations can be done bottom-up.
+        path = []
+        went_left = []
+        n = self.root
+        while n is not None:
+            if key < n.key:
+                path.append(n)
+                went_left.append(True)
+                n = n.left
+            elif key > n.key:
+                path.append(n)
+                went_left.append(False)
+                n = n.right
+            else:
+                # Key is already in the tree, only update its value
+                if value is not NO_VALUE:
+                    n.value = value
+                return
+        if value is NO_VALUE:
+            value = None
+        # Insert the new key as a red node, and fix the tree on the way back up.
+        self.root = RedBlackTree.balance_path(path, went_left, Node(key, is_red=True, value=value))
         self.root.is_red = False
 
     @staticmethod
-    def put_rec(n, key):
-        if n is None:
-            # If the current node to insert the key is None return a new red Node
-            # to be inserted on the parent
-            return Node(key, is_red=True)
-        if key < n.key:
-            # Key is smaller and needs to be inserted on the left
-            # The new left subtree is the current left side with the new key added
-            n.left = RedBlackTree.put_rec(n.left, key)
-        elif key > n.key:
-            # Key is larger and needs to be inserted on the right
-            # The new right subtree is the current right side with the new key added
-            n.right = RedBlackTree.put_rec(n.right, key)
+    def balance_path(path, went_left, child):
+        """
+        Link child below the last node of the path and rebalance all nodes on the path bottom-up.
+        went_left[i] tells on which side of path[i] the path continues.
+        Return the new root.
+        """
+        # The subtree below the current node is replaced by the rebalanced `child`.
+        for i in range(len(path) - 1, -1, -1):
+            n = path[i]
+            if went_left[i]:
+                n.left = child
+            else:
+                n.right = child
+            child = RedBlackTree.balance(n)
+        return child
+
+    def delete_min(self):
+        """
+        Delete the minimum key from the tree.
+        """
+        if self.root is None:
+            return
+        if not RedBlackTree.is_red(self.root.left) and not RedBlackTree.is_red(self.root.right):
+            # Make the root red so it can be borrowed from on the way down
+            self.root.is_red = True
+        self.root = RedBlackTree.delete_min_node(self.root, [], [])
+        if self.root is not None:
+            self.root.is_red = False
+
+    @staticmethod
+    def delete_min_node(h, path, went_left):
+        """
+        Delete the minimum from the subtree under h, which is reached through the given path.
+        Return the new root of the whole path.
+        """
+        # Walk down the left side, making sure the current node is never a 2-node
+        # (so the minimum can be removed without changing the black height).
+        while h.left is not None:
+            if not RedBlackTree.is_red(h.left) and not RedBlackTree.is_red(h.left.left):
+                # The left child is a 2-node, borrow a key from its sibling or parent
+                h = RedBlackTree.move_red_left(h)
+            path.append(h)
+            went_left.append(True)
+            h = h.left
+        # h is the minimum and has no children (no right leaning red links), remove it
+        return RedBlackTree.balance_path(path, went_left, None)
+
+    def delete_max(self):
+        """
+        Delete the maximum key from the tree.
+        """
+        if self.root is None:
+            return
+        if not RedBlackTree.is_red(self.root.left) and not RedBlackTree.is_red(self.root.right):
+            # Make the root red so it can be borrowed from on the way down
+            self.root.is_red = True
+        path = []
+        went_left = []
+        h = self.root
+        while True:
+            if RedBlackTree.is_red(h.left):
+                # Lean the red link to the right, so the maximum can be reached through it
+                h = RedBlackTree.rotate_right(h)
+            if h.right is None:
+                # h is the maximum and has no children, remove it
+                break
+            if not RedBlackTree.is_red(h.right) and not RedBlackTree.is_red(h.right.left):
+                # The right child is a 2-node, borrow a key from its sibling or parent
+                h = RedBlackTree.move_red_right(h)
+            path.append(h)
+            went_left.append(False)
+            h = h.right
+        self.root = RedBlackTree.balance_path(path, went_left, None)
+        if self.root is not None:
+            self.root.is_red = False
+
+    def delete(self, key):
+        """
+        Delete the given key from the tree, if it is in the tree.
+        """
+        if get_node(self.root, key) is None:
+            return
+        if not RedBlackTree.is_red(self.root.left) and not RedBlackTree.is_red(self.root.right):
+            # Make the root red so it can be borrowed from on the way down
+            self.root.is_red = True
+        path = []
+        went_left = []
+        h = self.root
+        while True:
+            if key < h.key:
+                if not RedBlackTree.is_red(h.left) and not RedBlackTree.is_red(h.left.left):
+                    # The left child is a 2-node, borrow a key from its sibling or parent
+                    h = RedBlackTree.move_red_left(h)
+                path.append(h)
+                went_left.append(True)
+                h = h.left
+                continue
+            if RedBlackTree.is_red(h.left):
+                # Lean the red link to the right, so the key can be reached through it
+                h = RedBlackTree.rotate_right(h)
+            if not h.key < key and h.right is None:
+                # Found the key at the bottom of the tree, remove it
+                self.root = RedBlackTree.balance_path(path, went_left, None)
+                break
+            if not RedBlackTree.is_red(h.right) and not RedBlackTree.is_red(h.right.left):
+                # The right child is a 2-node, borrow a key from its sibling or parent
+                h = RedBlackTree.move_red_right(h)
+            path.append(h)
+            went_left.append(False)
+            if not h.key < key:
+                # Found the key: replace it with its successor, and delete the successor
+                # (the minimum on the right) instead.
+                succ = h.right
+                while succ.left is not None:
+                    succ = succ.left
+                h.key = succ.key
+                h.value = succ.value
+                self.root = RedBlackTree.delete_min_node(h.right, path, went_left)
+                break
+            h = h.right
+        if self.root is not None:
+            self.root.is_red = False
+
+    @staticmethod
+    def move_red_left(h):
+        """
+        Make the left child of h, or one of its children, red.
+        h is red and both h.left and h.left.left are black.
+        """
+        RedBlackTree.flip_colors(h)
+        if RedBlackTree.is_red(h.right.left):
+            # The sibling on the right is a 3-node, move one of its keys over to the left
+            h.right = RedBlackTree.rotate_right(h.right)
+            h = RedBlackTree.rotate_left(h)
+            RedBlackTree.flip_colors(h)
+        return h
+
+    @staticmethod
+    def move_red_right(h):
+        """
+        Make the right child of h, or one of its children, red.
+        h is red and both h.right and h.right.left are black.
+        """
+        RedBlackTree.flip_colors(h)
+        if RedBlackTree.is_red(h.left.left):
+            # The sibling on the left is a 3-node, move one of its keys over to the right
+            h = RedBlackTree.rotate_right(h)
+            RedBlackTree.flip_colors(h)
+        return h
+
+    def check_invariants(self):
+        """
+        Check that the tree is a valid left-leaning red-black tree:
+        keys in symmetric order, correct subtree sizes, a black root, no red right links,
+        no two red links in a row, and the same number of black links on every path
+        from the root to an empty link.
+        Raise a ValueError describing the first violation found, return True otherwise.
+        """
+        if RedBlackTree.is_red(self.root):
+            raise ValueError('Root should be black')
+        # Post-order walk with an explicit stack, keeping the black height of each visited node
+        black_heights = {}
+        stack = [(self.root, False)]
+        while stack:
+            n, visited = stack.pop()
+            if n is None:
+                continue
+            if not visited:
+                stack.append((n, True))
+                stack.append((n.right, False))
+                stack.append((n.left, False))
+                continue
+            if n.left is not None and not n.left.key < n.key:
+                raise ValueError('Keys not in order at {!r}'.format(n.key))
+            if n.right is not None and not n.key < n.right.key:
+                raise ValueError('Keys not in order at {!r}'.format(n.key))
+            if n.size != 1 + size(n.left) + size(n.right):
+                raise ValueError('Wrong subtree size at {!r}'.format(n.key))
+            if RedBlackTree.is_red(n.right):
+                raise ValueError('Red right link at {!r}'.format(n.key))
+            if n.is_red and RedBlackTree.is_red(n.left):
+                raise ValueError('Two red links in a row at {!r}'.format(n.key))
+            left_height = black_heights.pop(id(n.left), 0)
+            right_height = black_heights.pop(id(n.right), 0)
+            if left_height != right_height:
+                raise ValueError('Black height differs between the left and right of {!r}'.format(n.key))
+            black_heights[id(n)] = left_height + (0 if n.is_red else 1)
+        # Only checking the order of each node with its children isn't enough,
+        # the in-order walk needs to be increasing as well.
+        previous = None
+        for i, key in enumerate(iter_in_order(self.root)):
+            if i > 0 and not previous < key:
+                raise ValueError('Keys not in order at {!r}'.format(key))
+            previous = key
+        return True
+
+    @classmethod
+    def from_sorted(cls, keys):
+        """
+        Build a balanced red-black tree from an iterable of sorted keys in O(n).
+        Duplicate keys are only stored once.
+        """
+        return cls.from_sorted_items((key, None) for key in keys)
+
+    @classmethod
+    def from_sorted_items(cls, items):
+        """
+        Build a balanced red-black tree from an iterable of (key, value) pairs sorted on key in O(n).
+        For duplicate keys the last value is kept.
+        """
+        items = unique_sorted(items)
+        tree = cls()
+        tree.root = RedBlackTree.build_balanced(items, 0, len(items), RedBlackTree.black_height_for(len(items)))
+        return tree
+
+    @staticmethod
+    def black_height_for(n):
+        """
+        Return the largest black height a tree with n keys can have: the largest h with 2^h - 1 <= n.
+        """
+        return (n + 1).bit_length() - 1
+
+    @staticmethod
+    def build_balanced(items, lo, hi, black_height):
+        """
+        Build a left-leaning red-black subtree from the sorted (key, value) pairs items[lo:hi]
+        with the given black height and return its root.
+
+        The subtree corresponds to a 2-3 tree with all leaves at depth black_height,
+        which can hold between 2^black_height - 1 and 3^black_height - 1 keys.
+        The root becomes a 2-node (one black node) if the remaining keys fit in two
+        subtrees of one level lower, otherwise a 3-node (a black node with a red left child).
+        """
+        # The recursion only goes log2(n) levels deep
+        n = hi - lo
+        if n == 0:
+            return None
+        # Maximum number of keys in a subtree one level lower
+        sub_max = 3 ** (black_height - 1) - 1
+        if n - 1 <= 2 * sub_max:
+            # 2-node, split the other keys evenly over the two subtrees
+            mid = lo + (n - 1) // 2
+            key, value = items[mid]
+            return Node(key,
+                        left=RedBlackTree.build_balanced(items, lo, mid, black_height - 1),
+                        right=RedBlackTree.build_balanced(items, mid + 1, hi, black_height - 1),
+                        value=value)
+        # 3-node, split the other keys evenly over the three subtrees
+        s1 = (n - 2) // 3
+        s2 = (n - 2 - s1) // 2
+        a = lo + s1
+        b = a + 1 + s2
+        key, value = items[a]
+        red = Node(key,
+                   left=RedBlackTree.build_balanced(items, lo, a, black_height - 1),
+                   right=RedBlackTree.build_balanced(items, a + 1, b, black_height - 1),
+                   is_red=True, value=value)
+        key, value = items[b]
+        return Node(key, left=red,
+                    right=RedBlackTree.build_balanced(items, b + 1, hi, black_height - 1),
+                    value=value)
+
+    def save(self, path):
+        """
+        Save a compact snapshot of the tree: the keys (and values) in order, plus 2 bits per node
+        for the shape of the tree and 1 bit per node for its color.
+        Numbers, strings and bytes are stored as is, other keys and values are pickled.
+        """
+        from snapshot import write_snapshot, tree_sections
+        write_snapshot(
+            path, {'kind': 'RedBlackTree', 'n': size(self.root)}, tree_sections(self.root, with_colors=True))
+
+    @classmethod
+    def load(cls, path, mmap=False, allow_pickle=False):
+        """
+        Load a tree that was saved with save, in O(n) with the same shape and colors.
+        With mmap return a read-only SortedArrayMap on the memory-mapped keys instead,
+        which can serve lookups right away without building any nodes.
+        Snapshots with pickled keys or values can only be loaded with allow_pickle=True.
+        Unpickling can run arbitrary code: only allow it for snapshots you trust.
+        """
+        from snapshot import read_snapshot, build_tree, SortedArrayMap
+        meta, sections = read_snapshot(path, mmap, allow_pickle)
+        if meta['kind'] != 'RedBlackTree':
+            raise ValueError('{} is a snapshot of a {}, not of a RedBlackTree'.format(path, meta['kind']))
+        if mmap:
+            return SortedArrayMap(sections['keys'], sections.get('values'))
+        tree = cls()
+        tree.root = build_tree(Node, meta['n'], sections)
+        return tree
+
+    def put_many(self, keys):
+        """
+        Put all given keys in the tree.
+        The batch is sorted and merged with the keys already in the tree, after which the tree
+        is rebuilt balanced without any rotations. This takes O(n + m log m) for m new keys.
+        Keys that are already in the tree keep their value, new keys get None.
+        """
+        batch = unique_sorted((key, None) for key in sorted(keys))
+        if batch:
+            items = merge_unique(in_order_items(self.root), batch, keep_left=True)
+            self.root = RedBlackTree.build_balanced(
+                items, 0, len(items), RedBlackTree.black_height_for(len(items)))
+
+    def update(self, items):
+        """
+        Put all (key, value) pairs from the given iterable or mapping in the tree,
+        like put_many but with values.
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+        # Sort on key only, the values don't need to be comparable
+        batch = unique_sorted(sorted(items, key=lambda item: item[0]))
+        if not batch:
+            return
+        items = merge_unique(in_order_items(self.root), batch)
+        self.root = RedBlackTree.build_balanced(items, 0, len(items), RedBlackTree.black_height_for(len(items)))
+
+    @staticmethod
+    def balance(n):
+        """
+        Restore the left-leaning red-black invariants at node n after one of its
+        subtrees changed, and return the node that replaces n.
+        """
         # Perform rotations
         if RedBlackTree.is_red(n.right) and not RedBlackTree.is_red(n.left):
             # If the right link is red, and the left link is black:
@@ -96,6 +468,8 @@ class RedBlackTree(object):
         if RedBlackTree.is_red(n.left) and RedBlackTree.is_red(n.right):
             # Flip colors if both left and right links are red.
             RedBlackTree.flip_colors(n)
+        # One of the subtrees changed, so recount the nodes under n
+        n.size = 1 + size(n.left) + size(n.right)
         # return the updated node
         return n
 
@@ -119,6 +493,9 @@ class RedBlackTree(object):
         n.right = r.left
         # The left side of r becomes n, r is tilted above n
         r.left = n
+        # r takes over the subtree of n
+        r.size = n.size
+        n.size = 1 + size(n.left) + size(n.right)
         # r will take the color of n
         r.is_red = n.is_red
         # n become red, the color of r
@@ -140,21 +517,35 @@ class RedBlackTree(object):
         n.left = l.right
         # The right side of l becomes n, l is tilted above n
         l.right = n
+        # l takes over the subtree of n
+        l.size = n.size
+        n.size = 1 + size(n.left) + size(n.right)
         # l will take the color of n
         l.is_red = n.is_red
         # n become red, the color of l
-        l.is_red = True
+        n.is_red = True
         # return l as the new node that should be linked to the parent of n
         return l
 
     @staticmethod
     def flip_colors(n):
         """
-        Flip colors of children to black, and color if this node to red
+        Flip the colors of this node and its two children.
+        On insert this colors the children black and this node red (splitting a temporary 4-node),
+        on delete it does the opposite (combining this node and its children into a 4-node).
         """
-        n.is_red = True
-        n.left.is_red = False
-        n.right.is_red = False
+        n.is_red = not n.is_red
+        n.left.is_red = not n.left.is_red
+        n.right.is_red = not n.right.is_red
+
+    def size(self):
+        """
+        Return the number of keys in the tree.
+        """
+        return size(self.root)
+
+    def height(self):
+        return height(self.root)
 
     def min(self):
         if self.root is None:
@@ -166,8 +557,145 @@ class RedBlackTree(object):
             return None
         return self.root.max()
 
+    def floor(self, key):
+        return floor(self.root, key)
+
+    def ceiling(self, key):
+        return ceiling(self.root, key)
+
+    def rank(self, key):
+        return rank(self.root, key)
+
+    def select(self, k):
+        return select(self.root, k)
+
+    def range(self, lo, hi):
+        """
+        Generate the keys lo <= key <= hi in sorted order.
+        """
+        return iter_range(self.root, lo, hi)
+
+    def range_size(self, lo, hi):
+        """
+        Return the number of keys lo <= key <= hi in O(log n).
+        """
+        if hi < lo:
+            return 0
+        count = rank(self.root, hi) - rank(self.root, lo)
+        if get_node(self.root, hi) is not None:
+            count += 1
+        return count
+
+    def __iter__(self):
+        """
+        Generate the keys in sorted order without building a list of all keys.
+        """
+        return iter_in_order(self.root)
+
+    def __reversed__(self):
+        return iter_in_order(self.root, reverse=True)
+
+    def __len__(self):
+        return size(self.root)
+
+    def __contains__(self, key):
+        return get_node(self.root, key) is not None
+
+    def __getitem__(self, key):
+        """
+        Return the value stored with key. Raise a KeyError if the key is not in the tree.
+        """
+        n = get_node(self.root, key)
+        if n is None:
+            raise KeyError(key)
+        return n.value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def keys(self):
+        return iter_in_order(self.root)
+
+    def values(self):
+        """
+        Generate the values in the order of their keys.
+        """
+        for n in iter_nodes(self.root):
+            yield n.value
+
+    def items(self):
+        """
+        Generate the (key, value) pairs in key order.
+        """
+        for n in iter_nodes(self.root):
+            yield n.key, n.value
+
     def __str__(self):
         """
         Represent the tree as a string.
         """
-        return str(self.root)
\ No newline at end of file
+        return str(self.root)
+
+
+def stress_test(n_ops, key_range, n_checks=10, seed=None):
+    """
+    Run n_ops random puts, deletes, delete_mins and delete_maxs on a RedBlackTree,
+    checking the invariants and that the height stays <= 2*log2(n) at n_checks evenly spaced points.
+    Return the tree and the (operations, keys, height) at every check.
+    """
+    rng = random.Random(seed)
+    tree = RedBlackTree()
+    checks = []
+    check_every = max(1, n_ops // n_checks)
+    for i in range(1, n_ops + 1):
+        r = rng.random()
+        if r < 0.6:
+            tree.put(rng.randrange(key_range))
+        elif r < 0.9:
+            tree.delete(rng.randrange(key_range))
+        elif r < 0.95:
+            tree.delete_min()
+        else:
+            tree.delete_max()
+        if i % check_every == 0:
+            tree.check_invariants()
+            n = len(tree)
+            h = tree.height()
+            if n > 0 and h > 2 * math.log2(n):
+                raise ValueError('Height {} larger than 2*log2({}) after {} operations'.format(h, n, i))
+            checks.append((i, n, h))
+    return tree, checks
+
+
+if __name__ == '__main__':
+    # Benchmark: lookups per second on a tree with 10^6 random keys,
+    # and inserting 10^6 sorted keys without hitting the recursion limit.
+    import time
+
+    n_keys = 10**6
+    for name, keys in [('random', random.sample(range(10 * n_keys), n_keys)),
+                       ('sorted', list(range(n_keys)))]:
+        tree = RedBlackTree()
+        start = time.perf_counter()
+        for k in keys:
+            tree.put(k)
+        print('RedBlackTree put {:,} {} keys: {:.2f}s'.format(
+            n_keys, name, time.perf_counter() - start))
+        queries = random.sample(keys, len(keys))
+        start = time.perf_counter()
+        for k in queries:
+            tree.get(k)
+        elapsed = time.perf_counter() - start
+        print('RedBlackTree get {:,} keys: {:,.0f} lookups/s'.format(len(queries), len(queries) / elapsed))
+
+    start = time.perf_counter()
+    tree = RedBlackTree.from_sorted(range(n_keys))
+    print('RedBlackTree.from_sorted {:,} keys: {:.2f}s'.format(n_keys, time.perf_counter() - start))
+
+    # Randomized stress test of mixed operations
+    start = time.perf_counter()
+    tree, checks = stress_test(n_ops=2 * 10**6, key_range=n_keys)
+    for i, n, h in checks:
+        print('ops: {:>10,}  keys: {:>9,}  height: {:>3}  2*log2(n): {:.1f}'.format(
+            i, n, h, 2 * math.log2(n) if n else 0))
+    print('RedBlackTree stress test: {:.2f}s'.format(time.perf_counter() - start))
@@ -0,0 +1,424 @@
+"""
+Compact binary snapshots of trees and heaps.
+
+A snapshot file is a small JSON header followed by sections of raw bytes. Numeric arrays are
+stored raw (aligned to 64 bytes), so they can be memory-mapped when the snapshot is loaded.
+Strings and bytes are stored as one UTF-8 (or raw) blob with the cumulative lengths.
+Mixed int and float items are stored as float64. Missing (None) items are stored as a bit mask
+in front of the other items, with 0 or an empty string in their place.
+Other keys and values are pickled. Unpickling can run arbitrary code, so reading pickled
+sections needs allow_pickle=True (like np.load), only use it for snapshots you trust.
+
+Trees are stored as their keys (and values) in in-order, plus 2 structure bits per node in
+pre-order (has a left child, has a right child) and, for red-black trees, a color bit per node.
+"""
+import bisect
+import json
+import pickle
+import struct
+
+import numpy as np
+
+
+MAGIC = b'SNAPSHOT'
+ALIGNMENT = 64
+
+
+# Largest integer such that all integers up to it are exact in a float64
+MAX_EXACT_FLOAT = 2**53
+
+
+def as_array(items):
+    """
+    Return the items as a numeric NumPy array, or None if they can't be stored as one.
+    A mix of ints and floats is promoted to float64 if all the ints are exact as a float.
+    """
+    types = set(map(type, items))
+    if not types:
+        return np.empty(0, dtype=np.int64)
+    dtype = None
+    if types == {int, float}:
+        if any(type(item) is int and abs(item) > MAX_EXACT_FLOAT for item in items):
+            return None
+        dtype = np.float64
+    elif len(types) != 1 or types.pop() not in (int, float, bool):
+        return None
+    try:
+        array = np.asarray(items, dtype=dtype)
+    except (ValueError, OverflowError):
+        return None
+    return array if array.dtype.kind in 'biuf' and array.ndim == 1 else None
+
+
+def encode_section(items):
+    """
+    Return the layout (dict) and bytes of a section with the given items (list or array).
+    """
+    array = items if isinstance(items, np.ndarray) else as_array(items)
+    if array is not None:
+        blob = np.ascontiguousarray(array)
+        return {'dtype': blob.dtype.str, 'shape': list(blob.shape)}, memoryview(blob).cast('B')
+    types = set(map(type, items))
+    if type(None) in types:
+        # Store where the Nones are, and the other items with a placeholder of their type for the Nones
+        others = types - {type(None)}
+        if others <= {int, float, bool}:
+            placeholder = 0
+        elif others == {str}:
+            placeholder = ''
+        elif others == {bytes}:
+            placeholder = b''
+        else:
+            placeholder = None
+        if placeholder is not None:
+            mask = np.packbits(np.array([item is None for item in items], dtype=bool)).tobytes()
+            layout, blob = encode_section([placeholder if item is None else item for item in items])
+            if not layout.get('pickle'):
+                # Pad the mask so the items behind it stay aligned
+                padded = -(-len(mask) // ALIGNMENT) * ALIGNMENT
+                layout['none_mask'] = padded
+                return layout, mask + bytes(padded - len(mask)) + bytes(blob)
+        return {'pickle': True}, pickle.dumps(list(items), protocol=pickle.HIGHEST_PROTOCOL)
+    if types == {str} or types == {bytes}:
+        # The cumulative lengths, followed by all items joined together
+        ends = np.cumsum([len(item) for item in items], dtype=np.int64)
+        if types == {str}:
+            data = ''.join(items).encode('utf-8', 'surrogatepass')
+        else:
+            data = b''.join(items)
+        layout = {'type': 'str' if types == {str} else 'bytes', 'count': len(items)}
+        return layout, ends.tobytes() + data
+    return {'pickle': True}, pickle.dumps(list(items), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_strings(layout, blob):
+    """
+    Return the list of strings or bytes of a section encoded by encode_section.
+    """
+    count = layout['count']
+    ends = np.frombuffer(blob, dtype=np.int64, count=count).tolist()
+    data = blob[8 * count:]
+    if layout['type'] == 'str':
+        data = data.decode('utf-8', 'surrogatepass')
+    starts = [0] + ends[:-1]
+    return [data[start:end] for start, end in zip(starts, ends)]
+
+
+def write_snapshot(path, meta, sections):
+    """
+    Write a snapshot with the given meta data (JSON-able dict) and sections (name -> list or array).
+    Numeric sections are stored raw, strings and bytes as a blob, the others pickled
+    (see encode_section).
+    """
+    layout = {}
+    blobs = []
+    offset = 0
+    for name, items in sections.items():
+        layout[name], blob = encode_section(items)
+        # Align every section, so arrays can be memory-mapped
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        layout[name].update(offset=offset, nbytes=len(blob))
+        blobs.append((offset, blob))
+        offset += len(blob)
+    header = json.dumps({'meta': meta, 'sections': layout}).encode()
+    # The sections start after the header, aligned
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for offset, blob in blobs:
+            f.seek(start + offset)
+            f.write(blob)
+
+
+def read_snapshot(path, mmap=False, allow_pickle=False):
+    """
+    Read a snapshot, return its meta data and sections (name -> array or list).
+    With mmap the numeric sections (without None items) are read-only memory maps, read from disk when used.
+    Raise a ValueError for pickled sections, unless allow_pickle is True:
+    unpickling can run arbitrary code, only allow it for trusted files.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a snapshot'.format(path))
+        header_length, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_length))
+        start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+        sections = {}
+        for name, layout in header['sections'].items():
+            offset = start + layout['offset']
+            if layout.get('pickle'):
+                if not allow_pickle:
+                    raise ValueError(
+                        'Section {!r} of {} is pickled, loading it needs allow_pickle=True '
+                        '(only for trusted files)'.format(name, path))
+                f.seek(offset)
+                sections[name] = pickle.loads(f.read(layout['nbytes']))
+            elif 'none_mask' in layout:
+                f.seek(offset)
+                blob = f.read(layout['nbytes'])
+                is_none = np.unpackbits(np.frombuffer(blob, dtype=np.uint8, count=layout['none_mask']))
+                blob = blob[layout['none_mask']:]
+                if 'type' in layout:
+                    items = decode_strings(layout, blob)
+                else:
+                    items = np.frombuffer(blob, dtype=layout['dtype'], count=int(np.prod(layout['shape']))).tolist()
+                sections[name] = [None if none else item for none, item in zip(is_none.tolist(), items)]
+            elif 'type' in layout:
+                f.seek(offset)
+                sections[name] = decode_strings(layout, f.read(layout['nbytes']))
+            elif mmap and layout['nbytes'] > 0:
+                sections[name] = np.memmap(
+                    path, dtype=layout['dtype'], mode='r', offset=offset, shape=tuple(layout['shape']))
+            else:
+                f.seek(offset)
+                sections[name] = np.fromfile(f, dtype=layout['dtype'], count=int(np.prod(layout['shape'])))
+    return header['meta'], sections
+
+
+def tree_sections(root, with_colors=False):
+    """
+    Return the snapshot sections of the tree under root: in-order keys and values,
+    pre-order structure bits and (with_colors) the pre-order color bits.
+    """
+    keys = []
+    values = []
+    stack = []
+    n = root
+    # In-order
+    while stack or n is not None:
+        while n is not None:
+            stack.append(n)
+            n = n.left
+        n = stack.pop()
+        keys.append(n.key)
+        values.append(n.value)
+        n = n.right
+    # Pre-order
+    structure = []
+    colors = []
+    stack = [root] if root is not None else []
+    while stack:
+        n = stack.pop()
+        structure.append(n.left is not None)
+        structure.append(n.right is not None)
+        if with_colors:
+            colors.append(n.is_red)
+        if n.right is not None:
+            stack.append(n.right)
+        if n.left is not None:
+            stack.append(n.left)
+    sections = {
+        'keys': keys,
+        'structure': np.packbits(np.array(structure, dtype=bool)),
+    }
+    if any(value is not None for value in values):
+        sections['values'] = values
+    if with_colors:
+        sections['colors'] = np.packbits(np.array(colors, dtype=bool))
+    return sections
+
+
+def build_tree(make_node, n, sections):
+    """
+    Rebuild the nodes of a tree from its snapshot sections in O(n) and return the root.
+    make_node(key) creates a node without children.
+    """
+    if n == 0:
+        return None
+    bits = np.unpackbits(np.asarray(sections['structure']), count=2 * n).astype(bool).tolist()
+    colors = (np.unpackbits(np.asarray(sections['colors']), count=n).astype(bool).tolist()
+              if 'colors' in sections else None)
+    # Create the nodes in pre-order, and link every node to its parent:
+    # the node after a node with a left child is that left child, otherwise it is the right
+    # child of the last node that still waits for its right child.
+    nodes = [make_node(None) for _ in range(n)]
+    waiting = []
+    for i, node in enumerate(nodes):
+        if i > 0:
+            if bits[2 * (i - 1)]:
+                nodes[i - 1].left = node
+            else:
+                waiting.pop().right = node
+        if bits[2 * i + 1]:
+            waiting.append(node)
+        if colors is not None:
+            node.is_red = colors[i]
+    # Sizes bottom-up: in reverse pre-order the children come before their parent
+    for node in reversed(nodes):
+        node.size = 1 + (node.left.size if node.left else 0) + (node.right.size if node.right else 0)
+    # Keys and values in in-order
+    keys = sections['keys']
+    keys = keys.tolist() if isinstance(keys, np.ndarray) else keys
+    values = sections.get('values')
+    values = values.tolist() if isinstance(values, np.ndarray) else values
+    stack = []
+    node = nodes[0]
+    i = 0
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node.left
+        node = stack.pop()
+        node.key = keys[i]
+        if values is not None:
+            node.value = values[i]
+        i += 1
+        node = node.right
+    return nodes[0]
+
+
+class SortedArrayMap(object):
+    """
+    Read-only replica of a tree from its (memory-mapped) in-order keys and values.
+    Lookups are binary searches in the sorted keys, so it can be used without rebuilding the tree.
+    """
+    def __init__(self, keys, values=None):
+        self.key_array = keys
+        self.value_array = values
+        self.n = len(keys)
+
+    def index(self, key):
+        """
+        Return the index of the first key >= key.
+        """
+        if isinstance(self.key_array, np.ndarray):
+            return int(np.searchsorted(self.key_array, key))
+        return bisect.bisect_left(self.key_array, key)
+
+    def item(self, array, i):
+        item = array[i]
+        return item.item() if isinstance(item, np.generic) else item
+
+    def get_index(self, key):
+        i = self.index(key)
+        if i < self.n and self.item(self.key_array, i) == key:
+            return i
+        return None
+
+    def get(self, key):
+        """
+        Return the value stored with key (like BST.get), None if not found or if there are no values.
+        """
+        i = self.get_index(key)
+        if i is None or self.value_array is None:
+            return None
+        return self.item(self.value_array, i)
+
+    def __contains__(self, key):
+        return self.get_index(key) is not None
+
+    def __getitem__(self, key):
+        i = self.get_index(key)
+        if i is None:
+            raise KeyError(key)
+        return self.item(self.value_array, i) if self.value_array is not None else None
+
+    def size(self):
+        return self.n
+
+    def __len__(self):
+        return self.n
+
+    def min(self):
+        return self.item(self.key_array, 0) if self.n else None
+
+    def max(self):
+        return self.item(self.key_array, self.n - 1) if self.n else None
+
+    def floor(self, key):
+        """
+        Return the largest key <= key, None if there is none.
+        """
+        i = self.index(key)
+        if i < self.n and self.item(self.key_array, i) == key:
+            return key
+        return self.item(self.key_array, i - 1) if i > 0 else None
+
+    def ceiling(self, key):
+        """
+        Return the smallest key >= key, None if there is none.
+        """
+        i = self.index(key)
+        return self.item(self.key_array, i) if i < self.n else None
+
+    def rank(self, key):
+        """
+        Return the number of keys < key.
+        """
+        return self.index(key)
+
+    def select(self, k):
+        """
+        Return the key of rank k, None if k is out of range.
+        """
+        return self.item(self.key_array, k) if 0 <= k < self.n else None
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self.item(self.key_array, i)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        for i in range(self.n):
+            yield None if self.value_array is None else self.item(self.value_array, i)
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+
+class ReadOnlyHeap(object):
+    """
+    Read-only replica of a BinaryHeap from its (memory-mapped) heap array (without the unused index 0).
+    """
+    def __init__(self, heap):
+        self.heap = heap
+
+    def size(self):
+        return len(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def is_empty(self):
+        return len(self.heap) == 0
+
+    def max(self):
+        if len(self.heap) == 0:
+            raise IndexError('max of an empty heap')
+        item = self.heap[0]
+        return item.item() if isinstance(item, np.generic) else item
+
+
+if __name__ == '__main__':
+    # Benchmark: save and load a red-black tree of 10^6 keys, against rebuilding it with put
+    import os
+    import random
+    import tempfile
+    import time
+
+    from red_black_tree import RedBlackTree
+
+    n = 10**6
+    keys = random.Random(42).sample(range(10 * n), n)
+    tree = RedBlackTree()
+    start = time.perf_counter()
+    for key in keys:
+        tree.put(key)
+    print('put rebuild:      {:.2f}s'.format(time.perf_counter() - start))
+    path = os.path.join(tempfile.gettempdir(), 'red_black_tree.snap')
+    start = time.perf_counter()
+    tree.save(path)
+    print('save:             {:.2f}s ({:.1f} bytes/key)'.format(time.perf_counter() - start, os.path.getsize(path) / n))
+    start = time.perf_counter()
+    loaded = RedBlackTree.load(path)
+    print('load:             {:.2f}s'.format(time.perf_counter() - start))
+    loaded.check_invariants()
+    start = time.perf_counter()
+    replica = RedBlackTree.load(path, mmap=True)
+    assert keys[0] in replica and replica.max() == tree.max()
+    print('mmap load + get:  {:.4f}s'.format(time.perf_counter() - start))
+    os.remove(path)
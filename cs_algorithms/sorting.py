@@ -0,0 +1,242 @@
+import math
+
+from priority_queue import BinaryHeap
+
+
+# Slices shorter than this are sorted with insertion sort
+INSERTION_SORT_CUTOFF = 16
+
+
+def insertion_sort(items, lo, hi):
+    """
+    Sort items[lo:hi] in place with insertion sort (stable).
+    """
+    for i in range(lo + 1, hi):
+        item = items[i]
+        j = i
+        # Move larger items one place to the right to make a hole for item
+        while j > lo and item < items[j-1]:
+            items[j] = items[j-1]
+            j -= 1
+        items[j] = item
+
+
+def merge(src, dst, lo, mid, hi):
+    """
+    Merge the sorted slices src[lo:mid] and src[mid:hi] into dst[lo:hi].
+    On equal items the one of the left slice goes first, which makes the merge stable.
+    """
+    i, j = lo, mid
+    for k in range(lo, hi):
+        if i == mid:
+            # Left slice done, copy the rest of the right slice
+            dst[k:hi] = src[j:hi]
+            return
+        if j == hi:
+            dst[k:hi] = src[i:mid]
+            return
+        if src[j] < src[i]:
+            dst[k] = src[j]
+            j += 1
+        else:
+            dst[k] = src[i]
+            i += 1
+
+
+def with_key(sort, items, key):
+    """
+    Sort the list items in place on key(item), with the given sort function that sorts on the items.
+    The (key, index) pairs that are sorted never compare the items themselves,
+    and the key of every item is computed once.
+    """
+    decorated = [(key(item), i) for i, item in enumerate(items)]
+    sort(decorated)
+    items[:] = [items[i] for _, i in decorated]
+    return items
+
+
+def mergesort(items, key=None):
+    """
+    Sort the given list in place with a stable bottom-up mergesort and return it.
+
+    Runs of INSERTION_SORT_CUTOFF items are first sorted with insertion sort, after which runs
+    of doubling width are merged. All merges use the same buffer: every pass merges from the
+    list into the buffer or the other way around, so only one extra list is ever allocated.
+    NumPy arrays are sorted with their own (stable) sort.
+    """
+    if hasattr(items, 'dtype') and key is None:
+        items.sort(kind='stable')
+        return items
+    if key is not None:
+        return with_key(mergesort, items, key)
+    n = len(items)
+    for lo in range(0, n, INSERTION_SORT_CUTOFF):
+        insertion_sort(items, lo, min(lo + INSERTION_SORT_CUTOFF, n))
+    src, dst = items, [None] * n
+    width = INSERTION_SORT_CUTOFF
+    while width < n:
+        for lo in range(0, n, 2 * width):
+            mid = min(lo + width, n)
+            hi = min(lo + 2 * width, n)
+            if mid == hi or not src[mid] < src[mid-1]:
+                # Only one run, or the runs are already in order
+                dst[lo:hi] = src[lo:hi]
+            else:
+                merge(src, dst, lo, mid, hi)
+        src, dst = dst, src
+        width *= 2
+    if src is not items:
+        # The last pass merged into the buffer
+        items[:] = src
+    return items
+
+
+def sort_three(items, a, b, c):
+    """
+    Sort items[a], items[b] and items[c] in place, so that items[b] is their median.
+    """
+    if items[b] < items[a]:
+        items[a], items[b] = items[b], items[a]
+    if items[c] < items[b]:
+        items[b], items[c] = items[c], items[b]
+        if items[b] < items[a]:
+            items[a], items[b] = items[b], items[a]
+
+
+def partition(items, lo, hi):
+    """
+    Partition items[lo:hi] around the median of its first, middle and last item.
+    Return the final index p of that pivot: items[lo:p] <= items[p] <= items[p+1:hi].
+
+    Both scans stop on items equal to the pivot, so many equal items are still split in the middle.
+    """
+    mid = (lo + hi) // 2
+    sort_three(items, lo, mid, hi - 1)
+    # The pivot goes to lo, where it stops the right scan.
+    # The largest of the three stays at hi - 1 (it is never swapped) and stops the left scan.
+    items[lo], items[mid] = items[mid], items[lo]
+    pivot = items[lo]
+    i, j = lo, hi - 1
+    while True:
+        i += 1
+        while items[i] < pivot:
+            i += 1
+        j -= 1
+        while pivot < items[j]:
+            j -= 1
+        if i >= j:
+            break
+        items[i], items[j] = items[j], items[i]
+    items[lo], items[j] = items[j], items[lo]
+    return j
+
+
+def heapsort(items, lo, hi):
+    """
+    Sort items[lo:hi] in place in O(n log n) with a BinaryHeap.
+    """
+    heap = BinaryHeap.from_iterable(items[lo:hi])
+    # pop_many returns the largest first
+    items[lo:hi] = reversed(heap.pop_many(hi - lo))
+
+
+def quicksort(items, key=None):
+    """
+    Sort the given list in place with introsort and return it (not stable).
+
+    Quicksort with the median of three as pivot, which avoids the quadratic behavior on
+    sorted input. Slices that are recursed into more than 2*log2(n) times are sorted with
+    heapsort instead, so the worst case is O(n log n) for every input, and small slices
+    are sorted with insertion sort.
+    The smaller side of a partition is sorted first, so the stack holds at most log2(n) slices.
+    NumPy arrays are sorted with their own sort (which is also an introsort).
+    """
+    if hasattr(items, 'dtype') and key is None:
+        items.sort(kind='quicksort')
+        return items
+    if key is not None:
+        return with_key(quicksort, items, key)
+    n = len(items)
+    stack = [(0, n, 2 * int(math.log2(n)) if n > 1 else 0)]
+    while stack:
+        lo, hi, depth = stack.pop()
+        while hi - lo > INSERTION_SORT_CUTOFF:
+            if depth == 0:
+                heapsort(items, lo, hi)
+                break
+            depth -= 1
+            p = partition(items, lo, hi)
+            # Continue with the smaller side, the larger side is sorted later
+            if p - lo < hi - p:
+                stack.append((p + 1, hi, depth))
+                hi = p
+            else:
+                stack.append((lo, p, depth))
+                lo = p + 1
+        else:
+            insertion_sort(items, lo, hi)
+    return items
+
+
+def median_of_three_killer(n):
+    """
+    Return Musser's permutation of 1..n that makes quicksort with a median of three pivot quadratic.
+    The construction only gives a permutation if n is a multiple of 4, raise a ValueError otherwise.
+    """
+    if n < 0 or n % 4 != 0:
+        raise ValueError('n must be a non-negative multiple of 4, got {}'.format(n))
+    k = n // 2
+    items = [0] * n
+    for i in range(1, k + 1):
+        if i % 2 == 1:
+            items[i-1] = i
+            items[i] = k + i
+        items[k + i - 1] = 2 * i
+    return items
+
+
+if __name__ == '__main__':
+    # Benchmark against sorted on random and adversarial inputs
+    import random
+    import time
+
+    import numpy as np
+
+    n = 10**5
+    rng = random.Random(42)
+    inputs = [
+        ('random', [rng.random() for _ in range(n)]),
+        ('sorted', list(range(n))),
+        ('reversed', list(range(n, 0, -1))),
+        ('few unique', [rng.randrange(4) for _ in range(n)]),
+        ('organ pipe', list(range(n // 2)) + list(range(n // 2, 0, -1))),
+        ('sawtooth', [i % 1000 for i in range(n)]),
+        ('median-of-3 killer', median_of_three_killer(n)),
+    ]
+    sorts = [
+        ('sorted', lambda items: items.sort()),
+        ('mergesort', mergesort),
+        ('quicksort', quicksort),
+    ]
+    print('{:<20}'.format('items/s') + ''.join('{:>14}'.format(name) for name, _ in sorts))
+    for input_name, items in inputs:
+        expected = sorted(items)
+        row = '{:<20}'.format(input_name)
+        for _, sort in sorts:
+            copy = list(items)
+            start = time.perf_counter()
+            sort(copy)
+            row += '{:>14,.0f}'.format(n / (time.perf_counter() - start))
+            assert copy == expected
+        print(row)
+
+    items = [(rng.randrange(100), i) for i in range(n)]
+    start = time.perf_counter()
+    mergesort(items, key=lambda item: item[0])
+    print('mergesort with key   {:>14,.0f}'.format(n / (time.perf_counter() - start)))
+    assert items == sorted(items, key=lambda item: item[0])
+
+    array = np.random.default_rng(42).random(10**7)
+    start = time.perf_counter()
+    quicksort(array)
+    print('NumPy fast path (10^7) {:>12,.0f}'.format(len(array) / (time.perf_counter() - start)))
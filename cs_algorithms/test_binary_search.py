@@ -0,0 +1,51 @@
+import bisect
+import random
+
+import numpy as np
+import pytest
+
+from binary_search import binary_search, search_sorted, SORT_QUERIES_MIN
+
+
+def expected(items, queries):
+    points = [bisect.bisect_left(items, query) for query in queries]
+    return points, [point < len(items) and items[point] == query for point, query in zip(points, queries)]
+
+
+def test_binary_search():
+    items = list(range(0, 100, 3))
+    for elem in range(-1, 101):
+        index = binary_search(elem, items)
+        if elem % 3 == 0 and elem < 100:
+            assert items[index] == elem
+        else:
+            assert index == -1
+    assert binary_search(1, []) == -1
+
+
+@pytest.mark.parametrize('n, m', [(0, 5), (5, 0), (1000, 10), (10, 1000), (1000, SORT_QUERIES_MIN + 100)])
+@pytest.mark.parametrize('sort_queries', [False, True])
+def test_search_sorted_lists(n, m, sort_queries):
+    rng = random.Random(n + m)
+    items = sorted(rng.randrange(3 * n + 1) for _ in range(n))
+    queries = [rng.randrange(-1, 3 * n + 2) for _ in range(m)]
+    if sort_queries:
+        queries.sort()
+    assert search_sorted(items, queries) == expected(items, queries)
+    assert search_sorted(items, queries, queries_sorted=sort_queries) == expected(items, queries)
+
+
+@pytest.mark.parametrize('n, m', [(0, 5), (5, 0), (1000, 10), (1000, SORT_QUERIES_MIN + 100)])
+@pytest.mark.parametrize('sort_queries', [False, True])
+@pytest.mark.parametrize('dtype', [np.int64, np.float64])
+def test_search_sorted_arrays(n, m, sort_queries, dtype):
+    rng = np.random.default_rng(n + m)
+    items = np.sort(rng.integers(0, 3 * n + 1, n)).astype(dtype)
+    queries = rng.integers(-1, 3 * n + 2, m).astype(dtype)
+    if sort_queries:
+        queries.sort()
+    points, found = search_sorted(items, queries)
+    assert isinstance(points, np.ndarray) and isinstance(found, np.ndarray)
+    expected_points, expected_found = expected(items.tolist(), queries.tolist())
+    assert points.tolist() == expected_points
+    assert found.tolist() == expected_found
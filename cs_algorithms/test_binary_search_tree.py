@@ -0,0 +1,220 @@
+import bisect
+import random
+import sys
+
+import pytest
+
+from binary_search_tree import BST
+from red_black_tree import RedBlackTree
+
+TREES = [BST, RedBlackTree]
+
+
+def height(n):
+    return 0 if n is None else 1 + max(height(n.left), height(n.right))
+
+
+def black_height(n):
+    """
+    Check the left-leaning red-black invariants under n and return its black height.
+    """
+    if n is None:
+        return 0
+    assert not RedBlackTree.is_red(n.right), 'red right link'
+    assert not (n.is_red and RedBlackTree.is_red(n.left)), 'two red links in a row'
+    left_height = black_height(n.left)
+    assert left_height == black_height(n.right), 'black height differs'
+    return left_height + (0 if n.is_red else 1)
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_sorted_keys_deeper_than_the_recursion_limit(cls):
+    # A BST fed sorted keys is a linked list, deeper than the recursion limit
+    n = sys.getrecursionlimit() + 1000
+    tree = cls()
+    for key in range(n):
+        tree.put(key, -key)
+    assert tree.get(n - 1) == 1 - n
+    assert tree.get(n) is None
+    assert (tree.min(), tree.max()) == (0, n - 1)
+    assert len(str(tree)) > 0
+
+
+def test_bst_deletes_deeper_than_the_recursion_limit():
+    n = sys.getrecursionlimit() + 1000
+    tree = BST()
+    for key in range(n):
+        tree.put(key, -key)
+    tree.delete_min()
+    for key in range(n - 1, n // 2, -1):
+        tree.delete(key)
+    assert (tree.min(), tree.max()) == (1, n // 2)
+    assert all(tree.get(key) == -key for key in range(1, n // 2 + 1))
+    assert tree.get(0) is None and tree.get(n - 1) is None
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_put_get_against_a_set(cls):
+    rng = random.Random(0)
+    keys = [rng.randrange(500) for _ in range(2000)]
+    tree = cls()
+    for key in keys:
+        tree.put(key, str(key))
+    assert all(tree.get(key) == str(key) for key in keys)
+    assert all(tree.get(key) is None for key in set(range(500)) - set(keys))
+    assert (tree.min(), tree.max()) == (min(keys), max(keys))
+
+
+def test_bst_delete_against_a_set():
+    rng = random.Random(1)
+    tree = BST()
+    keys = set()
+    for _ in range(3000):
+        key = rng.randrange(500)
+        if rng.random() < 0.6:
+            tree.put(key, str(key))
+            keys.add(key)
+        else:
+            tree.delete(key)
+            keys.discard(key)
+    assert all(tree.get(key) == str(key) for key in keys)
+    assert all(tree.get(key) is None for key in set(range(500)) - keys)
+
+
+@pytest.mark.parametrize('cls', TREES)
+@pytest.mark.parametrize('n', [0, 1, 2, 10, 100, 1000])
+def test_from_sorted_is_balanced(cls, n):
+    tree = cls.from_sorted(key for key in range(n) for _ in range(2))
+    assert list(tree) == list(range(n))
+    assert tree.size() == n
+    if cls is BST:
+        assert height(tree.root) == n.bit_length()
+    else:
+        assert not RedBlackTree.is_red(tree.root)
+        black_height(tree.root)
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_put_many_merges_into_the_tree(cls):
+    rng = random.Random(1)
+    old = rng.sample(range(2000), 300)
+    batch = [rng.randrange(2000) for _ in range(500)]
+    tree = cls()
+    for key in old:
+        tree.put(key)
+    tree.put_many(batch)
+    assert list(tree) == sorted(set(old) | set(batch))
+    assert tree.size() == len(set(old) | set(batch))
+    if cls is RedBlackTree:
+        black_height(tree.root)
+    tree.put_many([])
+    assert list(tree) == sorted(set(old) | set(batch))
+    assert tree.size() == len(set(old) | set(batch))
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_order_queries_against_a_sorted_list(cls):
+    rng = random.Random(2)
+    keys = sorted(rng.sample(range(0, 1000, 2), 200))
+    tree = cls()
+    for key in rng.sample(keys, len(keys)):
+        tree.put(key)
+    assert tree.size() == len(keys)
+    assert list(tree) == keys
+    assert list(reversed(tree)) == keys[::-1]
+    for k, key in enumerate(keys):
+        assert tree.select(k) == key
+        assert tree.rank(key) == k
+    assert tree.select(-1) is None and tree.select(len(keys)) is None
+    for query in range(-1, 1002):
+        i = bisect.bisect_left(keys, query)
+        assert tree.rank(query) == i
+        assert tree.ceiling(query) == (keys[i] if i < len(keys) else None)
+        j = bisect.bisect_right(keys, query)
+        assert tree.floor(query) == (keys[j - 1] if j > 0 else None)
+    for lo, hi in [(-5, 2000), (100, 500), (101, 101), (100, 100), (500, 100)]:
+        expected = [key for key in keys if lo <= key <= hi]
+        assert list(tree.range(lo, hi)) == expected
+        assert tree.range_size(lo, hi) == len(expected)
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_order_queries_on_an_empty_tree(cls):
+    tree = cls()
+    assert list(tree) == [] and list(reversed(tree)) == []
+    assert tree.floor(1) is None and tree.ceiling(1) is None
+    assert tree.rank(1) == 0 and tree.select(0) is None
+    assert list(tree.range(0, 10)) == [] and tree.range_size(0, 10) == 0
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_map_mode_against_a_dict(cls):
+    rng = random.Random(3)
+    tree = cls()
+    expected = {}
+    for _ in range(400):
+        key = rng.randrange(300)
+        tree[key] = expected[key] = rng.random()
+    assert len(tree) == len(expected)
+    assert list(tree.items()) == sorted(expected.items())
+    assert list(tree.keys()) == sorted(expected)
+    assert list(tree.values()) == [expected[key] for key in sorted(expected)]
+    for key in range(300):
+        assert (key in tree) == (key in expected)
+        if key in expected:
+            assert tree[key] == expected[key]
+        else:
+            with pytest.raises(KeyError):
+                tree[key]
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_put_with_value_and_update(cls):
+    tree = cls()
+    tree.put('b', 2)
+    tree.put('a', 1)
+    tree.put('b', 20)
+    assert tree['b'] == 20 and len(tree) == 2
+    # A stored value of None is still a key in the tree
+    tree['c'] = None
+    assert 'c' in tree and tree['c'] is None
+    tree.update({'d': 4, 'a': 10})
+    tree.update([('e', 5), ('e', 50)])
+    assert list(tree.items()) == [('a', 10), ('b', 20), ('c', None), ('d', 4), ('e', 50)]
+    assert cls.from_sorted_items([(1, 'x'), (1, 'y'), (2, 'z')])[1] == 'y'
+
+
+@pytest.mark.parametrize('cls', TREES)
+def test_put_without_value_keeps_the_value(cls):
+    tree = cls()
+    tree.put(1, 'a')
+    tree.put(2)
+    tree.put(1)
+    assert tree.get(1) == 'a' and tree.get(2) is None
+    tree.put_many([1, 2, 3])
+    assert list(tree.items()) == [(1, 'a'), (2, None), (3, None)]
+    # An explicit None does replace the value
+    tree.put(1, None)
+    assert tree.get(1) is None and 1 in tree
+
+
+class LessThanOnly(object):
+    """
+    Key that only defines <, equality is identity.
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value < other.value
+
+
+def test_bst_delete_with_keys_that_only_define_less_than():
+    tree = BST()
+    for value in [5, 2, 8, 1, 3, 9]:
+        tree.put(LessThanOnly(value), value)
+    # Equal keys that are different objects
+    tree.delete(LessThanOnly(2))
+    tree.delete(LessThanOnly(9))
+    assert [key.value for key in tree] == [1, 3, 5, 8]
+    assert tree.get(LessThanOnly(3)) == 3
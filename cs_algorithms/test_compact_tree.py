@@ -0,0 +1,194 @@
+import bisect
+import random
+
+import pytest
+
+from binary_search_tree import BST
+from red_black_tree import RedBlackTree
+from compact_tree import NIL, CompactBST, CompactRedBlackTree
+
+TREES = [(CompactBST, BST), (CompactRedBlackTree, RedBlackTree)]
+
+
+def in_order(tree):
+    keys = []
+    stack = []
+    n = tree.root
+    while stack or n != NIL:
+        while n != NIL:
+            stack.append(n)
+            n = tree.left[n]
+        n = stack.pop()
+        keys.append(tree.key_array[n])
+        n = tree.right[n]
+    return keys
+
+
+def black_height(tree, n):
+    """
+    Check the left-leaning red-black invariants under n and return its black height.
+    """
+    if n == NIL:
+        return 0
+    assert not tree.is_red(tree.right[n]), 'red right link'
+    assert not (tree.red[n] and tree.is_red(tree.left[n])), 'two red links in a row'
+    left_height = black_height(tree, tree.left[n])
+    assert left_height == black_height(tree, tree.right[n]), 'black height differs'
+    return left_height + (0 if tree.red[n] else 1)
+
+
+def check_sentinel(tree):
+    assert (tree.left[NIL], tree.right[NIL], tree.sizes[NIL], tree.red[NIL]) == (NIL, NIL, 0, 0)
+    assert NIL not in tree.free
+
+
+@pytest.mark.parametrize('cls', [CompactBST, CompactRedBlackTree])
+@pytest.mark.parametrize('key_typecode', [None, 'q'])
+def test_random_operations(cls, key_typecode):
+    rng = random.Random(0)
+    tree = cls(key_typecode=key_typecode)
+    reference = set()
+    for _ in range(3000):
+        key = rng.randrange(300)
+        operation = rng.random()
+        if operation < 0.5:
+            tree.put(key)
+            reference.add(key)
+        elif operation < 0.8:
+            tree.delete(key)
+            reference.discard(key)
+        elif reference:
+            tree.delete_min()
+            reference.discard(min(reference))
+        assert tree.size() == len(reference)
+        if cls is CompactRedBlackTree:
+            assert not tree.is_red(tree.root)
+            black_height(tree, tree.root)
+    assert in_order(tree) == sorted(reference)
+    assert tree.min() == min(reference) and tree.max() == max(reference)
+    check_sentinel(tree)
+    if cls is CompactRedBlackTree:
+        assert tree.check_invariants()
+
+
+def test_red_black_delete_max_and_slot_reuse():
+    tree = CompactRedBlackTree()
+    for key in range(100):
+        tree.put(key)
+    for expected in range(99, 49, -1):
+        assert tree.max() == expected
+        tree.delete_max()
+        black_height(tree, tree.root)
+    assert len(tree.free) == 50
+    for key in range(100, 150):
+        tree.put(key)
+    # The freed slots are reused, no new ones are allocated (slot 0 is the sentinel)
+    assert len(tree.key_array) == 101 and not tree.free
+    assert in_order(tree) == list(range(50)) + list(range(100, 150))
+    check_sentinel(tree)
+
+
+@pytest.mark.parametrize('cls, node_cls', TREES)
+@pytest.mark.parametrize('key_typecode', [None, 'q'])
+def test_same_results_as_the_node_trees(cls, node_cls, key_typecode):
+    rng = random.Random(1)
+    tree = cls(key_typecode=key_typecode)
+    expected = node_cls()
+    for _ in range(2000):
+        key = rng.randrange(400)
+        if rng.random() < 0.7:
+            tree.put(key, -key)
+            expected.put(key, -key)
+        else:
+            tree.delete(key)
+            expected.delete(key)
+    tree.put_many(range(350, 450))
+    expected.put_many(range(350, 450))
+    tree.update({1: 'one', 2: 'two'})
+    expected.update({1: 'one', 2: 'two'})
+    tree[3] = 'three'
+    expected[3] = 'three'
+    assert len(tree) == tree.size() == expected.size()
+    assert list(tree.items()) == list(expected.items())
+    assert list(tree.values()) == list(expected.values())
+    assert list(tree.keys()) == list(expected.keys())
+    assert list(reversed(tree)) == list(reversed(expected))
+    assert tree.height() <= 2 * expected.size().bit_length()
+    for query in range(-1, 452):
+        assert tree.get(query) == expected.get(query)
+        assert (query in tree) == (query in expected)
+        assert tree.floor(query) == expected.floor(query)
+        assert tree.ceiling(query) == expected.ceiling(query)
+        assert tree.rank(query) == expected.rank(query)
+        assert tree.select(query) == expected.select(query)
+    for lo, hi in [(-5, 500), (100, 200), (101, 101), (200, 100)]:
+        assert list(tree.range(lo, hi)) == list(expected.range(lo, hi))
+        assert tree.range_size(lo, hi) == expected.range_size(lo, hi)
+    with pytest.raises(KeyError):
+        tree[1000]
+    check_sentinel(tree)
+
+
+@pytest.mark.parametrize('cls, node_cls', TREES)
+@pytest.mark.parametrize('n', [0, 1, 2, 10, 100, 1000])
+def test_from_sorted_is_balanced(cls, node_cls, n):
+    tree = cls.from_sorted((key for key in range(n) for _ in range(2)), key_typecode='q')
+    expected = node_cls.from_sorted(range(n))
+    assert list(tree) == list(range(n))
+    assert tree.size() == n
+    assert tree.height() == expected.height()
+    # The slots are filled in key order, without free slots
+    assert list(tree.key_array[1:]) == list(range(n)) and not tree.free
+    if cls is CompactRedBlackTree:
+        assert tree.check_invariants()
+    items = cls.from_sorted_items([(1, 'x'), (1, 'y'), (2, 'z')])
+    assert list(items.items()) == [(1, 'y'), (2, 'z')]
+
+
+@pytest.mark.parametrize('cls', [CompactBST, CompactRedBlackTree])
+def test_put_without_value_keeps_the_value(cls):
+    tree = cls()
+    tree.put(1, 'a')
+    tree.put(2)
+    tree.put(1)
+    assert tree.get(1) == 'a' and tree.get(2) is None
+    tree.put_many([1, 2, 3])
+    assert list(tree.items()) == [(1, 'a'), (2, None), (3, None)]
+    tree.delete(1)
+    assert list(tree.items()) == [(2, None), (3, None)]
+
+
+def test_order_queries_on_an_empty_tree():
+    for cls in (CompactBST, CompactRedBlackTree):
+        tree = cls()
+        assert list(tree) == [] and tree.height() == 0 and str(tree) == 'None'
+        assert tree.floor(1) is None and tree.ceiling(1) is None and tree.get(1) is None
+        assert tree.rank(1) == 0 and tree.select(0) is None and tree.min() is None
+        assert list(tree.range(0, 10)) == [] and tree.range_size(0, 10) == 0
+        tree.delete(1)
+        tree.delete_min()
+        check_sentinel(tree)
+
+
+def test_delete_copies_the_successor_value():
+    keys = list(range(0, 100, 2))
+    tree = CompactBST()
+    for key in random.Random(2).sample(keys, len(keys)):
+        tree.put(key, str(key))
+    for key in keys[::3]:
+        tree.delete(key)
+        keys.remove(key)
+    assert list(tree.items()) == [(key, str(key)) for key in keys]
+    assert [tree.rank(key) for key in keys] == [bisect.bisect_left(keys, key) for key in keys]
+
+
+def test_check_invariants_reports_violations():
+    tree = CompactRedBlackTree.from_sorted(range(20))
+    assert tree.check_invariants()
+    tree.sizes[tree.root] += 1
+    with pytest.raises(ValueError):
+        tree.check_invariants()
+    tree = CompactRedBlackTree.from_sorted(range(20))
+    tree.red[tree.root] = True
+    with pytest.raises(ValueError):
+        tree.check_invariants()
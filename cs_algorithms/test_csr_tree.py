@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from csr_tree import CSRTree
+
+EDGES = [('F', 'B'), ('F', 'G'), ('B', 'A'), ('B', 'D'), ('D', 'C'), ('D', 'E'), ('G', 'I'), ('I', 'H')]
+
+
+def test_traversals():
+    tree = CSRTree.from_edges(EDGES)
+    assert len(tree) == 9
+    assert list(tree.pre_order()) == list('FBADCEGIH')
+    # G and I have a single child, which comes before them
+    assert list(tree.in_order()) == list('ABCDEFHIG')
+    assert list(tree.post_order()) == list('ACEDBHIGF')
+    assert list(tree.level_order()) == list('FBGADICEH')
+
+
+def test_integer_labels_and_forest():
+    # Two trees, rooted at 10 and 3, with the integer labels mapped through arrays
+    tree = CSRTree.from_edges(np.array([[10, 2], [3, 4], [10, 5], [2, 7]]))
+    assert sorted(tree.labels) == [2, 3, 4, 5, 7, 10]
+    assert list(tree.pre_order()) == [3, 4, 10, 2, 7, 5]
+    assert list(tree.post_order()) == [4, 3, 7, 2, 5, 10]
+    assert list(tree.level_order()) == [3, 10, 4, 2, 5, 7]
+    assert [tree.labels[i] for i in tree.children_of(tree.labels.index(10))] == [2, 5]
+
+
+def test_deep_chain_without_recursion():
+    n = 10**5
+    tree = CSRTree.from_edges(np.column_stack([np.arange(n - 1), np.arange(1, n)]))
+    assert list(tree.pre_order()) == list(range(n))
+    assert list(tree.post_order()) == list(range(n - 1, -1, -1))
+    assert list(tree.in_order()) == list(range(n - 1, -1, -1))
+
+
+def test_empty():
+    tree = CSRTree.from_edges([])
+    assert len(tree) == 0
+    assert list(tree.pre_order()) == [] and list(tree.level_order()) == []
+
+
+@pytest.mark.parametrize('edges', [
+    [('a', 'b'), ('c', 'b')],
+    [(1, 2), (3, 2)],
+    [('a', 'b'), ('b', 'a')],
+    [(0, 1), (1, 2), (2, 3), (3, 1)],
+    [(5, 5)],
+])
+def test_from_edges_rejects_non_trees(edges):
+    with pytest.raises(ValueError):
+        CSRTree.from_edges(edges)
@@ -0,0 +1,36 @@
+import os
+import random
+
+from external_sort import external_sort, sort_file
+
+
+def test_sorts_in_memory_and_with_spilled_runs():
+    rng = random.Random(0)
+    lines = ['{:06d}'.format(rng.randrange(10**6)) for _ in range(2000)]
+    expected = sorted(line + '\n' for line in lines)
+    assert list(external_sort(lines)) == expected
+    # A tiny budget and fan-in spill many runs and need several merge passes
+    assert list(external_sort(lines, memory_budget=2**14, fan_in=4)) == expected
+
+
+def test_key_and_stability():
+    lines = ['b 1\n', 'a 2\n', 'b 3\n', 'a 4\n']
+    result = list(external_sort(lines, memory_budget=64, fan_in=2, key=lambda line: line.split()[0]))
+    assert result == ['a 2\n', 'a 4\n', 'b 1\n', 'b 3\n']
+
+
+def test_carriage_return_in_spilled_line():
+    # Every line is spilled to its own run, a '\r' in a line must not split it
+    lines = ['b', 'a\rc', 'a', 'd\r\n', 'é x']
+    assert list(external_sort(lines, memory_budget=64, fan_in=2)) == sorted(
+        ['b\n', 'a\rc\n', 'a\n', 'd\r\n', 'é x\n'])
+
+
+def test_sort_file(tmp_path):
+    in_path = os.path.join(tmp_path, 'in.txt')
+    out_path = os.path.join(tmp_path, 'out.txt')
+    with open(in_path, 'w', encoding='utf-8', newline='') as f:
+        f.write('zeta\r\nalpha\rbeta\nmu\n')
+    sort_file(in_path, out_path, memory_budget=64, fan_in=2, directory=tmp_path)
+    with open(out_path, encoding='utf-8', newline='') as f:
+        assert f.read() == 'alpha\rbeta\nmu\nzeta\r\n'
@@ -0,0 +1,100 @@
+import heapq
+import os
+import random
+
+import pytest
+
+from priority_queue import BinaryHeap
+from heap_backends import DaryHeap, PairingHeap, make_heap
+
+BACKENDS = [(DaryHeap, {'d': d}) for d in (2, 3, 4, 8)] + [(PairingHeap, {}), (BinaryHeap, {})]
+
+
+@pytest.mark.parametrize('cls, init', BACKENDS)
+def test_random_operations_against_heapq(cls, init):
+    rng = random.Random(0)
+    heap = cls(**init)
+    # heapq is a min heap, it holds the negated keys
+    reference = []
+    for _ in range(3000):
+        r = rng.random()
+        key = rng.randrange(500)
+        if r < 0.4 or not reference:
+            heap.insert(key)
+            heapq.heappush(reference, -key)
+        elif r < 0.6:
+            assert heap.max() == -reference[0]
+            assert heap.delete_max() == -heapq.heappop(reference)
+        elif r < 0.75:
+            assert heap.pushpop(key) == -heapq.heappushpop(reference, -key)
+        elif r < 0.9:
+            assert heap.replace(key) == -heapq.heapreplace(reference, -key)
+        else:
+            keys = [rng.randrange(500) for _ in range(rng.randrange(20))]
+            heap.push_many(keys)
+            for key in keys:
+                heapq.heappush(reference, -key)
+        assert heap.size() == len(reference)
+    assert heap.pop_many(len(reference) + 5) == [-key for key in sorted(reference)]
+    assert heap.is_empty()
+    with pytest.raises(IndexError):
+        heap.max()
+    with pytest.raises(IndexError):
+        heap.delete_max()
+    assert heap.pushpop(3) == 3
+
+
+@pytest.mark.parametrize('cls, init', BACKENDS)
+@pytest.mark.parametrize('n', [0, 1, 2, 9, 100])
+def test_from_iterable_against_heapq(cls, init, n):
+    keys = [random.Random(n).random() for _ in range(n)]
+    heap = cls.from_iterable(keys, **init)
+    assert heap.pop_many(n) == heapq.nlargest(n, keys)
+
+
+@pytest.mark.parametrize('d', [2, 3, 4, 8])
+def test_dary_heap_order(d):
+    heap = DaryHeap.from_iterable(random.Random(d).sample(range(1000), 500), d=d)
+    for i in range(2, heap.size() + 1):
+        assert not heap.heap[(i - 2) // d + 1] < heap.heap[i]
+    with pytest.raises(ValueError):
+        DaryHeap(1)
+
+
+def test_pairing_heap_meld():
+    rng = random.Random(1)
+    a_keys = [rng.random() for _ in range(300)]
+    b_keys = [rng.random() for _ in range(200)]
+    a = PairingHeap.from_iterable(a_keys)
+    b = PairingHeap.from_iterable(b_keys)
+    a.delete_max()
+    a.meld(b)
+    assert b.is_empty() and b.size() == 0
+    assert a.size() == 499
+    assert a.pop_many(499) == sorted(a_keys + b_keys, reverse=True)[1:]
+    # Melding with an empty heap, both ways
+    a.meld(PairingHeap())
+    a.meld(PairingHeap.from_iterable([2, 1]))
+    assert a.pop_many(3) == [2, 1]
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_pairing_heap_round_trip(tmp_path, mmap):
+    keys = [random.Random(2).random() for _ in range(300)]
+    heap = PairingHeap.from_iterable(keys)
+    heap.delete_max()
+    path = os.path.join(tmp_path, 'heap.snap')
+    heap.save(path)
+    loaded = PairingHeap.load(path, mmap=mmap)
+    assert loaded.size() == heap.size() and loaded.max() == heap.max()
+    if not mmap:
+        assert loaded.pop_many(300) == heap.pop_many(300)
+    with pytest.raises(ValueError):
+        BinaryHeap.load(path)
+
+
+def test_make_heap():
+    assert isinstance(make_heap('dary', d=3), DaryHeap) and make_heap('dary', d=3).d == 3
+    assert isinstance(make_heap('pairing'), PairingHeap)
+    with pytest.raises(ValueError):
+        make_heap('fibonacci')
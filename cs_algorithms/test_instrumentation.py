@@ -0,0 +1,105 @@
+import random
+
+import binary_search_tree
+import red_black_tree
+from binary_search_tree import BST
+from red_black_tree import RedBlackTree
+from priority_queue import BinaryHeap
+from heap_backends import DaryHeap
+from external_sort import external_sort
+from instrumentation import Instrumentation, CountedKey
+from top_k import top_k
+
+KEYS = random.Random(0).sample(range(10**4), 1000)
+
+
+def use_structures():
+    results = []
+    for cls in (BST, RedBlackTree):
+        tree = cls()
+        for key in KEYS:
+            tree.put(key)
+        results.append([tree.get(key) for key in KEYS[:50]] + [tree.floor(5000), tree.rank(5000), tree.max()])
+        for key in KEYS[:200]:
+            tree.delete(key)
+        results.append(tree.size())
+    for heap in (BinaryHeap(), DaryHeap(4)):
+        for key in KEYS:
+            heap.insert(key)
+        results.append([heap.pushpop(-1), heap.replace(7), heap.max()])
+        heap.push_many(KEYS[:100])
+        results.append(heap.pop_many(300))
+    results.append(BinaryHeap.from_iterable(KEYS).pop_many(10))
+    return results
+
+
+def test_same_results_and_classes_restored():
+    classes = {cls: dict(cls.__dict__) for cls in (BST, RedBlackTree, BinaryHeap, DaryHeap)}
+    node_classes = binary_search_tree.Node, red_black_tree.Node
+    expected = use_structures()
+    with Instrumentation() as stats:
+        assert use_structures() == expected
+    assert Instrumentation.active is None
+    assert {cls: dict(cls.__dict__) for cls in classes} == classes
+    assert (binary_search_tree.Node, red_black_tree.Node) == node_classes
+    counters = stats.to_dict()['counters']
+    assert counters['comparisons'] > 0 and counters['swims'] > 0 and counters['sinks'] > 0
+    assert counters['rotate_left'] + counters['rotate_right'] > 0
+
+
+def test_plain_keys_in_structures():
+    tree = RedBlackTree()
+    heap = BinaryHeap()
+    with Instrumentation():
+        for key in KEYS:
+            tree.put(key)
+            heap.insert(key)
+        assert all(isinstance(key, CountedKey) for key in heap.heap[1:])
+    assert all(type(key) is int for key in tree.keys())
+    assert type(heap.heap) is list
+    assert all(type(key) is int for key in heap.heap[1:])
+
+
+def test_swim_and_sink_steps():
+    with Instrumentation() as stats:
+        heap = BinaryHeap()
+        for key in range(8):
+            heap.insert(key)
+    # Every key swims up to the root
+    assert stats.counters['swims'] == 8
+    assert stats.counters['swim_steps'] == 0 + 1 + 1 + 2 + 2 + 2 + 2 + 3
+    assert stats.operations['BinaryHeap.insert'].calls == 8
+
+
+def test_heap_users_under_instrumentation():
+    lines = ['{:04d}'.format(key) for key in KEYS[:200]]
+    expected = sorted(line + '\n' for line in lines)
+    with Instrumentation() as stats:
+        assert list(external_sort(lines, memory_budget=2**10, fan_in=4)) == expected
+        assert top_k(KEYS, 5) == sorted(KEYS, reverse=True)[:5]
+    assert stats.counters['sinks'] > 0
+
+
+def test_reset_while_enabled_still_unwraps_heaps():
+    heap = BinaryHeap()
+    with Instrumentation() as stats:
+        for key in KEYS[:100]:
+            heap.insert(key)
+        stats.reset()
+        assert stats.counters['swims'] == 0 and not stats.operations
+        # The heap isn't used after the reset, it's still unwrapped on disable
+        BinaryHeap().insert(-1)
+        assert stats.counters['swims'] == 1
+    assert type(heap.heap) is list
+    assert all(type(key) is int for key in heap.heap[1:])
+
+
+def test_node_classes_stay_classes():
+    with Instrumentation() as stats:
+        tree = BST()
+        tree.put(1)
+        tree.put(2)
+        assert isinstance(tree.root, binary_search_tree.Node)
+        assert isinstance(binary_search_tree.Node, type) and isinstance(red_black_tree.Node, type)
+    assert stats.counters['nodes'] == 2
+    assert type(tree.root.key) is int
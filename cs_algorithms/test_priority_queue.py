@@ -0,0 +1,130 @@
+import heapq
+import inspect
+import random
+
+import pytest
+
+from priority_queue import BinaryHeap, IndexedBinaryHeap
+
+
+def is_heap(heap):
+    items = heap.heap
+    return all(not items[i // 2] < items[i] for i in range(2, len(items)))
+
+
+def test_from_iterable_and_pop_many():
+    keys = [random.Random(0).randrange(100) for _ in range(500)]
+    heap = BinaryHeap.from_iterable(keys)
+    assert is_heap(heap)
+    assert heap.pop_many(10) == sorted(keys, reverse=True)[:10]
+    assert heap.size() == 490
+
+
+@pytest.mark.parametrize('n_existing, n_batch', [(0, 50), (100, 10), (10, 100)])
+def test_push_many(n_existing, n_batch):
+    rng = random.Random(n_existing)
+    keys = [rng.random() for _ in range(n_existing + n_batch)]
+    heap = BinaryHeap.from_iterable(keys[:n_existing])
+    heap.push_many(keys[n_existing:])
+    assert is_heap(heap)
+    assert heap.pop_many(len(keys)) == sorted(keys, reverse=True)
+
+
+def test_pushpop_and_replace():
+    rng = random.Random(1)
+    keys = [rng.randrange(1000) for _ in range(200)]
+    heap = BinaryHeap.from_iterable(keys[:20])
+    reference = [-key for key in keys[:20]]
+    heapq.heapify(reference)
+    for key in keys[20:]:
+        assert heap.pushpop(key) == -heapq.heappushpop(reference, -key)
+        assert heap.replace(key) == -heapq.heapreplace(reference, -key)
+    assert is_heap(heap)
+    assert BinaryHeap().pushpop(3) == 3
+    with pytest.raises(IndexError):
+        BinaryHeap().replace(3)
+
+
+def test_indexed_push_many_rejects_duplicates_without_changing_the_heap():
+    heap = IndexedBinaryHeap()
+    heap.insert(('c', 9))
+    with pytest.raises(ValueError):
+        heap.push_many([('a', 1), ('c', 3)])
+    with pytest.raises(ValueError):
+        heap.push_many([('a', 1), ('b', 2), ('a', 5)])
+    assert heap.size() == 1
+    assert 'a' not in heap
+    assert heap.delete_top() == ('c', 9)
+
+
+def check_indexed(heap):
+    assert len(heap.positions) == heap.size()
+    for handle, i in heap.positions.items():
+        assert heap.heap[i] == handle
+        if i > 1:
+            assert not heap.above(heap.sort_keys[handle], heap.sort_keys[heap.heap[i // 2]])
+
+
+@pytest.mark.parametrize('min_heap', [False, True])
+def test_indexed_change_key_and_remove_against_a_dict(min_heap):
+    rng = random.Random(2)
+    heap = IndexedBinaryHeap(min_heap=min_heap)
+    priorities = {}
+    for _ in range(2000):
+        handle = rng.randrange(100)
+        r = rng.random()
+        if handle not in priorities:
+            priorities[handle] = rng.random()
+            heap.insert((handle, priorities[handle]))
+        elif r < 0.5:
+            priorities[handle] = rng.random()
+            heap.change_key(handle, priorities[handle])
+        else:
+            assert heap.remove(handle) == priorities.pop(handle)
+        assert all(heap.contains(handle) == (handle in priorities) for handle in range(100))
+    check_indexed(heap)
+    best = min if min_heap else max
+    handle = best(priorities, key=priorities.get)
+    assert heap.top() == (handle, priorities[handle])
+    popped = [heap.delete_top() for _ in range(len(heap))]
+    assert popped == sorted(priorities.items(), key=lambda item: item[1], reverse=not min_heap)
+
+
+def test_indexed_key_function_and_errors():
+    heap = IndexedBinaryHeap(min_heap=True, key=lambda priority: priority[0])
+    for handle, priority in [('a', (3, 'x')), ('b', (1, 'y')), ('c', (2, 'z'))]:
+        heap.insert((handle, priority))
+    assert heap.top() == ('b', (1, 'y'))
+    heap.change_key('c', (0, 'w'))
+    assert heap.get_priority('c') == (0, 'w')
+    assert [heap.delete_top()[0] for _ in range(3)] == ['c', 'b', 'a']
+    with pytest.raises(IndexError):
+        heap.top()
+    with pytest.raises(KeyError):
+        heap.change_key('a', (1, 'x'))
+    with pytest.raises(KeyError):
+        heap.remove('a')
+
+
+def test_indexed_max_and_min_only_on_the_matching_heap():
+    max_heap = IndexedBinaryHeap.from_iterable([('a', 1), ('b', 3), ('c', 2)])
+    min_heap = IndexedBinaryHeap.from_iterable([('a', 1), ('b', 3), ('c', 2)], min_heap=True)
+    assert max_heap.max() == ('b', 3) and min_heap.min() == ('a', 1)
+    for heap, name in [(min_heap, 'max'), (min_heap, 'delete_max'), (max_heap, 'min'), (max_heap, 'delete_min')]:
+        with pytest.raises(TypeError):
+            getattr(heap, name)()
+    assert max_heap.pushpop(('d', 0)) == ('b', 3)
+    assert min_heap.replace(('d', 0)) == ('a', 1)
+    assert max_heap.pop_many(5) == [('c', 2), ('a', 1), ('d', 0)]
+    assert min_heap.pop_many(5) == [('d', 0), ('c', 2), ('b', 3)]
+
+
+def test_indexed_signatures_match_the_base():
+    for name in ['insert', 'pushpop', 'replace', 'load', 'from_iterable']:
+        base = list(inspect.signature(getattr(BinaryHeap, name)).parameters.values())
+        indexed = list(inspect.signature(getattr(IndexedBinaryHeap, name)).parameters.values())
+        # The extra parameters are keyword-only
+        assert [p.kind for p in indexed[:len(base)]] == [p.kind for p in base]
+        assert all(p.kind == inspect.Parameter.KEYWORD_ONLY for p in indexed[len(base):])
+    with pytest.raises(ValueError):
+        IndexedBinaryHeap.load('heap.snap', True)
@@ -0,0 +1,31 @@
+import math
+import random
+
+from red_black_tree import RedBlackTree, stress_test
+
+
+def test_stress_test_keeps_invariants():
+    tree, checks = stress_test(n_ops=5000, key_range=500, n_checks=20, seed=0)
+    assert len(checks) == 20
+    tree.check_invariants()
+    for i, n, h in checks:
+        assert h <= 2 * math.log2(n) if n else h == 0
+
+
+def test_random_operations_against_a_set():
+    rng = random.Random(1)
+    tree = RedBlackTree()
+    keys = set()
+    for i in range(3000):
+        key = rng.randrange(300)
+        if rng.random() < 0.6:
+            tree.put(key)
+            keys.add(key)
+        else:
+            tree.delete(key)
+            keys.discard(key)
+        if i % 100 == 0:
+            tree.check_invariants()
+            assert list(tree.keys()) == sorted(keys)
+    tree.check_invariants()
+    assert len(tree) == len(keys)
@@ -0,0 +1,131 @@
+import os
+import random
+
+import pytest
+
+from binary_search_tree import BST
+from red_black_tree import RedBlackTree
+from priority_queue import BinaryHeap, IndexedBinaryHeap
+from heap_backends import DaryHeap
+
+
+def shape(n):
+    if n is None:
+        return None
+    return n.key, n.value, n.size, getattr(n, 'is_red', None), shape(n.left), shape(n.right)
+
+
+def make_keys(kind, n, rng):
+    if kind == 'int':
+        return [rng.randrange(1000) for _ in range(n)]
+    if kind == 'float':
+        return [rng.random() for _ in range(n)]
+    if kind == 'str':
+        return ['k\r\n{}é'.format(rng.randrange(1000)) for _ in range(n)]
+    return [str(rng.randrange(1000)).encode() for _ in range(n)]
+
+
+@pytest.mark.parametrize('cls', [BST, RedBlackTree])
+@pytest.mark.parametrize('kind', ['int', 'float', 'str', 'bytes'])
+@pytest.mark.parametrize('n', [0, 1, 200])
+def test_tree_round_trip(tmp_path, cls, kind, n):
+    rng = random.Random(n)
+    keys = make_keys(kind, n, rng)
+    tree = cls()
+    for key in keys:
+        tree.put(key, key)
+    path = os.path.join(tmp_path, 'tree.snap')
+    tree.save(path)
+    loaded = cls.load(path)
+    assert shape(loaded.root) == shape(tree.root)
+    if cls is RedBlackTree:
+        loaded.check_invariants()
+    replica = cls.load(path, mmap=True)
+    assert list(replica) == list(tree)
+    for key in keys[:20]:
+        assert replica.get(key) == tree.get(key)
+        assert replica[key] == tree[key]
+        assert replica.rank(key) == tree.rank(key)
+        assert replica.floor(key) == tree.floor(key)
+    assert replica.max() == tree.max()
+
+
+def test_tree_without_values_and_wrong_kind(tmp_path):
+    path = os.path.join(tmp_path, 'tree.snap')
+    tree = RedBlackTree.from_sorted(range(100))
+    tree.save(path)
+    with pytest.raises(ValueError):
+        BST.load(path)
+    assert list(RedBlackTree.load(path).items()) == [(key, None) for key in range(100)]
+
+
+def test_pickled_sections_need_allow_pickle(tmp_path):
+    path = os.path.join(tmp_path, 'tree.snap')
+    tree = BST()
+    for key in [(1, 'a'), (0, 'b'), (2, 'c')]:
+        tree.put(key, {'value': key})
+    tree.save(path)
+    with pytest.raises(ValueError, match='allow_pickle'):
+        BST.load(path)
+    loaded = BST.load(path, allow_pickle=True)
+    assert shape(loaded.root) == shape(tree.root)
+
+
+@pytest.mark.parametrize('cls, init', [(BinaryHeap, {}), (DaryHeap, {'d': 3})])
+def test_heap_round_trip(tmp_path, cls, init):
+    keys = [random.Random(0).random() for _ in range(300)]
+    heap = cls.from_iterable(keys, **init)
+    path = os.path.join(tmp_path, 'heap.snap')
+    heap.save(path)
+    loaded = cls.load(path)
+    assert loaded.heap == heap.heap
+    assert loaded.init_args() == heap.init_args()
+    assert cls.load(path, mmap=True).max() == heap.max()
+
+
+def test_indexed_heap_round_trip(tmp_path):
+    heap = IndexedBinaryHeap(min_heap=True, key=lambda priority: -priority)
+    heap.push_many(('task{}'.format(i), (i * 37) % 101) for i in range(100))
+    path = os.path.join(tmp_path, 'indexed.snap')
+    heap.save(path)
+    loaded = IndexedBinaryHeap.load(path, key=lambda priority: -priority)
+    assert loaded.heap == heap.heap
+    assert all(loaded.positions[handle] == i for i, handle in enumerate(loaded.heap) if i > 0)
+    loaded.change_key('task5', 1000)
+    heap.change_key('task5', 1000)
+    assert [loaded.delete_top() for _ in range(100)] == [heap.delete_top() for _ in range(100)]
+    # Without the key function the order is rebuilt for the plain priorities
+    plain = IndexedBinaryHeap.load(path)
+    assert plain.top()[1] == 0
+
+
+@pytest.mark.parametrize('values', [
+    [1, 2.5, -3, 0.0],
+    [1, None, 3, None],
+    [None, 0.5, 2, None],
+    ['a', None, 'é'],
+    [b'a', None, b''],
+    [None, None, None],
+])
+def test_mixed_and_missing_values_are_not_pickled(tmp_path, values):
+    tree = BST()
+    for key, value in enumerate(values):
+        tree.put(key, value)
+    # One value is needed for the values section to be written
+    values = values + [next((value for value in values if value is not None), 1)]
+    tree.put(len(values) - 1, values[-1])
+    path = os.path.join(tmp_path, 'tree.snap')
+    tree.save(path)
+    for mmap in (False, True):
+        loaded = BST.load(path, mmap=mmap)
+        assert list(loaded.values()) == values
+        assert [value is None for value in loaded.values()] == [value is None for value in values]
+
+
+def test_large_ints_mixed_with_floats_stay_exact(tmp_path):
+    tree = BST()
+    tree.put(0, 2**60 + 1)
+    tree.put(1, 0.5)
+    path = os.path.join(tmp_path, 'tree.snap')
+    tree.save(path)
+    assert list(BST.load(path, allow_pickle=True).values()) == [2**60 + 1, 0.5]
@@ -0,0 +1,60 @@
+import random
+
+import numpy as np
+import pytest
+
+from sorting import mergesort, quicksort, median_of_three_killer, INSERTION_SORT_CUTOFF
+
+SORTS = [mergesort, quicksort]
+
+
+def inputs(n):
+    rng = random.Random(n)
+    return [
+        [rng.random() for _ in range(n)],
+        list(range(n)),
+        list(range(n, 0, -1)),
+        [rng.randrange(4) for _ in range(n)],
+        list(range(n // 2)) + list(range(n // 2, 0, -1)),
+        median_of_three_killer(n - n % 4),
+    ]
+
+
+@pytest.mark.parametrize('sort', SORTS)
+@pytest.mark.parametrize('n', [0, 1, 2, INSERTION_SORT_CUTOFF, INSERTION_SORT_CUTOFF + 1, 1000, 4099])
+def test_sorts_like_sorted(sort, n):
+    for items in inputs(n):
+        expected = sorted(items)
+        assert sort(items) == expected
+        assert items == expected
+
+
+@pytest.mark.parametrize('sort', SORTS)
+def test_key(sort):
+    rng = random.Random(1)
+    items = [(rng.randrange(50), rng.random()) for _ in range(1000)]
+    assert sort(list(items), key=lambda item: -item[1]) == sorted(items, key=lambda item: -item[1])
+
+
+def test_mergesort_is_stable():
+    rng = random.Random(2)
+    items = [(rng.randrange(20), i) for i in range(2000)]
+    assert mergesort(list(items), key=lambda item: item[0]) == sorted(items, key=lambda item: item[0])
+
+
+@pytest.mark.parametrize('sort', SORTS)
+def test_numpy_arrays(sort):
+    array = np.random.default_rng(0).random(1000)
+    expected = np.sort(array)
+    assert np.array_equal(sort(array), expected)
+
+
+@pytest.mark.parametrize('n', [0, 4, 8, 100, 1000])
+def test_median_of_three_killer_is_a_permutation(n):
+    assert sorted(median_of_three_killer(n)) == list(range(1, n + 1))
+
+
+@pytest.mark.parametrize('n', [-4, 1, 2, 6, 10])
+def test_median_of_three_killer_rejects_other_sizes(n):
+    with pytest.raises(ValueError):
+        median_of_three_killer(n)
@@ -0,0 +1,68 @@
+import asyncio
+import heapq
+import random
+
+import pytest
+
+from top_k import TopK, top_k, bottom_k
+
+ITEMS = [random.Random(0).randrange(50) for _ in range(500)]
+
+
+@pytest.mark.parametrize('k', [0, 1, 10, 500, 600])
+def test_against_heapq(k):
+    assert top_k(ITEMS, k) == heapq.nlargest(k, ITEMS)
+    assert bottom_k(ITEMS, k) == heapq.nsmallest(k, ITEMS)
+
+
+@pytest.mark.parametrize('k', [0, 5, 1000])
+def test_key(k):
+    items = [(i, value) for i, value in enumerate(ITEMS)]
+    key = lambda item: item[1]
+    # Items with equal sort keys can be kept in any order, only the sort keys are compared
+    assert list(map(key, top_k(items, k, key=key))) == list(map(key, heapq.nlargest(k, items, key=key)))
+    assert list(map(key, bottom_k(items, k, key=key))) == list(map(key, heapq.nsmallest(k, items, key=key)))
+
+
+def test_threshold():
+    assert TopK(0).threshold() is None
+    assert TopK(0).push(1) is False
+    selector = TopK(3)
+    selector.push_many([5, 1])
+    assert selector.threshold() is None
+    selector.push_many([7, 3])
+    assert selector.threshold() == 3
+    assert not selector.push(2) and selector.push(4)
+    assert selector.results() == [7, 5, 4]
+
+
+@pytest.mark.parametrize('largest', [True, False])
+def test_merge(largest):
+    parts = [ITEMS[i:i + 100] for i in range(0, len(ITEMS), 100)]
+    selectors = [TopK(20, largest=largest).push_many(part) for part in parts]
+    expected = heapq.nlargest(20, ITEMS) if largest else heapq.nsmallest(20, ITEMS)
+    assert TopK.merged(selectors).results() == expected
+    assert TopK(20, largest=largest).merge(selectors[0]).results() == selectors[0].results()
+
+
+def test_merge_rejects_other_settings():
+    with pytest.raises(ValueError):
+        TopK(5).merge(TopK(5, largest=False))
+    with pytest.raises(ValueError):
+        TopK(5).merge(TopK(5, key=abs))
+    with pytest.raises(ValueError):
+        TopK.merged([])
+
+
+def test_push_many_async():
+    async def stream():
+        for item in ITEMS:
+            yield item
+
+    selector = asyncio.run(TopK(10).push_many_async(stream()))
+    assert selector.results() == heapq.nlargest(10, ITEMS)
+
+
+def test_negative_k():
+    with pytest.raises(ValueError):
+        TopK(-1)
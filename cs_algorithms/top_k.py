@@ -0,0 +1,173 @@
+from priority_queue import BinaryHeap
+
+
+class Entry(object):
+    """
+    Heap entry ordered on its sort key.
+    In a BinaryHeap the largest sort key ends up at the root.
+    """
+    __slots__ = ('sort_key', 'item')
+
+    def __init__(self, sort_key, item):
+        self.sort_key = sort_key
+        self.item = item
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+
+class ReversedEntry(Entry):
+    """
+    Heap entry ordered on the reverse of its sort key.
+    In a BinaryHeap the smallest sort key ends up at the root.
+    """
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return other.sort_key < self.sort_key
+
+
+class TopK(object):
+    """
+    Keep the k largest items (or the k smallest if largest is False) seen in a stream,
+    using a BinaryHeap that never holds more than k items.
+
+    The root of the heap is the worst item that is kept, so checking if a new item
+    should be admitted only needs a comparison with the root, and admitting it
+    replaces the root in O(log k).
+    Items are compared on key(item) if a key function is given.
+    """
+    def __init__(self, k, key=None, largest=True):
+        if k < 0:
+            raise ValueError('k should be >= 0, got {}'.format(k))
+        self.k = k
+        self.key = key
+        self.largest = largest
+        # For the k largest the smallest one needs to be at the root, and the other way around
+        self.entry_class = ReversedEntry if largest else Entry
+        self.heap = BinaryHeap()
+
+    def __len__(self):
+        return self.heap.size()
+
+    def threshold(self):
+        """
+        Return the sort key an item needs to beat to be admitted, None while less than k items are kept
+        (and always None for k = 0, where nothing is admitted).
+        """
+        if self.k == 0 or self.heap.size() < self.k:
+            return None
+        return self.heap.max().sort_key
+
+    def admits(self, sort_key):
+        """
+        Return true if and only if an item with the given sort key would be admitted.
+        """
+        if self.heap.size() < self.k:
+            return True
+        if self.k == 0:
+            return False
+        worst = self.heap.max().sort_key
+        return worst < sort_key if self.largest else sort_key < worst
+
+    def push(self, item):
+        """
+        Offer an item, return true if and only if it is kept.
+        """
+        sort_key = item if self.key is None else self.key(item)
+        if not self.admits(sort_key):
+            return False
+        entry = self.entry_class(sort_key, item)
+        if self.heap.size() < self.k:
+            self.heap.insert(entry)
+        else:
+            # Drop the worst item and add the new one in one sink
+            self.heap.replace(entry)
+        return True
+
+    def push_many(self, items):
+        """
+        Offer all items from the given iterable.
+        """
+        push = self.push
+        for item in items:
+            push(item)
+        return self
+
+    async def push_many_async(self, items):
+        """
+        Offer all items from the given async iterable.
+        """
+        push = self.push
+        async for item in items:
+            push(item)
+        return self
+
+    def merge(self, other):
+        """
+        Merge the items kept by another TopK (e.g. the partial result of another worker) into this one.
+        Raise a ValueError if the other TopK has a different key function or order.
+        """
+        if other.key != self.key or other.largest != self.largest:
+            raise ValueError('Can only merge a TopK with the same key and largest settings')
+        for entry in other.heap.heap[1:]:
+            if self.admits(entry.sort_key):
+                if self.heap.size() < self.k:
+                    self.heap.insert(self.entry_class(entry.sort_key, entry.item))
+                else:
+                    self.heap.replace(self.entry_class(entry.sort_key, entry.item))
+        return self
+
+    @classmethod
+    def merged(cls, parts):
+        """
+        Merge the partial results of several workers into a new TopK.
+        All parts should have the same k, key and largest settings.
+        """
+        parts = list(parts)
+        if not parts:
+            raise ValueError('Need at least one part to merge')
+        first = parts[0]
+        result = cls(first.k, key=first.key, largest=first.largest)
+        for part in parts:
+            result.merge(part)
+        return result
+
+    def results(self):
+        """
+        Return the kept items, best first. The TopK itself isn't changed.
+        """
+        entries = sorted(self.heap.heap[1:], key=lambda entry: entry.sort_key, reverse=self.largest)
+        return [entry.item for entry in entries]
+
+
+def top_k(items, k, key=None):
+    """
+    Return the k largest items from the given iterable, largest first.
+    """
+    return TopK(k, key=key).push_many(items).results()
+
+
+def bottom_k(items, k, key=None):
+    """
+    Return the k smallest items from the given iterable, smallest first.
+    """
+    return TopK(k, key=key, largest=False).push_many(items).results()
+
+
+if __name__ == '__main__':
+    # Benchmark: top 100 of a stream of 10^6 items, against sorting the whole stream
+    import heapq
+    import random
+    import time
+
+    n = 10**6
+    k = 100
+    stream = [random.random() for _ in range(n)]
+    for name, fn in [('TopK', lambda: top_k(stream, k)),
+                     ('heapq.nlargest', lambda: heapq.nlargest(k, stream)),
+                     ('sorted', lambda: sorted(stream, reverse=True)[:k])]:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        print('{:<16} {:>7.3f}s {:>14,.0f} items/s'.format(name, elapsed, n / elapsed))
@@ -0,0 +1,68 @@
+"""
+Benchmark preprocess() against the original column by column implementation on a synthetic housing frame.
+The original implementation is read from git (the first revision of preprocess.py, or --revision).
+
+Usage: python benchmark_preprocess.py [--rows 10000000] [--revision <commit>]
+"""
+import argparse
+import os
+import re
+import subprocess
+import time
+import types
+
+from preprocess import preprocess, preprocess_sparse
+from synthetic_data import make_housing_frame
+
+
+def original_source(revision=None):
+    """
+    Return the source of the original preprocess.py from git, at the given revision
+    (by default the commit that added preprocess.py).
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    if revision is None:
+        revision = subprocess.check_output(
+            ['git', 'log', '--diff-filter=A', '--format=%H', '-1', '--', 'preprocess.py'],
+            cwd=directory, text=True).strip()
+    return subprocess.check_output(['git', 'show', '{}:./preprocess.py'.format(revision)], cwd=directory, text=True)
+
+
+def load_original(revision=None):
+    """
+    Return the original preprocess() from git, with a fillna + replace pass per column and row-wise apply.
+    Its chained inplace fillna/replace calls (df[col].fillna(..., inplace=True)) don't change df
+    in pandas >= 3, so they are rewritten to assign the result instead.
+    """
+    source = re.sub(
+        r"(df\['\w+'\])\.(fillna|replace)\((.*?), inplace=True\)",
+        lambda m: '{0} = {0}.{1}({2}){3}'.format(
+            m.group(1), m.group(2), m.group(3), '.infer_objects()' if m.group(2) == 'replace' else ''),
+        original_source(revision), flags=re.DOTALL)
+    module = types.ModuleType('original_preprocess')
+    exec(compile(source, 'original_preprocess.py', 'exec'), module.__dict__)
+    return module.preprocess
+
+
+def rows_per_second(fn, df):
+    """
+    Run fn on a copy of df and return the rows per second.
+    """
+    df = df.copy()
+    start = time.perf_counter()
+    fn(df)
+    return len(df) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10**7, help='number of rows in the synthetic frame')
+    parser.add_argument('--revision', help='git revision of the original preprocess.py, the first one by default')
+    args = parser.parse_args()
+
+    df = make_housing_frame(args.rows)
+    print('rows: {:,}'.format(len(df)))
+    for name, fn in [('preprocess (table driven)', preprocess),
+                     ('preprocess_sparse (CSR)', preprocess_sparse),
+                     ('preprocess (original)', load_original(args.revision))]:
+        print('{:<34} {:>14,.0f} rows/s'.format(name, rows_per_second(fn, df)))
@@ -0,0 +1,172 @@
+"""
+Box-Cox transform of the independent variables, with parameters that are fitted once.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import stats
+
+
+def fit_lambda(values, shift):
+    """
+    Return the maximum likelihood estimate of the Box-Cox lambda of the shifted values.
+    """
+    values = values[~np.isnan(values)]
+    return float(stats.boxcox_normmax(values + shift, method='mle'))
+
+
+class BoxCoxTransformer(object):
+    """
+    Box-Cox transform of a set of numeric columns: y = ((x + shift)^lambda - 1) / lambda,
+    or log(x + shift) for a lambda of 0.
+
+    fit estimates the shift and lambda of every column, on multiple processes with n_workers,
+    and on a random subsample of max_samples rows if given (the shift always uses all rows).
+    transform and inverse_transform work on the whole (rows x columns) block at once, in place.
+    Values of new data below the minimum seen during fit can be transformed to NaN.
+    The fitted parameters can be saved as JSON, so they're never refitted for scoring.
+    """
+    def __init__(self, columns=None, max_samples=None, n_workers=1, seed=0):
+        # Columns to transform, all numeric columns of the DataFrame passed to fit if None
+        self.columns = None if columns is None else list(columns)
+        self.max_samples = max_samples
+        self.n_workers = n_workers
+        self.seed = seed
+        self.shifts = None
+        self.lambdas = None
+
+    def fit(self, df):
+        """
+        Estimate the shift and lambda of every column of the given DataFrame.
+        """
+        if self.columns is None:
+            self.columns = df.select_dtypes('number').columns.tolist()
+        block = df[self.columns].to_numpy(dtype=np.float64)
+        # Shift the values to make them all at least 1
+        shifts = 1 - np.minimum(np.nanmin(block, axis=0), 0)
+        if self.max_samples is not None and len(block) > self.max_samples:
+            rows = np.random.default_rng(self.seed).choice(len(block), self.max_samples, replace=False)
+            block = block[np.sort(rows)]
+        columns = [block[:, j] for j in range(block.shape[1])]
+        if self.n_workers > 1:
+            with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+                lambdas = list(pool.map(fit_lambda, columns, shifts))
+        else:
+            lambdas = [fit_lambda(values, shift) for values, shift in zip(columns, shifts)]
+        self.shifts = shifts
+        self.lambdas = np.array(lambdas)
+        return self
+
+    def transform(self, X):
+        """
+        Box-Cox transform the given columns.
+        A float array (with the columns in the order of self.columns) is transformed in place,
+        the columns of a DataFrame are replaced by their transform. X is returned.
+        """
+        return self.apply(X, self.transform_array)
+
+    def inverse_transform(self, X):
+        """
+        Undo transform, in place like transform.
+        """
+        return self.apply(X, self.inverse_transform_array)
+
+    def fit_transform(self, X):
+        return self.fit(X).transform(X)
+
+    def apply(self, X, fn):
+        if self.lambdas is None:
+            raise ValueError('BoxCoxTransformer needs to be fitted first')
+        if isinstance(X, np.ndarray):
+            fn(X)
+            return X
+        block = X[self.columns].to_numpy(dtype=np.float64, copy=True)
+        fn(block)
+        X[self.columns] = block
+        return X
+
+    def array_parameters(self):
+        """
+        Return the parameters as arrays that broadcast over the rows of a block:
+        shift, lambda (1 for log columns), 1 (0 for log columns), and the indices of the log columns.
+        """
+        is_log = self.lambdas == 0
+        return self.shifts, np.where(is_log, 1., self.lambdas), np.where(is_log, 0., 1.), np.flatnonzero(is_log)
+
+    def transform_array(self, X):
+        shift, lmbda, one, log_columns = self.array_parameters()
+        X += shift
+        # x^1 leaves the log columns unchanged for now
+        np.power(X, lmbda, out=X)
+        for j in log_columns:
+            np.log(X[:, j], out=X[:, j])
+        X -= one
+        X /= lmbda
+
+    def inverse_transform_array(self, X):
+        shift, lmbda, one, log_columns = self.array_parameters()
+        X *= lmbda
+        X += one
+        for j in log_columns:
+            np.exp(X[:, j], out=X[:, j])
+        np.power(X, 1 / lmbda, out=X)
+        X -= shift
+
+    def to_dict(self):
+        return {
+            'columns': self.columns,
+            'shifts': self.shifts.tolist(),
+            'lambdas': self.lambdas.tolist()}
+
+    @classmethod
+    def from_dict(cls, d):
+        transformer = cls(d['columns'])
+        transformer.shifts = np.array(d['shifts'], dtype=np.float64)
+        transformer.lambdas = np.array(d['lambdas'], dtype=np.float64)
+        return transformer
+
+    def save(self, path):
+        """
+        Save the fitted parameters as JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a transformer that was saved with save.
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+if __name__ == '__main__':
+    # Benchmark: fit on all rows, on multiple processes, and on a subsample, and the transform throughput.
+    from synthetic_data import make_housing_frame, NUMERIC_COLUMNS
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10**6, help='number of rows in the synthetic frame')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    df = make_housing_frame(args.rows)
+    columns = list(NUMERIC_COLUMNS)
+    print('rows: {:,}, columns: {}'.format(len(df), len(columns)))
+    for name, transformer in [
+            ('fit', BoxCoxTransformer(columns)),
+            ('fit {} workers'.format(args.workers), BoxCoxTransformer(columns, n_workers=args.workers)),
+            ('fit 100k subsample', BoxCoxTransformer(columns, max_samples=100000))]:
+        start = time.perf_counter()
+        transformer.fit(df)
+        print('{:<22} {:>8.2f}s'.format(name, time.perf_counter() - start))
+    block = df[columns].to_numpy(dtype=np.float64)
+    original = block.copy()
+    start = time.perf_counter()
+    transformer.transform(block)
+    print('{:<22} {:>14,.0f} rows/s'.format('transform', len(block) / (time.perf_counter() - start)))
+    transformer.inverse_transform(block)
+    assert np.allclose(block, original, equal_nan=True)
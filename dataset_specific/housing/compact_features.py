@@ -0,0 +1,141 @@
+"""
+Compact dtypes for preprocessed feature frames.
+
+preprocess() returns int64 ordinal codes and flags, bool dummies and float64 continuous features.
+compact_frame converts every column to the smallest dtype that holds its values:
+integer valued columns to the smallest integer type (e.g. int8 for ordinal codes),
+dummies stay bool, and other floats become float32 (this one loses precision).
+By default the dtypes are chosen from the values of the frame, so two batches can get different dtypes.
+Pass the dtypes fitted by HousingPreprocessor.feature_dtypes to give every batch the same ones.
+pack_dummies packs the bool dummies to bits, 8 per byte.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+
+INTEGER_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def smallest_int_dtype(values):
+    """
+    Return the smallest integer dtype that can hold all the (integer) values.
+    """
+    if len(values) == 0:
+        return np.int8
+    low, high = values.min(), values.max()
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+def compact_column(values, float_dtype=np.float32):
+    """
+    Return the values of a column (numpy array) in the smallest dtype that holds them.
+    """
+    if values.dtype == np.bool_:
+        return values
+    if np.issubdtype(values.dtype, np.integer):
+        return values.astype(smallest_int_dtype(values), copy=False)
+    if np.issubdtype(values.dtype, np.floating):
+        finite = np.isfinite(values).all()
+        # Integer values stored as floats (e.g. after filling in NaNs)
+        if finite and np.array_equal(values, np.round(values)) and np.abs(values).max(initial=0) < 2**53:
+            return values.astype(smallest_int_dtype(values))
+        return values.astype(float_dtype, copy=False)
+    return values
+
+
+def cast_column(values, dtype, name=None):
+    """
+    Return the values of a column (numpy array) in the given dtype.
+    Raise a ValueError if the dtype is an integer type that can't hold all the values.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'i' and values.dtype != np.bool_ and len(values) > 0:
+        info = np.iinfo(dtype)
+        # NaN is not equal to itself, so it is caught by the first check
+        if ((values.dtype.kind == 'f' and not np.array_equal(values, np.round(values)))
+                or values.min() < info.min or values.max() > info.max):
+            raise ValueError("Column {} has values that don't fit in {}".format(name, dtype))
+    return values.astype(dtype, copy=False)
+
+
+def compact_frame(df, float_dtype=np.float32, dtypes=None):
+    """
+    Return a copy of the DataFrame with every column in the smallest dtype that holds its values.
+    dtypes (column -> dtype, e.g. from HousingPreprocessor.feature_dtypes) fixes the dtype of
+    the columns in it, the others get the smallest dtype of their values in this frame.
+    """
+    if dtypes is None:
+        dtypes = {}
+    return pd.DataFrame(
+        {col: cast_column(df[col].to_numpy(), dtypes[col], col) if col in dtypes
+         else compact_column(df[col].to_numpy(), float_dtype) for col in df.columns},
+        index=df.index, copy=False)
+
+
+def compaction_report(before, after):
+    """
+    Return the memory use of a frame before and after compaction as a dictionary.
+    """
+    bytes_before = int(before.memory_usage(index=False).sum())
+    bytes_after = int(after.memory_usage(index=False).sum())
+    dtypes = after.dtypes.astype(str).value_counts().to_dict()
+    return {
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'bytes_saved': bytes_before - bytes_after,
+        'ratio': bytes_before / max(bytes_after, 1),
+        'dtypes': dtypes,
+    }
+
+
+def pack_dummies(df):
+    """
+    Pack the bool columns of a frame into bits.
+    Return the packed (rows x ceil(dummies / 8)) uint8 array, the names of the packed columns,
+    and the frame of the other columns.
+    """
+    dummies = [col for col, dtype in df.dtypes.items() if dtype == np.bool_]
+    packed = np.packbits(df[dummies].to_numpy(dtype=np.bool_), axis=1)
+    return packed, dummies, df.drop(columns=dummies)
+
+
+def unpack_dummies(packed, dummies, index=None):
+    """
+    Return the frame of bool dummies from the result of pack_dummies.
+    """
+    values = np.unpackbits(packed, axis=1, count=len(dummies)).astype(np.bool_)
+    return pd.DataFrame(values, columns=dummies, index=index)
+
+
+if __name__ == '__main__':
+    # Benchmark: memory saved by compaction and bit packing, and their throughput
+    from preprocess import preprocess
+    from synthetic_data import make_housing_frame
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10**6, help='number of rows in the synthetic frame')
+    args = parser.parse_args()
+
+    features = preprocess(make_housing_frame(args.rows))
+    start = time.perf_counter()
+    compact = compact_frame(features)
+    compact_time = time.perf_counter() - start
+    report = compaction_report(features, compact)
+    print('rows: {:,}, columns: {}'.format(len(features), features.shape[1]))
+    print('compact_frame: {:,.0f} rows/s, {:,.0f} MB -> {:,.0f} MB ({:.1f}x), dtypes {}'.format(
+        len(features) / compact_time, report['bytes_before'] / 2**20, report['bytes_after'] / 2**20,
+        report['ratio'], report['dtypes']))
+    start = time.perf_counter()
+    packed, dummies, rest = pack_dummies(compact)
+    pack_time = time.perf_counter() - start
+    packed_bytes = packed.nbytes + rest.memory_usage(index=False).sum()
+    print('pack_dummies:  {:,.0f} rows/s, {} dummies, {:,.0f} MB ({:.1f}x)'.format(
+        len(features) / pack_time, len(dummies), packed_bytes / 2**20, report['bytes_before'] / packed_bytes))
+    assert unpack_dummies(packed, dummies, compact.index).equals(compact[dummies])
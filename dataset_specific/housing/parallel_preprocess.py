@@ -0,0 +1,105 @@
+"""
+Preprocess the housing data on multiple cores.
+
+Once a HousingPreprocessor is fitted the rows can be encoded independently, so the frame is
+split into shards of rows that are encoded by a pool of worker processes.
+The workers write their rows straight into one feature matrix in shared memory, instead of
+sending pickled results back. With the fork start method the workers also get the input frame
+without pickling. The columns are the feature_names of the preprocessor, and every shard is
+written at its own rows, so the result doesn't depend on the number of workers.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from preprocess import HousingPreprocessor
+
+
+# State of a worker process, set by init_worker
+worker = {}
+
+
+def init_worker(schema, df, shm_name, shape, dtype):
+    """
+    Initialize a worker process with the preprocessor, the input, and the shared output matrix.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    worker['shm'] = shm
+    worker['out'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    worker['df'] = df
+    worker['preprocessor'] = HousingPreprocessor.from_dict(schema)
+
+
+def transform_shard(start, stop):
+    """
+    Encode the rows start:stop of the input into the same rows of the output.
+    """
+    worker['out'][start:stop] = worker['preprocessor'].transform(worker['df'].iloc[start:stop])
+    return stop - start
+
+
+def shard_bounds(n_rows, n_shards):
+    """
+    Return the (start, stop) rows of n_shards shards of (almost) equal size.
+    """
+    bounds = np.linspace(0, n_rows, n_shards + 1).astype(int)
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def parallel_transform(preprocessor, df, n_workers=None, shards_per_worker=4):
+    """
+    Encode the given DataFrame with a fitted HousingPreprocessor on n_workers processes
+    (all cores by default). Return the same matrix as preprocessor.transform(df).
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    n_rows = len(df)
+    shape = (n_rows, len(preprocessor.feature_names))
+    dtype = np.dtype(preprocessor.dtype)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, n_rows * shape[1] * dtype.itemsize))
+    try:
+        # Fork (where available) so the workers share the input frame instead of unpickling a copy
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(
+                max_workers=n_workers, mp_context=multiprocessing.get_context(method),
+                initializer=init_worker,
+                initargs=(preprocessor.to_dict(), df, shm.name, shape, dtype)) as pool:
+            bounds = shard_bounds(n_rows, n_workers * shards_per_worker)
+            n_done = sum(pool.map(transform_shard, *zip(*bounds))) if bounds else 0
+        assert n_done == n_rows
+        # Copy the result out of shared memory, so the shared block can be freed
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+if __name__ == '__main__':
+    # Benchmark: rows/s of the parallel driver with 1 up to 8 workers, against transform in this process
+    from synthetic_data import make_housing_frame
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10**6, help='number of rows in the synthetic frame')
+    parser.add_argument('--max-workers', type=int, default=8)
+    args = parser.parse_args()
+
+    df = make_housing_frame(args.rows)
+    preprocessor = HousingPreprocessor().fit(df)
+    print('rows: {:,}, features: {}, cores: {}'.format(len(df), len(preprocessor.feature_names), os.cpu_count()))
+    start = time.perf_counter()
+    expected = preprocessor.transform(df)
+    serial = len(df) / (time.perf_counter() - start)
+    print('{:<12} {:>14,.0f} rows/s'.format('serial', serial))
+    n_workers = 1
+    while n_workers <= args.max_workers:
+        start = time.perf_counter()
+        X = parallel_transform(preprocessor, df, n_workers)
+        rate = len(df) / (time.perf_counter() - start)
+        assert np.array_equal(X, expected)
+        print('{:<12} {:>14,.0f} rows/s {:>6.2f}x'.format('{} workers'.format(n_workers), rate, rate / serial))
+        n_workers *= 2
@@ -1,194 +1,632 @@
-import math
-import pandas as pd
-
-
-def combine_categories(df, col1, col2, name):
-    """Combine categories if a row can have multiple categories of a certain type."""
-    # Find unique categories
-    uniques = set(pd.unique(df[col1])) | set(pd.unique(df[col2]))
-    # Merge different columns
-    all_dummies = pd.get_dummies(df[[col1, col2]], dummy_na=True)
-    for condition in uniques:
-        if type(condition) == float and math.isnan(condition):
-            continue
-        c1 = col1 + '_' + condition
-        c2 = col2 + '_' + condition
-        c_combined = name + condition
-        if c1 in all_dummies and c2 in all_dummies:
-            df[c_combined] = all_dummies[c1] | all_dummies[c2]
-        elif c1 in all_dummies:
-            df[c_combined] = all_dummies[c1]
-        elif c2 in all_dummies:
-            df[c_combined] = all_dummies[c2]
-    del df[col1]
-    del df[col2]
-
-
-def preprocess(df, columns_needed=None):
-    if columns_needed is None:
-        columns_needed = []
-    
-    ### MSSubClass is integer but should be categorical (integer values don't have meaning)
-    df['MSSubClass'] = df['MSSubClass'].astype('int').astype('category')
-
-    # Alley has NaN variable that actually have meaning
-    df['Alley'].fillna('NoAlley', inplace=True)
-    assert df['Alley'].notnull().all()
-
-    # LotShape is an ordinal variable
-    assert df['LotShape'].notnull().all()
-    df['LotShape'].replace({'Reg': 0, 'IR1': 1, 'IR2': 2, 'IR3': 3}, inplace=True)
-
-    # Utilities is complex categorical
-    df['Utilities_Electricity'] = df['Utilities'].apply(
-        lambda x: 1 if x in ['ELO', 'NoSeWa', 'NoSewr', 'AllPub'] else 0)
-    df['Utilities_Gas'] = df['Utilities'].apply(
-        lambda x: 1 if x in ['NoSeWa', 'NoSewr', 'AllPub'] else 0)
-    df['Utilities_Water'] = df['Utilities'].apply(
-        lambda x: 1 if x in ['NoSewr', 'AllPub'] else 0)
-    df['Utilities_SepticTank'] = df['Utilities'].apply(
-        lambda x: 1 if x in ['AllPub'] else 0)
-    del df['Utilities']
-
-    # LandSlope is ordinal
-    assert df['LandSlope'].notnull().all()
-    df['LandSlope'].replace({'Gtl': 0, 'Mod': 1, 'Sev': 2}, inplace=True)
-
-    # Neighborhood is a categorical
-    assert df['Neighborhood'].notnull().all()
-    df['Neighborhood'] = df['Neighborhood'].astype('category')
-
-    # Condition1 and Condition2 are similar  categoricals
-    combine_categories(df, 'Condition1', 'Condition2', 'Condition')
-
-    # Exterior1st and Exterior2nd are similar categoricals
-    combine_categories(df, 'Exterior1st', 'Exterior2nd', 'Exterior')
-
-    # ExterQual is an ordinal variable
-    df['ExterQual'].fillna(-1, inplace=True)
-    assert df['ExterQual'].notnull().all()
-    df['ExterQual'].replace({'Po': 0, 'Fa': 1, 'TA': 2, 'Gd': 3, 'Ex': 4}, inplace=True)
-
-    # ExterCond is an ordinal variable
-    df['ExterCond'].fillna(-1, inplace=True)
-    assert df['ExterCond'].notnull().all()
-    df['ExterCond'].replace({'Po': 0, 'Fa': 1, 'TA': 2, 'Gd': 3, 'Ex': 4}, inplace=True)
-
-    # BsmtQual is an ordinal variable
-    df['BsmtQual'].fillna('NA', inplace=True)
-    assert df['BsmtQual'].notnull().all()
-    df['BsmtQual'].replace({'NA':0 , 'Po': 1, 'Fa': 2, 'TA': 3, 'Gd': 4, 'Ex': 5}, inplace=True)
-
-    # BsmtCond is an ordinal variable
-    df['BsmtCond'].fillna('NA', inplace=True)
-    assert df['BsmtCond'].notnull().all()
-    df['BsmtCond'].replace({'NA':0 , 'Po': 1, 'Fa': 2, 'TA': 3, 'Gd': 4, 'Ex': 5}, inplace=True)
-
-    # BsmtExposure is an ordinal variable
-    df['BsmtExposure'].fillna('NA', inplace=True)
-    assert df['BsmtExposure'].notnull().all()
-    df['BsmtExposure'].replace({'NA':0 , 'No': 1, 'Mn': 2, 'Av': 3, 'Gd': 4}, inplace=True)
-
-    # BsmtFinType1 is an ordinal variable
-    df['BsmtFinType1'].fillna('NA', inplace=True)
-    assert df['BsmtFinType1'].notnull().all()
-    df['BsmtFinType1'].replace({'NA':0 , 'Unf': 1, 'LwQ': 2, 'Rec': 3, 'BLQ': 4, 'ALQ': 5, 'GLQ':6}, inplace=True)
-
-    # BsmtFinType2 is an ordinal variable
-    df['BsmtFinType2'].fillna('NA', inplace=True)
-    assert df['BsmtFinType2'].notnull().all()
-    df['BsmtFinType2'].replace({'NA':0 , 'Unf': 1, 'LwQ': 2, 'Rec': 3, 'BLQ': 4, 'ALQ': 5, 'GLQ':6}, inplace=True)
-
-    # HeatingQC is an ordinal variable
-    df['HeatingQC'].fillna(-1, inplace=True)
-    assert df['HeatingQC'].notnull().all()
-    df['HeatingQC'].replace({'Po': 0, 'Fa': 1, 'TA': 2, 'Gd': 3, 'Ex': 4}, inplace=True)
+import json
 
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from compact_features import compact_frame, smallest_int_dtype
+
+
+# Quality scale used by most ordinal variables
+QUALITY = ['Po', 'Fa', 'TA', 'Gd', 'Ex']
+
+# Ordinal and binary variables: column -> (levels, code for missing values).
+# The level at position i is encoded as i.
+# Missing values (and values that are not one of the levels) are encoded as the missing code,
+# a missing code of None means that the column can't have missing values.
+# For most columns NaN actually has a meaning (e.g. no basement), that is encoded as 'NA' = 0.
+ORDINAL_COLUMNS = {
+    'LotShape': (['Reg', 'IR1', 'IR2', 'IR3'], None),
+    'LandSlope': (['Gtl', 'Mod', 'Sev'], None),
+    'ExterQual': (QUALITY, -1),
+    'ExterCond': (QUALITY, -1),
+    'BsmtQual': (['NA'] + QUALITY, 0),
+    'BsmtCond': (['NA'] + QUALITY, 0),
+    'BsmtExposure': (['NA', 'No', 'Mn', 'Av', 'Gd'], 0),
+    'BsmtFinType1': (['NA', 'Unf', 'LwQ', 'Rec', 'BLQ', 'ALQ', 'GLQ'], 0),
+    'BsmtFinType2': (['NA', 'Unf', 'LwQ', 'Rec', 'BLQ', 'ALQ', 'GLQ'], 0),
+    'HeatingQC': (QUALITY, -1),
     # CentralAir is a binary variable
-    df['CentralAir'].fillna(-1, inplace=True)
-    assert df['CentralAir'].notnull().all()
-    df['CentralAir'].replace({'N': 0, 'Y': 1}, inplace=True)
-
-    # KitchenQual is an ordinal variable
-    df['KitchenQual'].fillna(-1, inplace=True)
-    assert df['KitchenQual'].notnull().all()
-    df['KitchenQual'].replace({'Po': 0, 'Fa': 1, 'TA': 2, 'Gd': 3, 'Ex': 4}, inplace=True)
-
-    # Functional is an ordinal variable
-    df['Functional'].fillna(-1, inplace=True)
-    assert df['Functional'].notnull().all()
-    df['Functional'].replace(
-        {'Sal': 0, 'Sev': 1, 'Maj2': 2, 'Maj1': 3, 'Mod': 4, 'Min2': 5, 'Min1': 6, 'Typ': 7}, inplace=True)
-
-    # FireplaceQu is an ordinal variable
-    df['FireplaceQu'].fillna('NA', inplace=True)
-    assert df['FireplaceQu'].notnull().all()
-    df['FireplaceQu'].replace({'NA':0 , 'Po': 1, 'Fa': 2, 'TA': 3, 'Gd': 4, 'Ex': 5}, inplace=True)
-
-    # GarageFinish is an ordinal variable
-    df['GarageFinish'].fillna('NA', inplace=True)
-    assert df['GarageFinish'].notnull().all()
-    df['GarageFinish'].replace({'NA': 0, 'Unf': 1, 'RFn': 2, 'Fin': 3}, inplace=True)
-
-    # FireplaceQu is an ordinal variable
-    df['GarageQual'].fillna('NA', inplace=True)
-    assert df['GarageQual'].notnull().all()
-    df['GarageQual'].replace({'NA':0 , 'Po': 1, 'Fa': 2, 'TA': 3, 'Gd': 4, 'Ex': 5}, inplace=True)
-
-    # GarageCond is an ordinal variable
-    df['GarageCond'].fillna('NA', inplace=True)
-    assert df['GarageCond'].notnull().all()
-    df['GarageCond'].replace({'NA':0 , 'Po': 1, 'Fa': 2, 'TA': 3, 'Gd': 4, 'Ex': 5}, inplace=True)
-
-    # CentralAir is an ordinal variable
-    df['PavedDrive'].fillna(-1, inplace=True)
-    assert df['PavedDrive'].notnull().all()
-    df['PavedDrive'].replace({'N': 0, 'P': 1, 'Y': 2}, inplace=True)
-
-    # PoolQC is an ordinal variable
-    df['PoolQC'].fillna('NA', inplace=True)
-    assert df['PoolQC'].notnull().all()
-    df['PoolQC'].replace({'NA':0 , 'Fa': 1, 'TA': 2, 'Gd': 3, 'Ex': 4}, inplace=True)
-
-    # Fence is an ordinal variable
-    df['Fence'].fillna('NA', inplace=True)
-    assert df['Fence'].notnull().all()
-    df['Fence'].replace({'NA': 0, 'MnWw': 1, 'GdWo': 2, 'MnPrv': 3, 'GdPrv': 4}, inplace=True)
-
-    # Combine YrSold and MoSold into more or less continous variable
-    df['YrSold'] = df['YrSold'] + (df['MoSold'] - 1) / 12.
-    # Still convert MoSold to categorical to keep seasonality effect
-    # (note: to fully do this it should be encoded into a circular 2D variable)
-    df['MoSold'] = df['MoSold'].astype('int').astype('category')
-
+    'CentralAir': (['N', 'Y'], -1),
+    'KitchenQual': (QUALITY, -1),
+    'Functional': (['Sal', 'Sev', 'Maj2', 'Maj1', 'Mod', 'Min2', 'Min1', 'Typ'], -1),
+    'FireplaceQu': (['NA'] + QUALITY, 0),
+    'GarageFinish': (['NA', 'Unf', 'RFn', 'Fin'], 0),
+    'GarageQual': (['NA'] + QUALITY, 0),
+    'GarageCond': (['NA'] + QUALITY, 0),
+    'PavedDrive': (['N', 'P', 'Y'], -1),
+    'PoolQC': (['NA', 'Fa', 'TA', 'Gd', 'Ex'], 0),
+    'Fence': (['NA', 'MnWw', 'GdWo', 'MnPrv', 'GdPrv'], 0),
+}
+
+# Utilities is complex categorical, each level includes the utilities of the levels before it.
+UTILITIES_LEVELS = ['ELO', 'NoSeWa', 'NoSewr', 'AllPub']
+# Binary column -> lowest Utilities level that has this utility
+UTILITIES_FLAGS = {
+    'Utilities_Electricity': 'ELO',
+    'Utilities_Gas': 'NoSeWa',
+    'Utilities_Water': 'NoSewr',
+    'Utilities_SepticTank': 'AllPub',
+}
+
+# Similar categoricals where a row can have multiple categories: (column 1, column 2, name of combined dummies)
+COMBINED_CATEGORIES = [
+    ('Condition1', 'Condition2', 'Condition'),
+    ('Exterior1st', 'Exterior2nd', 'Exterior'),
+]
+
+# Integer variables where the values don't have a meaning (they become dummies)
+INTEGER_CATEGORICAL_COLUMNS = ['MSSubClass', 'MoSold']
+
+# Missing values that actually have meaning: column -> value to fill in
+FILL_VALUES = {
+    'Alley': 'NoAlley',
     # Assume that LotFrontage==NaN means there is no street connected directly
-    df['LotFrontage'].fillna(0, inplace=True)
-
+    'LotFrontage': 0,
     # No veneer area when veneer is not present
-    df['MasVnrArea'].fillna(0, inplace=True)
-
+    'MasVnrArea': 0,
     # No Garage means no year build
-    df['GarageYrBlt'].fillna(0, inplace=True)
-
+    'GarageYrBlt': 0,
     # No Basement
-    df['BsmtFinSF1'].fillna(0, inplace=True)
-    df['BsmtFinSF2'].fillna(0, inplace=True)
-    df['BsmtUnfSF'].fillna(0, inplace=True)
-    df['TotalBsmtSF'].fillna(0, inplace=True)
-    df['BsmtFullBath'].fillna(0, inplace=True)
-    df['BsmtHalfBath'].fillna(0, inplace=True)
+    'BsmtFinSF1': 0,
+    'BsmtFinSF2': 0,
+    'BsmtUnfSF': 0,
+    'TotalBsmtSF': 0,
+    'BsmtFullBath': 0,
+    'BsmtHalfBath': 0,
     # No Garage
-    df['GarageCars'].fillna(0, inplace=True)
-    df['GarageArea'].fillna(0, inplace=True)
+    'GarageCars': 0,
+    'GarageArea': 0,
+}
+
+
+def ordinal_codes(values, levels, missing_code):
+    """
+    Encode the values as the index of each value in levels, with missing_code for missing
+    and unknown values.
+    """
+    # Categorical codes are -1 for values that aren't one of the levels
+    codes = pd.Categorical(values, categories=levels).codes
+    result = codes.astype(np.int64)
+    unknown = codes == -1
+    if missing_code is None:
+        assert not unknown.any(), '{} has missing or unknown values'.format(values.name)
+    else:
+        result[unknown] = missing_code
+    return result
+
+
+def year_sold(yr_sold, mo_sold):
+    """
+    Combine YrSold and MoSold into more or less continous variable.
+    (MoSold itself is kept as categorical to keep seasonality effect,
+    note: to fully do this it should be encoded into a circular 2D variable)
+    """
+    return yr_sold + (mo_sold - 1) / 12.
+
+
+def utilities_flags(values, levels=UTILITIES_LEVELS, flags=UTILITIES_FLAGS):
+    """
+    Return the binary Utilities_* columns as a dictionary of arrays.
+    """
+    codes = pd.Categorical(values, categories=levels).codes
+    return {
+        col: (codes >= levels.index(lowest_level)).astype(np.int64)
+        for col, lowest_level in flags.items()}
+
+
+def combined_dummies(values1, values2, name):
+    """
+    Return the dummies of the combined categories of two columns as a dictionary of boolean arrays,
+    named name + category. A dummy is true if either of both columns has that category.
+    """
+    categories = sorted(set(pd.unique(values1)) | set(pd.unique(values2)), key=str)
+    categories = [c for c in categories if not pd.isna(c)]
+    codes1 = pd.Categorical(values1, categories=categories).codes
+    codes2 = pd.Categorical(values2, categories=categories).codes
+    return {
+        name + category: (codes1 == i) | (codes2 == i)
+        for i, category in enumerate(categories)}
+
+
+def combined_dummies_sparse(values1, values2, name, categories=None):
+    """
+    Return the dummies of the combined categories of two columns as a sparse CSR matrix,
+    and the names of its columns. Built from the category codes, without dense dummies.
+    Values that are not in categories (by default all values in both columns) get no dummy.
+    """
+    if categories is None:
+        categories = sorted(set(pd.unique(values1)) | set(pd.unique(values2)), key=str)
+        categories = [c for c in categories if not pd.isna(c)]
+    codes1 = category_codes(values1, categories)
+    codes2 = category_codes(values2, categories)
+    rows = np.arange(len(codes1))
+    # A category in both columns is only counted once
+    keep1 = codes1 >= 0
+    keep2 = (codes2 >= 0) & (codes2 != codes1)
+    matrix = sparse.csr_matrix(
+        (np.ones(keep1.sum() + keep2.sum(), dtype=np.int8),
+         (np.concatenate([rows[keep1], rows[keep2]]), np.concatenate([codes1[keep1], codes2[keep2]]))),
+        shape=(len(codes1), len(categories)))
+    return matrix, [name + str(category) for category in categories]
+
+
+def combine_categories(df, col1, col2, name, sparse=False):
+    """
+    Combine categories if a row can have multiple categories of a certain type.
+    With sparse the dummies are added as pandas sparse columns (only the ones are stored).
+    """
+    if sparse:
+        matrix, columns = combined_dummies_sparse(df[col1], df[col2], name)
+        dummies = pd.DataFrame.sparse.from_spmatrix(matrix.astype(bool), index=df.index, columns=columns)
+        for col in columns:
+            df[col] = dummies[col]
+    else:
+        for col, dummy in combined_dummies(df[col1], df[col2], name).items():
+            df[col] = dummy
+    del df[col1]
+    del df[col2]
 
-    df = pd.get_dummies(df, dummy_na=True)
 
-    missing_columns = set(columns_needed) - set(df.columns)
+def column_kind(col, values):
+    """
+    Return how the given column is preprocessed:
+     * 'ordinal': encoded with ORDINAL_COLUMNS
+     * 'derived': replaced by derived columns (Utilities_* flags or combined category dummies)
+     * 'integer_categorical': integer column that becomes dummies
+     * 'year_sold': combined with MoSold into a continuous year
+     * 'numeric': kept as is (after filling in FILL_VALUES)
+     * 'categorical': becomes dummies (after filling in FILL_VALUES)
+    """
+    if col in ORDINAL_COLUMNS:
+        return 'ordinal'
+    if col == 'Utilities' or any(col in (col1, col2) for col1, col2, _ in COMBINED_CATEGORIES):
+        return 'derived'
+    if col in INTEGER_CATEGORICAL_COLUMNS:
+        return 'integer_categorical'
+    if col == 'YrSold':
+        return 'year_sold'
+    if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+        return 'numeric'
+    return 'categorical'
+
+
+def preprocess(df, columns_needed=None, compact=False):
+    """
+    Preprocess the housing data: encode ordinal variables, fill in missing values that have a meaning,
+    and create dummies for the categorical variables.
+
+    All transformations are described by the tables above and are applied column-wise
+    in one pass; the result is assembled once. The given DataFrame isn't modified.
+    Columns from columns_needed that are not in the result are added as all zeros.
+    With compact every column gets the smallest dtype that holds it (see compact_features.py),
+    chosen from the values of df: use HousingPreprocessor.transform_frame with compact to get
+    the same dtypes for every batch.
+    """
+    if columns_needed is None:
+        columns_needed = []
+
+    # Columns that are kept as is, or encoded to numbers
+    numeric = {}
+    # Columns that will be turned into dummies
+    categorical = {}
+    for col in df.columns:
+        values = df[col]
+        if col in FILL_VALUES:
+            values = values.fillna(FILL_VALUES[col])
+        kind = column_kind(col, values)
+        if kind == 'ordinal':
+            numeric[col] = ordinal_codes(values, *ORDINAL_COLUMNS[col])
+        elif kind == 'integer_categorical':
+            categorical[col] = values.astype('int').astype('category')
+        elif kind == 'year_sold':
+            numeric[col] = year_sold(values, df['MoSold'])
+        elif kind == 'numeric':
+            numeric[col] = values
+        elif kind == 'categorical':
+            categorical[col] = values
+        # Derived columns are added below
+    if 'Utilities' in df:
+        numeric.update(utilities_flags(df['Utilities']))
+    for col1, col2, name in COMBINED_CATEGORIES:
+        if col1 in df and col2 in df:
+            numeric.update(combined_dummies(df[col1], df[col2], name))
+
+    parts = [pd.DataFrame(numeric, index=df.index)]
+    if categorical:
+        parts.append(pd.get_dummies(pd.DataFrame(categorical, index=df.index), dummy_na=True))
+    df = pd.concat(parts, axis=1)
+
+    missing_columns = [col for col in columns_needed if col not in df.columns]
     if missing_columns:
         print('Columns {} are missing, adding them.'.format(missing_columns))
-    for col in missing_columns:
-        df[col] = 0
+        df = pd.concat([df, pd.DataFrame(0, index=df.index, columns=missing_columns)], axis=1)
 
     assert df.notnull().all().all(), 'Nan s in {}'.format(
         df.columns[df.isnull().any()].tolist())
+    if compact:
+        df = compact_frame(df)
     return df
+
+
+def preprocess_sparse(df, columns_needed=None):
+    """
+    Same as preprocess, but return a sparse CSR matrix and the list of its column names.
+    The dummies are created from the category codes, so the dense dummies are never created.
+    """
+    preprocessor = HousingPreprocessor(exclude=()).fit(df)
+    X = preprocessor.transform_sparse(df)
+    columns = list(preprocessor.feature_names)
+    missing_columns = [col for col in (columns_needed or []) if col not in columns]
+    if missing_columns:
+        print('Columns {} are missing, adding them.'.format(missing_columns))
+        # Empty columns at the end
+        X.resize((X.shape[0], X.shape[1] + len(missing_columns)))
+        columns.extend(missing_columns)
+    return X, columns
+
+
+class HousingPreprocessor(object):
+    """
+    Preprocessing of the housing data with the same transformations as preprocess(),
+    split in fit and transform so that every batch is encoded to the same features.
+
+    fit learns the list of steps from the training data: which columns are used, how each
+    is encoded, and the categories of every categorical column.
+    transform encodes a DataFrame into a numeric matrix with a fixed column order
+    (feature_names), allocated once. Categories that were not seen during fit get no dummy,
+    columns that were not seen during fit are ignored, and missing columns are all zeros.
+
+    The fitted preprocessor (including the encoding tables it used) can be saved as JSON
+    and loaded again, so scoring never depends on the data that is scored.
+    """
+    def __init__(self, exclude=('Id', 'SalePrice'), dtype='float64'):
+        # Columns that are not features (e.g. id and target)
+        self.exclude = list(exclude)
+        self.dtype = dtype
+        self.steps = None
+        self.feature_names = None
+
+    def fit(self, df):
+        """
+        Learn the preprocessing steps and category vocabularies from the given DataFrame.
+        """
+        steps = []
+        for col in df.columns:
+            if col in self.exclude:
+                continue
+            values = df[col]
+            if col in FILL_VALUES:
+                values = values.fillna(FILL_VALUES[col])
+            kind = column_kind(col, values)
+            if kind == 'ordinal':
+                levels, missing_code = ORDINAL_COLUMNS[col]
+                steps.append({'kind': kind, 'column': col, 'levels': levels, 'missing_code': missing_code})
+            elif kind == 'integer_categorical':
+                steps.append({'kind': 'categorical', 'column': col, 'categories': vocabulary(values.astype('int'))})
+            elif kind == 'categorical':
+                steps.append({'kind': kind, 'column': col, 'categories': vocabulary(values)})
+            elif kind == 'numeric':
+                steps.append(dict({'kind': kind, 'column': col}, **value_range(values)))
+            elif kind == 'year_sold':
+                steps.append({'kind': kind, 'column': col})
+        if 'Utilities' in df and 'Utilities' not in self.exclude:
+            steps.append({'kind': 'utilities', 'column': 'Utilities',
+                          'levels': UTILITIES_LEVELS, 'flags': UTILITIES_FLAGS})
+        for col1, col2, name in COMBINED_CATEGORIES:
+            if col1 in df and col2 in df:
+                categories = vocabulary(pd.concat([df[col1], df[col2]], ignore_index=True))
+                steps.append({'kind': 'combined', 'columns': [col1, col2], 'name': name,
+                              'categories': categories})
+        # Same order as the columns from preprocess(): numeric columns first, then the dummies
+        steps.sort(key=lambda step: step['kind'] == 'categorical')
+        self.set_steps(steps)
+        return self
+
+    def partial_fit(self, df):
+        """
+        Update the preprocessing steps with another part of the training data, e.g. a chunk of
+        a file that doesn't fit in memory. New columns are added and the categories are extended.
+        """
+        other = HousingPreprocessor(self.exclude, self.dtype).fit(df)
+        if self.steps is None:
+            self.set_steps(other.steps)
+            return self
+        steps = {step_name(step): step for step in self.steps}
+        for step in other.steps:
+            name = step_name(step)
+            old = steps.get(name)
+            if old is None or (old['kind'] == 'numeric' and step['kind'] == 'categorical'):
+                # A column without any values in a chunk looks numeric
+                steps[name] = step
+            elif 'categories' in old and 'categories' in step:
+                old['categories'] = sorted_categories(set(old['categories']) | set(step['categories']))
+            elif old['kind'] == 'numeric' and step['kind'] == 'numeric' and 'integer' in old:
+                old.update(merge_ranges(old, step))
+        steps = sorted(steps.values(), key=lambda step: step['kind'] == 'categorical')
+        self.set_steps(steps)
+        return self
+
+    def set_steps(self, steps):
+        """
+        Set the preprocessing steps and derive the feature names from them.
+        """
+        self.steps = steps
+        names = []
+        for step in steps:
+            kind = step['kind']
+            if kind in ('numeric', 'year_sold', 'ordinal'):
+                names.append(step['column'])
+            elif kind == 'utilities':
+                names.extend(step['flags'])
+            elif kind == 'combined':
+                names.extend(step['name'] + str(c) for c in step['categories'])
+            elif kind == 'categorical':
+                names.extend('{}_{}'.format(step['column'], c) for c in step['categories'])
+                names.append('{}_nan'.format(step['column']))
+        self.feature_names = names
+
+    def transform(self, df):
+        """
+        Encode the given DataFrame into a (rows x features) numpy array.
+        """
+        if self.steps is None:
+            raise ValueError('HousingPreprocessor needs to be fitted before transform')
+        n = len(df)
+        # The one allocation of the result, everything is written straight into it.
+        # Column major, since it is filled column by column.
+        X = np.zeros((n, len(self.feature_names)), dtype=self.dtype, order='F')
+        rows = np.arange(n)
+        j = 0
+        for step in self.steps:
+            kind = step['kind']
+            if kind == 'combined':
+                col1, col2 = step['columns']
+                categories = step['categories']
+                for col in (col1, col2):
+                    if col in df:
+                        codes = category_codes(df[col], categories)
+                        known = codes >= 0
+                        X[rows[known], j + codes[known]] = 1
+                j += len(categories)
+                continue
+            col = step['column']
+            if col not in df:
+                # Missing column, leave its features at 0
+                j += self.step_width(step)
+                continue
+            values = df[col]
+            if col in FILL_VALUES:
+                values = values.fillna(FILL_VALUES[col])
+            if kind == 'numeric':
+                X[:, j] = values
+                j += 1
+            elif kind == 'year_sold':
+                X[:, j] = year_sold(values, df['MoSold']) if 'MoSold' in df else values
+                j += 1
+            elif kind == 'ordinal':
+                X[:, j] = ordinal_codes(values, step['levels'], step['missing_code'])
+                j += 1
+            elif kind == 'utilities':
+                for flag in utilities_flags(values, step['levels'], step['flags']).values():
+                    X[:, j] = flag
+                    j += 1
+            elif kind == 'categorical':
+                categories = step['categories']
+                codes = category_codes(values, categories)
+                known = codes >= 0
+                X[rows[known], j + codes[known]] = 1
+                # Dummy for missing values, only rows without a known category can be missing
+                unknown = rows[~known]
+                X[unknown[values.iloc[unknown].isnull().to_numpy()], j + len(categories)] = 1
+                j += len(categories) + 1
+        assert not np.isnan(X).any(), 'Nan s in {}'.format(
+            [name for name, isnan in zip(self.feature_names, np.isnan(X).any(axis=0)) if isnan])
+        return X
+
+    def transform_sparse(self, df):
+        """
+        Encode the given DataFrame into a sparse (rows x features) CSR matrix.
+        Only the nonzero values are collected (as row, column, value), dummies directly from the
+        category codes, and the matrix is built from them at once.
+        """
+        if self.steps is None:
+            raise ValueError('HousingPreprocessor needs to be fitted before transform')
+        n = len(df)
+        rows = np.arange(n)
+        entry_rows = [np.zeros(0, dtype=np.intp)]
+        entry_columns = [np.zeros(0, dtype=np.intp)]
+        entry_values = [np.zeros(0, dtype=self.dtype)]
+
+        def add(r, c, v):
+            entry_rows.append(r)
+            entry_columns.append(np.broadcast_to(c, r.shape))
+            entry_values.append(np.broadcast_to(np.asarray(v, dtype=self.dtype), r.shape))
+
+        def add_dense(j, values):
+            values = np.asarray(values, dtype=self.dtype)
+            nonzero = values != 0
+            add(rows[nonzero], j, values[nonzero])
+
+        j = 0
+        for step in self.steps:
+            kind = step['kind']
+            if kind == 'combined':
+                # Same as transform: a missing column adds no dummies, a category in both columns is added once
+                categories = step['categories']
+                seen = np.full(n, -1)
+                for col in step['columns']:
+                    if col in df:
+                        codes = category_codes(df[col], categories)
+                        keep = (codes >= 0) & (codes != seen)
+                        add(rows[keep], j + codes[keep], 1)
+                        seen = codes
+                j += len(categories)
+                continue
+            col = step['column']
+            if col not in df:
+                j += self.step_width(step)
+                continue
+            values = df[col]
+            if col in FILL_VALUES:
+                values = values.fillna(FILL_VALUES[col])
+            if kind == 'numeric':
+                add_dense(j, values)
+                j += 1
+            elif kind == 'year_sold':
+                add_dense(j, year_sold(values, df['MoSold']) if 'MoSold' in df else values)
+                j += 1
+            elif kind == 'ordinal':
+                add_dense(j, ordinal_codes(values, step['levels'], step['missing_code']))
+                j += 1
+            elif kind == 'utilities':
+                for flag in utilities_flags(values, step['levels'], step['flags']).values():
+                    add_dense(j, flag)
+                    j += 1
+            elif kind == 'categorical':
+                categories = step['categories']
+                codes = category_codes(values, categories)
+                known = codes >= 0
+                add(rows[known], j + codes[known], 1)
+                unknown = rows[~known]
+                add(unknown[values.iloc[unknown].isnull().to_numpy()], j + len(categories), 1)
+                j += len(categories) + 1
+        data = np.concatenate(entry_values)
+        assert not np.isnan(data).any(), 'Nan s in the sparse features'
+        return sparse.csr_matrix(
+            (data, (np.concatenate(entry_rows), np.concatenate(entry_columns))),
+            shape=(n, len(self.feature_names)))
+
+    def step_width(self, step):
+        """
+        Return the number of features created by a step.
+        """
+        kind = step['kind']
+        if kind == 'utilities':
+            return len(step['flags'])
+        if kind == 'combined':
+            return len(step['categories'])
+        if kind == 'categorical':
+            return len(step['categories']) + 1
+        return 1
+
+    def feature_dtypes(self, float_dtype=np.float32):
+        """
+        Return the smallest dtype of every feature (feature name -> dtype), derived from the fitted steps
+        so that every batch gets the same dtypes: ordinal codes and Utilities flags the smallest integer type,
+        dummies bool, numeric columns the smallest integer type for the range seen during fit
+        (float_dtype if not all integers) and YrSold float_dtype.
+        """
+        dtypes = []
+        for step in self.steps:
+            kind = step['kind']
+            if kind == 'ordinal':
+                codes = [0, len(step['levels']) - 1]
+                if step['missing_code'] is not None:
+                    codes.append(step['missing_code'])
+                dtypes.append(smallest_int_dtype(np.array(codes)))
+            elif kind == 'utilities':
+                dtypes.extend([np.int8] * len(step['flags']))
+            elif kind in ('categorical', 'combined'):
+                dtypes.extend([np.bool_] * self.step_width(step))
+            elif kind == 'numeric' and 'integer' not in step:
+                # Fitted before the ranges were kept, the range is unknown
+                dtypes.append(np.float64)
+            elif kind == 'numeric' and step['integer']:
+                dtypes.append(smallest_int_dtype(np.array([step['min'] or 0, step['max'] or 0])))
+            else:
+                dtypes.append(float_dtype)
+        return dict(zip(self.feature_names, dtypes))
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    def transform_frame(self, df, compact=False):
+        """
+        Encode the given DataFrame into a DataFrame with the feature names as columns.
+        With compact every feature gets the dtype from feature_dtypes, a ValueError is raised
+        if the values of an integer feature don't fit in it (e.g. out of the range seen during fit).
+        """
+        X = pd.DataFrame(self.transform(df), index=df.index, columns=self.feature_names, copy=False)
+        if compact:
+            X = compact_frame(X, dtypes=self.feature_dtypes())
+        return X
+
+    def to_dict(self):
+        return {'exclude': self.exclude, 'dtype': self.dtype, 'steps': self.steps}
+
+    @classmethod
+    def from_dict(cls, d):
+        preprocessor = cls(exclude=d['exclude'], dtype=d['dtype'])
+        preprocessor.set_steps(d['steps'])
+        return preprocessor
+
+    def save(self, path):
+        """
+        Save the fitted preprocessor as JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a preprocessor that was saved with save.
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def vocabulary(values):
+    """
+    Return the sorted list of unique non-missing values, as plain Python values (to store as JSON).
+    """
+    uniques = pd.unique(values.dropna())
+    return sorted_categories(u.item() if hasattr(u, 'item') else u for u in uniques)
+
+
+def value_range(values):
+    """
+    Return the smallest and largest value of a numeric column (None if it has no values),
+    and whether all its values are integers, as plain Python values (to store as JSON).
+    """
+    values = values.to_numpy(dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {'min': None, 'max': None, 'integer': True}
+    integer = bool(np.isfinite(values).all() and np.array_equal(values, np.round(values))
+                   and np.abs(values).max() < 2**53)
+    convert = int if integer else float
+    return {'min': convert(values.min()), 'max': convert(values.max()), 'integer': integer}
+
+
+def merge_ranges(a, b):
+    """
+    Return the value range (as returned by value_range) that covers the ranges a and b.
+    """
+    lows = [r['min'] for r in (a, b) if r['min'] is not None]
+    highs = [r['max'] for r in (a, b) if r['max'] is not None]
+    return {
+        'min': min(lows) if lows else None, 'max': max(highs) if highs else None,
+        'integer': a['integer'] and b['integer']}
+
+
+def sorted_categories(categories):
+    """
+    Sort categories (grouped by type, so a mix of strings and numbers can be sorted).
+    """
+    return sorted(categories, key=lambda c: (str(type(c)), c))
+
+
+def step_name(step):
+    """
+    Return the name of the column (or combined dummies) a preprocessing step is for.
+    """
+    return step['name'] if step['kind'] == 'combined' else step['column']
+
+
+def category_codes(values, categories):
+    """
+    Return the index of every value in categories, -1 for missing and unknown values.
+    """
+    return pd.Index(categories).get_indexer(values)
@@ -0,0 +1,252 @@
+"""
+On-disk cache of preprocessing results.
+
+Results are stored under a key that is a hash of the input data (values, index, column names
+and dtypes), the preprocessing tables from preprocess.py and the arguments of the call.
+On a hit the result is loaded memory-mapped (read-only) instead of being computed again.
+Nothing is pickled: a non-default index is stored as a typed array, or as JSON for strings,
+results with other indexes are not cached.
+The cache has a maximum size; the least recently used results are removed first.
+When the preprocessing tables change, all results are removed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import preprocess
+
+
+# Increase when the preprocessing code changes the results for the same tables, or the format of the cache
+CACHE_VERSION = 2
+
+
+def tables_fingerprint():
+    """
+    Return a hash of the tables that define the preprocessing.
+    """
+    tables = {
+        'version': CACHE_VERSION,
+        'ordinal': preprocess.ORDINAL_COLUMNS,
+        'utilities_levels': preprocess.UTILITIES_LEVELS,
+        'utilities_flags': preprocess.UTILITIES_FLAGS,
+        'combined': preprocess.COMBINED_CATEGORIES,
+        'integer_categorical': preprocess.INTEGER_CATEGORICAL_COLUMNS,
+        'fill_values': preprocess.FILL_VALUES,
+    }
+    return hashlib.blake2b(json.dumps(tables, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def frame_fingerprint(df):
+    """
+    Return a hash of the values, index, column names and dtypes of a DataFrame.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode())
+    # One 64 bit hash per row, computed vectorized by pandas
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def save_index(index, directory):
+    """
+    Store an index in directory without pickling: numbers and dates as a typed .npy array,
+    strings as a JSON list. Return the name of the file, None if the index can't be stored.
+    """
+    values = index.to_numpy()
+    if values.dtype.kind in 'biufmM':
+        np.save(os.path.join(directory, 'index.npy'), values, allow_pickle=False)
+        return 'index.npy'
+    if all(isinstance(value, str) for value in values):
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump(values.tolist(), f)
+        return 'index.json'
+    return None
+
+
+def load_index(path):
+    """
+    Return the index stored by save_index.
+    """
+    if path.endswith('.json'):
+        with open(path) as f:
+            return pd.Index(json.load(f))
+    return pd.Index(np.load(path, allow_pickle=False))
+
+
+def directory_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class PreprocessCache(object):
+    """
+    Cache of preprocess() and HousingPreprocessor.transform results in a directory,
+    one subdirectory per result, of at most max_bytes in total.
+    """
+    def __init__(self, directory, max_bytes=2**32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        # Results computed with other tables can't be used anymore
+        tables_path = os.path.join(directory, 'tables.txt')
+        fingerprint = tables_fingerprint()
+        stored = None
+        if os.path.exists(tables_path):
+            with open(tables_path) as f:
+                stored = f.read()
+        if stored != fingerprint:
+            self.invalidate()
+            with open(tables_path, 'w') as f:
+                f.write(fingerprint)
+        self.tables = fingerprint
+
+    def key(self, df, **config):
+        """
+        Return the cache key of the given input and configuration.
+        """
+        config = json.dumps(config, sort_keys=True, default=str)
+        return hashlib.blake2b(
+            (self.tables + frame_fingerprint(df) + config).encode(), digest_size=16).hexdigest()
+
+    def entries(self):
+        """
+        Return the directories of all cached results.
+        """
+        return [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+
+    def invalidate(self):
+        """
+        Remove all cached results.
+        """
+        for path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+    def size(self):
+        """
+        Return the total size of the cached results in bytes.
+        """
+        return sum(directory_size(path) for path in self.entries())
+
+    def get(self, key):
+        """
+        Return the cached result (memory-mapped) for the given key, None if it isn't cached.
+        """
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # Mark as recently used
+        os.utime(path)
+        self.hits += 1
+        if meta['kind'] == 'array':
+            return np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+        columns = {}
+        for i, group in enumerate(meta['groups']):
+            # Every group is stored as (columns x rows), so each column is contiguous
+            values = np.load(os.path.join(path, '{}.npy'.format(i)), mmap_mode='r')
+            columns.update(zip(group, values))
+        if meta['index'] is None:
+            index = pd.RangeIndex(len(next(iter(columns.values()))) if columns else 0)
+        else:
+            index = load_index(os.path.join(path, meta['index']))
+        return pd.DataFrame({col: columns[col] for col in meta['columns']}, index=index, copy=False)
+
+    def put(self, key, result):
+        """
+        Store a result (array or DataFrame) under the given key, and remove old results if the
+        cache is too large. A DataFrame with an index that can't be stored without pickling isn't stored.
+        """
+        # Write to a temporary directory that is renamed when complete, so readers never see half a result
+        tmp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp')
+        if isinstance(result, np.ndarray):
+            np.save(os.path.join(tmp, 'values.npy'), result, allow_pickle=False)
+            meta = {'kind': 'array'}
+        else:
+            groups = {}
+            for col, dtype in result.dtypes.items():
+                groups.setdefault(str(dtype), []).append(col)
+            for i, group in enumerate(groups.values()):
+                np.save(os.path.join(tmp, '{}.npy'.format(i)), result[group].to_numpy().T.copy(), allow_pickle=False)
+            index = result.index
+            index_file = None
+            if not (isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1):
+                index_file = save_index(index, tmp)
+                if index_file is None:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    return
+            meta = {
+                'kind': 'frame', 'columns': list(result.columns), 'groups': list(groups.values()),
+                'index': index_file}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        path = os.path.join(self.directory, key)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Stored by someone else in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache fits in max_bytes.
+        """
+        entries = sorted((os.stat(path).st_mtime, directory_size(path), path) for path in self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def preprocess(self, df, columns_needed=None, compact=False):
+        """
+        preprocess.preprocess with caching.
+        """
+        key = self.key(df, function='preprocess', columns_needed=columns_needed, compact=compact)
+        result = self.get(key)
+        if result is None:
+            result = preprocess.preprocess(df, columns_needed, compact=compact)
+            self.put(key, result)
+        return result
+
+    def transform(self, preprocessor, df):
+        """
+        HousingPreprocessor.transform with caching.
+        """
+        key = self.key(df, function='transform', preprocessor=preprocessor.to_dict())
+        result = self.get(key)
+        if result is None:
+            result = preprocessor.transform(df)
+            self.put(key, result)
+        return result
+
+
+if __name__ == '__main__':
+    # Benchmark: time of a cache miss (preprocess and store) and a hit (hash the input and load the result)
+    from synthetic_data import make_housing_frame
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10**6, help='number of rows in the synthetic frame')
+    parser.add_argument('--directory', default=os.path.join(tempfile.gettempdir(), 'housing_preprocess_cache'))
+    args = parser.parse_args()
+
+    df = make_housing_frame(args.rows)
+    cache = PreprocessCache(args.directory)
+    cache.invalidate()
+    for name in ['miss', 'hit']:
+        start = time.perf_counter()
+        result = cache.preprocess(df)
+        print('{:<6} {:>8.2f}s'.format(name, time.perf_counter() - start))
+    print('{} columns, cache size {:,.0f} MB'.format(result.shape[1], cache.size() / 2**20))
@@ -0,0 +1,178 @@
+"""
+Preprocess housing data that doesn't fit in memory.
+
+The input (CSV or Parquet) is read in chunks of rows, every chunk is encoded with a fitted
+HousingPreprocessor and written out before the next chunk is read: to a .npy feature matrix
+(that can be loaded memory-mapped) or to a Parquet file.
+Peak memory depends on the chunk size, not on the size of the data.
+
+Parquet needs pyarrow.
+"""
+import argparse
+import io
+import os
+import resource
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+from preprocess import HousingPreprocessor
+
+
+def read_chunks(path, chunk_rows=100000):
+    """
+    Generate DataFrames of (at most) chunk_rows rows from a CSV or Parquet file.
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(path, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def count_rows(path, chunk_rows=100000):
+    """
+    Return the number of rows in a CSV (without reading it into memory) or Parquet file.
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    # Rows, not lines: quoted fields can contain newlines. Only the first column is kept.
+    n_rows = 0
+    with pd.read_csv(path, usecols=[0], chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            n_rows += len(chunk)
+    return n_rows
+
+
+def npy_header(dtype, shape, size=None):
+    """
+    Return the .npy (format 1.0) header of an array with the given dtype and shape (C order),
+    padded with spaces to size bytes if given.
+    """
+    f = io.BytesIO()
+    np.lib.format.write_array_header_1_0(f, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': shape})
+    header = f.getvalue()
+    if size is not None:
+        # The header dictionary can be followed by any number of spaces before the closing newline.
+        # The 10 bytes before it are the magic string, the version and the length of the rest.
+        header = header[:-1] + b' ' * (size - len(header)) + b'\n'
+        header = header[:8] + struct.pack('<H', size - 10) + header[10:]
+    return header
+
+
+def fit_chunks(path, chunk_rows=100000, exclude=('Id', 'SalePrice')):
+    """
+    Fit a HousingPreprocessor on all rows of a file, one chunk at a time.
+    """
+    preprocessor = HousingPreprocessor(exclude=exclude)
+    for chunk in read_chunks(path, chunk_rows):
+        preprocessor.partial_fit(chunk)
+    return preprocessor
+
+
+def preprocess_to_npy(preprocessor, path, out_path, chunk_rows=100000):
+    """
+    Encode all rows of the input file into a (rows x features) .npy file, one chunk at a time.
+    Every chunk is appended to the file as soon as it's encoded, so the matrix never needs to
+    fit in memory, and the input is only read once. Return the result memory-mapped (read-only).
+    """
+    dtype = np.dtype(preprocessor.dtype)
+    n_features = len(preprocessor.feature_names)
+    # The number of rows is only known at the end, so room is left for the header with the largest row count,
+    # and the header is written when all rows are
+    size = len(npy_header(dtype, (np.iinfo(np.int64).max, n_features)))
+    n_rows = 0
+    with open(out_path, 'wb') as f:
+        f.write(npy_header(dtype, (0, n_features), size))
+        for chunk in read_chunks(path, chunk_rows):
+            # tofile writes row by row (C order), whatever the order of the array
+            preprocessor.transform(chunk).tofile(f)
+            n_rows += len(chunk)
+        f.seek(0)
+        f.write(npy_header(dtype, (n_rows, n_features), size))
+    return np.load(out_path, mmap_mode='r')
+
+
+def preprocess_to_parquet(preprocessor, path, out_path, chunk_rows=100000):
+    """
+    Encode all rows of the input file into a Parquet file with the feature names as columns,
+    one row group per chunk. Return the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    n_rows = 0
+    writer = None
+    try:
+        for chunk in read_chunks(path, chunk_rows):
+            table = pa.Table.from_pandas(preprocessor.transform_frame(chunk), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def stream_preprocess(preprocessor, path, out_path, chunk_rows=100000):
+    """
+    Encode all rows of the input file into out_path, a .npy or .parquet file.
+    """
+    if out_path.endswith('.npy'):
+        return preprocess_to_npy(preprocessor, path, out_path, chunk_rows)
+    if out_path.endswith('.parquet'):
+        return preprocess_to_parquet(preprocessor, path, out_path, chunk_rows)
+    raise ValueError('Output should be a .npy or .parquet file, got {}'.format(out_path))
+
+
+def peak_memory_mb():
+    """
+    Return the peak resident memory of this process in MB (Linux reports it in kB).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('input', nargs='?', help='CSV or Parquet file, a synthetic CSV is generated if not given')
+    parser.add_argument('--output', default='features.npy', help='.npy or .parquet output file')
+    parser.add_argument('--schema', help='saved HousingPreprocessor to use, fitted on the input if not given')
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    parser.add_argument('--rows', type=int, default=10**6, help='number of rows of the synthetic CSV')
+    args = parser.parse_args()
+
+    path = args.input
+    if path is None:
+        from synthetic_data import make_housing_frame
+        path = 'synthetic_train.csv'
+        # Generate the synthetic file in parts as well
+        for i, start in enumerate(range(0, args.rows, args.chunk_rows)):
+            part = make_housing_frame(min(args.chunk_rows, args.rows - start), seed=i)
+            part['Id'] += start
+            part.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        print('Generated {} ({:,.0f} MB)'.format(path, os.path.getsize(path) / 2**20))
+
+    start = time.perf_counter()
+    if args.schema:
+        preprocessor = HousingPreprocessor.load(args.schema)
+    else:
+        preprocessor = fit_chunks(path, args.chunk_rows)
+        preprocessor.save(os.path.splitext(args.output)[0] + '_schema.json')
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    result = stream_preprocess(preprocessor, path, args.output, args.chunk_rows)
+    elapsed = time.perf_counter() - start
+    # The .npy result is the memory-mapped matrix, the Parquet result the number of rows
+    n_rows = len(result) if args.output.endswith('.npy') else result
+    print('fit: {:.1f}s, transform: {:,.0f} rows/s, {} features'.format(
+        fit_time, n_rows / elapsed, len(preprocessor.feature_names)))
+    print('output {} ({:,.0f} MB), peak memory {:,.0f} MB'.format(
+        args.output, os.path.getsize(args.output) / 2**20, peak_memory_mb()))
@@ -0,0 +1,135 @@
+"""
+Synthetic Kaggle house prices data, with the same columns and value sets as ./data/train.csv.
+Used to benchmark the preprocessing at sizes far beyond the real dataset.
+"""
+import numpy as np
+import pandas as pd
+
+
+QUALITY = ['Po', 'Fa', 'TA', 'Gd', 'Ex']
+BSMT_FIN_TYPES = ['Unf', 'LwQ', 'Rec', 'BLQ', 'ALQ', 'GLQ']
+CONDITIONS = ['Artery', 'Feedr', 'Norm', 'RRNn', 'RRAn', 'PosN', 'PosA', 'RRNe', 'RRAe']
+EXTERIORS = [
+    'AsbShng', 'AsphShn', 'BrkComm', 'BrkFace', 'CBlock', 'CemntBd', 'HdBoard', 'ImStucc',
+    'MetalSd', 'Other', 'Plywood', 'PreCast', 'Stone', 'Stucco', 'VinylSd', 'Wd Sdng', 'WdShing']
+NEIGHBORHOODS = [
+    'Blmngtn', 'Blueste', 'BrDale', 'BrkSide', 'ClearCr', 'CollgCr', 'Crawfor', 'Edwards', 'Gilbert',
+    'IDOTRR', 'MeadowV', 'Mitchel', 'NAmes', 'NoRidge', 'NPkVill', 'NridgHt', 'NWAmes', 'OldTown',
+    'SWISU', 'Sawyer', 'SawyerW', 'Somerst', 'StoneBr', 'Timber', 'Veenker']
+
+# Categorical columns: column -> (values, fraction of missing values)
+CATEGORICAL_COLUMNS = {
+    'MSZoning': (['A', 'C (all)', 'FV', 'I', 'RH', 'RL', 'RP', 'RM'], 0.001),
+    'Street': (['Grvl', 'Pave'], 0.0),
+    'Alley': (['Grvl', 'Pave'], 0.9),
+    'LotShape': (['Reg', 'IR1', 'IR2', 'IR3'], 0.0),
+    'LandContour': (['Lvl', 'Bnk', 'HLS', 'Low'], 0.0),
+    'Utilities': (['AllPub', 'NoSewr', 'NoSeWa', 'ELO'], 0.0),
+    'LotConfig': (['Inside', 'Corner', 'CulDSac', 'FR2', 'FR3'], 0.0),
+    'LandSlope': (['Gtl', 'Mod', 'Sev'], 0.0),
+    'Neighborhood': (NEIGHBORHOODS, 0.0),
+    'Condition1': (CONDITIONS, 0.0),
+    'Condition2': (CONDITIONS, 0.0),
+    'BldgType': (['1Fam', '2fmCon', 'Duplex', 'TwnhsE', 'Twnhs'], 0.0),
+    'HouseStyle': (['1Story', '1.5Fin', '1.5Unf', '2Story', '2.5Fin', '2.5Unf', 'SFoyer', 'SLvl'], 0.0),
+    'RoofStyle': (['Flat', 'Gable', 'Gambrel', 'Hip', 'Mansard', 'Shed'], 0.0),
+    'RoofMatl': (['ClyTile', 'CompShg', 'Membran', 'Metal', 'Roll', 'Tar&Grv', 'WdShake', 'WdShngl'], 0.0),
+    'Exterior1st': (EXTERIORS, 0.0),
+    'Exterior2nd': (EXTERIORS, 0.0),
+    'MasVnrType': (['BrkCmn', 'BrkFace', 'CBlock', 'Stone'], 0.6),
+    'ExterQual': (QUALITY, 0.0),
+    'ExterCond': (QUALITY, 0.0),
+    'Foundation': (['BrkTil', 'CBlock', 'PConc', 'Slab', 'Stone', 'Wood'], 0.0),
+    'BsmtQual': (QUALITY, 0.03),
+    'BsmtCond': (QUALITY, 0.03),
+    'BsmtExposure': (['No', 'Mn', 'Av', 'Gd'], 0.03),
+    'BsmtFinType1': (BSMT_FIN_TYPES, 0.03),
+    'BsmtFinType2': (BSMT_FIN_TYPES, 0.03),
+    'Heating': (['Floor', 'GasA', 'GasW', 'Grav', 'OthW', 'Wall'], 0.0),
+    'HeatingQC': (QUALITY, 0.0),
+    'CentralAir': (['N', 'Y'], 0.0),
+    'Electrical': (['SBrkr', 'FuseA', 'FuseF', 'FuseP', 'Mix'], 0.001),
+    'KitchenQual': (QUALITY, 0.001),
+    'Functional': (['Sal', 'Sev', 'Maj2', 'Maj1', 'Mod', 'Min2', 'Min1', 'Typ'], 0.001),
+    'FireplaceQu': (QUALITY, 0.5),
+    'GarageType': (['2Types', 'Attchd', 'Basment', 'BuiltIn', 'CarPort', 'Detchd'], 0.05),
+    'GarageFinish': (['Unf', 'RFn', 'Fin'], 0.05),
+    'GarageQual': (QUALITY, 0.05),
+    'GarageCond': (QUALITY, 0.05),
+    'PavedDrive': (['N', 'P', 'Y'], 0.0),
+    'PoolQC': (['Fa', 'TA', 'Gd', 'Ex'], 0.99),
+    'Fence': (['MnWw', 'GdWo', 'MnPrv', 'GdPrv'], 0.8),
+    'MiscFeature': (['Elev', 'Gar2', 'Othr', 'Shed', 'TenC'], 0.96),
+    'SaleType': (['WD', 'CWD', 'VWD', 'New', 'COD', 'Con', 'ConLw', 'ConLI', 'ConLD', 'Oth'], 0.001),
+    'SaleCondition': (['Normal', 'Abnorml', 'AdjLand', 'Alloca', 'Family', 'Partial'], 0.0),
+}
+
+# Integer columns: column -> (low, high (exclusive), fraction of missing values).
+# Columns with missing values are floats, like pandas.read_csv returns them.
+NUMERIC_COLUMNS = {
+    'MSSubClass': (20, 200, 0.0),
+    'LotFrontage': (20, 320, 0.17),
+    'LotArea': (1300, 215000, 0.0),
+    'OverallQual': (1, 11, 0.0),
+    'OverallCond': (1, 10, 0.0),
+    'YearBuilt': (1872, 2011, 0.0),
+    'YearRemodAdd': (1950, 2011, 0.0),
+    'MasVnrArea': (0, 1600, 0.005),
+    'BsmtFinSF1': (0, 5600, 0.001),
+    'BsmtFinSF2': (0, 1500, 0.001),
+    'BsmtUnfSF': (0, 2300, 0.001),
+    'TotalBsmtSF': (0, 6100, 0.001),
+    '1stFlrSF': (330, 4700, 0.0),
+    '2ndFlrSF': (0, 2000, 0.0),
+    'LowQualFinSF': (0, 570, 0.0),
+    'GrLivArea': (330, 5600, 0.0),
+    'BsmtFullBath': (0, 4, 0.001),
+    'BsmtHalfBath': (0, 3, 0.001),
+    'FullBath': (0, 4, 0.0),
+    'HalfBath': (0, 3, 0.0),
+    'BedroomAbvGr': (0, 9, 0.0),
+    'KitchenAbvGr': (0, 4, 0.0),
+    'TotRmsAbvGrd': (2, 15, 0.0),
+    'Fireplaces': (0, 4, 0.0),
+    'GarageYrBlt': (1900, 2011, 0.05),
+    'GarageCars': (0, 5, 0.001),
+    'GarageArea': (0, 1420, 0.001),
+    'WoodDeckSF': (0, 860, 0.0),
+    'OpenPorchSF': (0, 550, 0.0),
+    'EnclosedPorch': (0, 560, 0.0),
+    '3SsnPorch': (0, 510, 0.0),
+    'ScreenPorch': (0, 480, 0.0),
+    'PoolArea': (0, 740, 0.0),
+    'MiscVal': (0, 15500, 0.0),
+    'MoSold': (1, 13, 0.0),
+    'YrSold': (2006, 2011, 0.0),
+}
+
+MS_SUB_CLASSES = [20, 30, 40, 45, 50, 60, 70, 75, 80, 85, 90, 120, 150, 160, 180, 190]
+
+
+def make_housing_frame(n_rows, seed=0, with_target=True):
+    """
+    Return a DataFrame with n_rows random houses, in the format of the Kaggle train.csv
+    (or test.csv if with_target is False).
+    """
+    rng = np.random.default_rng(seed)
+    columns = {'Id': np.arange(1, n_rows + 1)}
+    for col, (low, high, missing) in NUMERIC_COLUMNS.items():
+        if col == 'MSSubClass':
+            values = np.array(MS_SUB_CLASSES)[rng.integers(0, len(MS_SUB_CLASSES), n_rows)]
+        else:
+            values = rng.integers(low, high, n_rows)
+        if missing > 0:
+            values = values.astype(np.float64)
+            values[rng.random(n_rows) < missing] = np.nan
+        columns[col] = values
+    for col, (levels, missing) in CATEGORICAL_COLUMNS.items():
+        codes = rng.integers(0, len(levels), n_rows)
+        if missing > 0:
+            codes[rng.random(n_rows) < missing] = -1
+        # Strings with NaN for missing values, the way read_csv returns them
+        columns[col] = pd.Categorical.from_codes(codes, categories=levels).astype(object)
+    if with_target:
+        columns['SalePrice'] = rng.integers(35000, 755000, n_rows)
+    return pd.DataFrame(columns)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from box_cox import BoxCoxTransformer
+from synthetic_data import make_housing_frame
+
+COLUMNS = ['LotArea', 'GrLivArea', 'MasVnrArea', '2ndFlrSF']
+
+
+@pytest.fixture(scope='module')
+def df():
+    return make_housing_frame(400)
+
+
+def test_lambdas_match_scipy_and_inverse_undoes_transform(df):
+    transformer = BoxCoxTransformer(COLUMNS).fit(df)
+    block = df[COLUMNS].to_numpy(dtype=np.float64)
+    for j, col in enumerate(COLUMNS):
+        values = block[:, j][~np.isnan(block[:, j])] + transformer.shifts[j]
+        assert transformer.lambdas[j] == pytest.approx(stats.boxcox_normmax(values, method='mle'))
+        assert values.min() >= 1
+    transformed = transformer.transform(block.copy())
+    for j in range(len(COLUMNS)):
+        finite = ~np.isnan(block[:, j])
+        expected = stats.boxcox(block[finite, j] + transformer.shifts[j], transformer.lambdas[j])
+        assert np.allclose(transformed[finite, j], expected)
+    assert np.allclose(transformer.inverse_transform(transformed), block, equal_nan=True)
+
+
+def test_frame_in_place_workers_and_json(tmp_path, df):
+    transformer = BoxCoxTransformer(COLUMNS, n_workers=2).fit(df)
+    assert np.allclose(transformer.lambdas, BoxCoxTransformer(COLUMNS).fit(df).lambdas)
+    path = str(tmp_path / 'box_cox.json')
+    transformer.save(path)
+    loaded = BoxCoxTransformer.load(path)
+    frame = df.copy()
+    assert loaded.transform(frame) is frame
+    expected = transformer.transform(df[COLUMNS].to_numpy(dtype=np.float64))
+    assert np.allclose(frame[COLUMNS].to_numpy(), expected, equal_nan=True)
+    assert (frame['OverallQual'] == df['OverallQual']).all()
+    with pytest.raises(ValueError):
+        BoxCoxTransformer(COLUMNS).transform(frame)
+
+
+def test_subsample_fit(df):
+    transformer = BoxCoxTransformer(COLUMNS, max_samples=100).fit(df)
+    # The shift always uses all rows
+    assert np.array_equal(transformer.shifts, BoxCoxTransformer(COLUMNS).fit(df).shifts)
+    assert np.isfinite(transformer.lambdas).all()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compact_features import (
+    cast_column, compact_frame, compaction_report, pack_dummies, smallest_int_dtype, unpack_dummies)
+from preprocess import HousingPreprocessor, preprocess
+from synthetic_data import make_housing_frame
+
+
+def test_smallest_int_dtype():
+    assert smallest_int_dtype(np.array([-128, 127])) == np.int8
+    assert smallest_int_dtype(np.array([0, 128])) == np.int16
+    assert smallest_int_dtype(np.array([0, 2**31])) == np.int64
+    assert smallest_int_dtype(np.array([], dtype=np.int64)) == np.int8
+
+
+def test_compact_frame_keeps_the_values():
+    features = preprocess(make_housing_frame(300))
+    compact = compact_frame(features)
+    assert list(compact.columns) == list(features.columns)
+    assert compact['ExterQual'].dtype == np.int8 and compact['LotArea'].dtype == np.int32
+    assert compact['Neighborhood_NAmes'].dtype == np.bool_
+    assert compact['YrSold'].dtype == np.float32
+    for col in features.columns:
+        if col == 'YrSold':
+            assert np.allclose(compact[col], features[col])
+        else:
+            assert (compact[col].to_numpy() == features[col].to_numpy()).all()
+    pd.testing.assert_frame_equal(preprocess(make_housing_frame(300), compact=True), compact)
+    report = compaction_report(features, compact)
+    assert report['bytes_after'] < report['bytes_before']
+
+
+def test_pack_dummies_round_trip():
+    features = compact_frame(preprocess(make_housing_frame(100)))
+    packed, dummies, rest = pack_dummies(features)
+    assert packed.dtype == np.uint8 and packed.shape == (100, -(-len(dummies) // 8))
+    assert not any(dtype == np.bool_ for dtype in rest.dtypes)
+    pd.testing.assert_frame_equal(unpack_dummies(packed, dummies, features.index), features[dummies])
+
+
+def test_fitted_dtypes_are_the_same_for_every_batch():
+    df = make_housing_frame(400)
+    preprocessor = HousingPreprocessor().fit(df)
+    dtypes = preprocessor.feature_dtypes()
+    full = preprocessor.transform_frame(df, compact=True)
+    assert full.dtypes.to_dict() == {col: np.dtype(dtype) for col, dtype in dtypes.items()}
+    # Same dtypes as compacting the result of preprocess on the whole frame
+    everything = HousingPreprocessor(exclude=()).fit(df)
+    assert everything.transform_frame(df, compact=True).dtypes.equals(preprocess(df, compact=True).dtypes)
+    # A small batch has smaller values, but gets the same dtypes
+    batch = df.iloc[:3].assign(LotArea=1, MiscVal=0)
+    assert compact_frame(preprocessor.transform_frame(batch))['LotArea'].dtype == np.int8
+    compact = preprocessor.transform_frame(batch, compact=True)
+    assert compact.dtypes.equals(full.dtypes)
+    # Only YrSold is a float32, the other values are exact
+    assert np.allclose(compact.to_numpy(dtype=np.float64), preprocessor.transform(batch), rtol=1e-7, atol=0)
+    with pytest.raises(ValueError):
+        preprocessor.transform_frame(batch.assign(Fireplaces=1000), compact=True)
+
+
+def test_partial_fit_merges_the_ranges():
+    df = make_housing_frame(400)
+    preprocessor = HousingPreprocessor()
+    for start in range(0, len(df), 100):
+        preprocessor.partial_fit(df.iloc[start:start + 100])
+    assert preprocessor.feature_dtypes() == HousingPreprocessor().fit(df).feature_dtypes()
+
+
+def test_cast_column():
+    assert cast_column(np.array([1., 2.]), np.int8).dtype == np.int8
+    assert cast_column(np.array([True, False]), np.int8).tolist() == [1, 0]
+    for values in [np.array([1.5]), np.array([np.nan]), np.array([300])]:
+        with pytest.raises(ValueError):
+            cast_column(values, np.int8, 'x')
@@ -0,0 +1,23 @@
+import numpy as np
+
+from parallel_preprocess import parallel_transform, shard_bounds
+from preprocess import HousingPreprocessor
+from synthetic_data import make_housing_frame
+
+
+def test_shard_bounds_cover_all_rows():
+    assert shard_bounds(0, 4) == []
+    for n_rows, n_shards in [(3, 8), (10, 3), (1000, 7)]:
+        bounds = shard_bounds(n_rows, n_shards)
+        assert [start for start, _ in bounds] == [0] + [stop for _, stop in bounds[:-1]]
+        assert sum(stop - start for start, stop in bounds) == n_rows
+        assert all(stop > start for start, stop in bounds)
+
+
+def test_same_result_as_transform():
+    df = make_housing_frame(300)
+    preprocessor = HousingPreprocessor().fit(df)
+    expected = preprocessor.transform(df)
+    for n_workers in (1, 2):
+        assert np.array_equal(parallel_transform(preprocessor, df, n_workers, shards_per_worker=3), expected)
+    assert parallel_transform(preprocessor, df.iloc[:0], 2).shape == (0, len(preprocessor.feature_names))
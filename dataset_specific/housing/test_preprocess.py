@@ -0,0 +1,107 @@
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocess import HousingPreprocessor, preprocess, preprocess_sparse
+from synthetic_data import make_housing_frame
+
+
+@pytest.fixture(scope='module')
+def df():
+    return make_housing_frame(500)
+
+
+def test_same_result_as_the_original_preprocess(df):
+    from benchmark_preprocess import load_original
+    try:
+        original = load_original()
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip('the original preprocess.py is read from git')
+    expected = original(df.copy())
+    result = preprocess(df)
+    columns = sorted(result.columns)
+    assert sorted(expected.columns) == columns
+    pd.testing.assert_frame_equal(result[columns], expected[columns])
+
+
+def test_input_is_not_modified_and_missing_columns_are_added(df):
+    before = df.copy()
+    result = preprocess(df, columns_needed=['MSSubClass_999', 'Extra'])
+    pd.testing.assert_frame_equal(df, before)
+    assert (result[['MSSubClass_999', 'Extra']] == 0).all().all()
+    assert result.notnull().all().all()
+
+
+def test_preprocessor_matches_preprocess(df):
+    expected = preprocess(df)
+    preprocessor = HousingPreprocessor(exclude=()).fit(df)
+    assert preprocessor.feature_names == list(expected.columns)
+    X = preprocessor.transform(df)
+    assert X.dtype == np.float64 and X.shape == expected.shape
+    assert np.array_equal(X, expected.to_numpy(dtype=np.float64))
+    frame = preprocessor.transform_frame(df)
+    assert list(frame.columns) == list(expected.columns) and frame.index.equals(df.index)
+    # Id and SalePrice are not features by default
+    assert 'SalePrice' not in HousingPreprocessor().fit(df).feature_names
+
+
+def test_unseen_categories_and_missing_columns(df):
+    preprocessor = HousingPreprocessor().fit(df)
+    new = make_housing_frame(50, seed=1, with_target=False)
+    new.loc[:9, 'Neighborhood'] = 'Atlantis'
+    new = new.drop(columns=['LotArea', 'Street']).assign(Unknown=1)
+    X = preprocessor.transform_frame(new)
+    assert list(X.columns) == preprocessor.feature_names
+    neighborhoods = [name for name in preprocessor.feature_names if name.startswith('Neighborhood_')]
+    assert (X.loc[:9, neighborhoods] == 0).all().all()
+    assert (X.loc[10:, neighborhoods].sum(axis=1) == 1).all()
+    assert (X['LotArea'] == 0).all() and (X[['Street_Grvl', 'Street_Pave', 'Street_nan']] == 0).all().all()
+    # The other features are the same as with all columns present
+    expected = preprocessor.transform_frame(make_housing_frame(50, seed=1, with_target=False))
+    others = [name for name in preprocessor.feature_names
+              if name != 'LotArea' and not name.startswith(('Neighborhood_', 'Street_'))]
+    pd.testing.assert_frame_equal(X[others], expected[others])
+
+
+def test_json_round_trip(tmp_path, df):
+    preprocessor = HousingPreprocessor().fit(df)
+    path = str(tmp_path / 'schema.json')
+    preprocessor.save(path)
+    loaded = HousingPreprocessor.load(path)
+    assert loaded.to_dict() == preprocessor.to_dict()
+    assert loaded.feature_names == preprocessor.feature_names
+    new = make_housing_frame(100, seed=2)
+    assert np.array_equal(loaded.transform(new), preprocessor.transform(new))
+    with pytest.raises(ValueError):
+        HousingPreprocessor().transform(new)
+
+
+def test_partial_fit_matches_fit(df):
+    preprocessor = HousingPreprocessor()
+    for start in range(0, len(df), 100):
+        preprocessor.partial_fit(df.iloc[start:start + 100])
+    assert preprocessor.to_dict() == HousingPreprocessor().fit(df).to_dict()
+
+
+def test_sparse_matches_dense(df):
+    expected = preprocess(df, columns_needed=['Extra'])
+    X, columns = preprocess_sparse(df, columns_needed=['Extra'])
+    assert columns == list(expected.columns)
+    assert np.array_equal(X.toarray(), expected.to_numpy(dtype=np.float64))
+    preprocessor = HousingPreprocessor().fit(df)
+    new = make_housing_frame(50, seed=3).drop(columns=['LotArea', 'Neighborhood'])
+    new.loc[:4, 'Heating'] = 'Solar'
+    assert np.array_equal(preprocessor.transform_sparse(new).toarray(), preprocessor.transform(new))
+
+
+def test_combined_categories_with_one_column_missing(df):
+    preprocessor = HousingPreprocessor().fit(df)
+    new = make_housing_frame(50, seed=4).drop(columns=['Condition2', 'Exterior1st'])
+    X = preprocessor.transform(new)
+    assert np.array_equal(preprocessor.transform_sparse(new).toarray(), X)
+    frame = pd.DataFrame(X, columns=preprocessor.feature_names)
+    conditions = [name for name in preprocessor.feature_names if name.startswith('Condition')]
+    assert (frame[conditions].sum(axis=1) == 1).all()
+    assert all(frame.loc[i, 'Condition' + value] == 1 for i, value in enumerate(new['Condition1']))
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import preprocess_cache
+from preprocess import HousingPreprocessor, preprocess
+from preprocess_cache import PreprocessCache
+from synthetic_data import make_housing_frame
+
+
+@pytest.fixture(scope='module')
+def df():
+    return make_housing_frame(200)
+
+
+def test_hit_returns_the_same_result(tmp_path, df):
+    cache = PreprocessCache(str(tmp_path))
+    first = cache.preprocess(df)
+    second = cache.preprocess(df)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second.equals(preprocess(df))
+    assert second.equals(first)
+    # A different input or argument is a miss
+    cache.preprocess(df.iloc[:100])
+    cache.preprocess(df, columns_needed=['Extra'])
+    assert cache.misses == 3
+
+
+def test_transform_and_index(tmp_path, df):
+    cache = PreprocessCache(str(tmp_path))
+    preprocessor = HousingPreprocessor().fit(df)
+    expected = preprocessor.transform(df)
+    assert np.array_equal(cache.transform(preprocessor, df), expected)
+    assert np.array_equal(cache.transform(preprocessor, df), expected)
+    assert cache.hits == 1
+    shuffled = df.sample(frac=1, random_state=0)
+    cache.preprocess(shuffled)
+    assert cache.preprocess(shuffled).equals(preprocess(shuffled))
+
+
+def test_eviction_and_invalidation(tmp_path, df, monkeypatch):
+    cache = PreprocessCache(str(tmp_path), max_bytes=0)
+    cache.preprocess(df)
+    assert cache.entries() == [] and cache.size() == 0
+    cache = PreprocessCache(str(tmp_path))
+    cache.preprocess(df)
+    assert len(cache.entries()) == 1
+    assert len(PreprocessCache(str(tmp_path)).entries()) == 1
+    # Other tables remove all results
+    monkeypatch.setattr(preprocess_cache, 'CACHE_VERSION', preprocess_cache.CACHE_VERSION + 1)
+    assert PreprocessCache(str(tmp_path)).entries() == []
+    assert os.path.exists(os.path.join(str(tmp_path), 'tables.txt'))
+
+
+def test_indexes_are_stored_without_pickle(tmp_path, df):
+    cache = PreprocessCache(str(tmp_path))
+    indexes = [
+        ['house{}'.format(i) for i in range(len(df))],
+        pd.date_range('2020-01-01', periods=len(df), freq='D'),
+        np.arange(len(df)) * 0.5,
+    ]
+    for index in indexes:
+        frame = df.set_axis(index)
+        cache.preprocess(frame)
+        result = cache.preprocess(frame)
+        assert result.index.equals(frame.index) and result.equals(preprocess(frame))
+    assert cache.hits == len(indexes)
+    # An index that would need pickling is computed, but not cached
+    frame = df.set_axis([str(i) if i % 2 else i for i in range(len(df))])
+    assert cache.preprocess(frame).equals(preprocess(frame))
+    assert cache.preprocess(frame).equals(preprocess(frame))
+    assert cache.hits == len(indexes) and len(cache.entries()) == len(indexes)
+
+
+def test_compact_is_part_of_the_key(tmp_path, df):
+    cache = PreprocessCache(str(tmp_path))
+    full = cache.preprocess(df)
+    compact = cache.preprocess(df, compact=True)
+    assert cache.misses == 2
+    assert compact.equals(preprocess(df, compact=True)) and full.equals(preprocess(df))
+    assert cache.preprocess(df, compact=True).dtypes.equals(compact.dtypes)
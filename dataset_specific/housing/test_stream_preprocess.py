@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocess import HousingPreprocessor, step_name
+from stream_preprocess import count_rows, fit_chunks, read_chunks, stream_preprocess
+from synthetic_data import make_housing_frame
+
+
+@pytest.fixture(scope='module')
+def csv_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('data') / 'train.csv')
+    make_housing_frame(450).to_csv(path, index=False)
+    return path
+
+
+def test_chunks_and_row_count(csv_path):
+    chunks = list(read_chunks(csv_path, chunk_rows=100))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 100, 100, 50]
+    assert count_rows(csv_path) == 450
+
+
+def test_fit_chunks_matches_fit(csv_path):
+    df = pd.read_csv(csv_path)
+    expected = HousingPreprocessor().fit(df)
+    preprocessor = fit_chunks(csv_path, chunk_rows=100)
+    # A column that is all missing in the first chunk is added as categorical later on, at its old place
+    assert {step_name(step): step for step in preprocessor.steps} == {step_name(step): step for step in expected.steps}
+    assert sorted(preprocessor.feature_names) == sorted(expected.feature_names)
+
+
+def test_npy_output_matches_transform(tmp_path, csv_path):
+    df = pd.read_csv(csv_path)
+    preprocessor = HousingPreprocessor().fit(df)
+    X = stream_preprocess(preprocessor, csv_path, str(tmp_path / 'features.npy'), chunk_rows=128)
+    assert isinstance(X, np.memmap) and not X.flags.writeable
+    assert np.array_equal(X, preprocessor.transform(df))
+    with pytest.raises(ValueError):
+        stream_preprocess(preprocessor, csv_path, str(tmp_path / 'features.csv'))
+
+
+def test_quoted_newlines_in_fields(tmp_path):
+    df = make_housing_frame(300)
+    df.loc[::7, 'MiscFeature'] = 'Shed\nand\r\nmore'
+    path = str(tmp_path / 'multiline.csv')
+    df.to_csv(path, index=False)
+    assert count_rows(path, chunk_rows=64) == 300
+    df = pd.read_csv(path)
+    preprocessor = HousingPreprocessor().fit(df)
+    assert 'MiscFeature_Shed\nand\r\nmore' in preprocessor.feature_names
+    X = stream_preprocess(preprocessor, path, str(tmp_path / 'features.npy'), chunk_rows=64)
+    assert X.shape == (300, len(preprocessor.feature_names))
+    assert np.array_equal(X, preprocessor.transform(df))
+
+
+def test_parquet_input_and_output(tmp_path):
+    pytest.importorskip('pyarrow')
+    df = make_housing_frame(300)
+    path = str(tmp_path / 'train.parquet')
+    df.to_parquet(path, index=False)
+    assert count_rows(path) == 300
+    assert [len(chunk) for chunk in read_chunks(path, chunk_rows=128)] == [128, 128, 44]
+    preprocessor = fit_chunks(path, chunk_rows=128)
+    expected = preprocessor.transform(df)
+    assert np.array_equal(stream_preprocess(preprocessor, path, str(tmp_path / 'features.npy'), 128), expected)
+    out_path = str(tmp_path / 'features.parquet')
+    assert stream_preprocess(preprocessor, path, out_path, chunk_rows=128) == 300
+    result = pd.read_parquet(out_path)
+    assert list(result.columns) == preprocessor.feature_names
+    assert np.array_equal(result.to_numpy(), expected)